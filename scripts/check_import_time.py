@@ -0,0 +1,111 @@
+"""
+Check import times against a budget.
+
+Each module is imported in a fresh interpreter (best of --repeat runs).
+The check fails if the import exceeds its budget, or if it pulls in a
+heavy dependency (caesar, fsps, astropy.cosmology, the scipy integrals)
+that only the compute paths need.  Commands that only read cached
+results (run_combined --load, plot_ebl) should start in well under a
+second.
+
+Usage:
+    python scripts/check_import_time.py
+    python scripts/check_import_time.py --repeat 5 --top 15   # show slowest imports
+    python scripts/check_import_time.py --scale 2.0           # slow machine
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Only imported on code paths that need them
+HEAVY = ("caesar", "yt", "fsps", "astropy.cosmology", "scipy.integrate")
+
+# module -> (budget in seconds, heavy modules it may import)
+BUDGETS = {
+    "src.config":             (0.15, ()),
+    "src.store":              (0.4,  ()),
+    "src.utils":              (0.4,  ()),
+    "src.physics.radio":      (0.2,  ()),
+    "src.backgrounds.farIR":  (1.0,  ()),
+    "src.backgrounds.radio":  (1.0,  ()),
+    "src.backgrounds.optical": (1.0, ()),
+    "src.lightcone.generate": (1.0,  ()),
+    "run_combined":           (0.9,  ()),    # --load path
+    "plot_ebl":               (0.9,  ()),
+}
+
+_PROBE = """
+import json, sys, time
+sys.path[:0] = {paths!r}
+t0 = time.perf_counter()
+import {module}
+dt = time.perf_counter() - t0
+print(json.dumps({{"seconds": dt,
+                  "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def probe(module, importtime=False):
+    """Import ``module`` in a fresh interpreter; returns its JSON record."""
+    code = _PROBE.format(paths=[str(ROOT), str(ROOT / "scripts")],
+                         module=module, heavy=HEAVY)
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    out = subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT)
+    if out.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{out.stderr}")
+    record = json.loads(out.stdout.strip().splitlines()[-1])
+    record["importtime"] = out.stderr if importtime else ""
+    return record
+
+
+def slowest(importtime, n):
+    """The ``n`` largest cumulative entries of ``-X importtime`` output."""
+    rows = []
+    for line in importtime.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]) / 1e6, parts[2].rstrip()))
+    return sorted(rows, reverse=True)[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budget check")
+    parser.add_argument("modules", nargs="*", default=list(BUDGETS),
+                        help="Modules to check (default: all budgeted)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Fresh-interpreter runs per module (best is kept)")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiply every budget (e.g. for slow machines)")
+    parser.add_argument("--top", type=int, default=0,
+                        help="Show the N slowest imports of each module")
+    args = parser.parse_args()
+
+    failed = []
+    print(f"{'module':<26s} {'seconds':>8s} {'budget':>7s}  heavy imports")
+    for module in args.modules:
+        budget, allowed = BUDGETS.get(module, (1.0, ()))
+        budget *= args.scale
+        runs = [probe(module) for _ in range(max(args.repeat, 1))]
+        best = min(r["seconds"] for r in runs)
+        heavy = [m for m in runs[0]["loaded"] if m not in allowed]
+        ok = best <= budget and not heavy
+        print(f"{module:<26s} {best:8.3f} {budget:7.2f}  "
+              f"{', '.join(heavy) or '-'}{'' if ok else '   FAIL'}")
+        if not ok:
+            failed.append(module)
+        if args.top:
+            for seconds, name in slowest(probe(module, True)["importtime"], args.top):
+                print(f"    {seconds:7.3f}  {name}")
+
+    if failed:
+        print(f"\nOver budget: {', '.join(failed)}")
+        sys.exit(1)
+    print("\nAll imports within budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,11 @@ Usage:
 
     # Also compute and cache redshift-bin decomposition (slow, run once):
     python plot_ebl_final.py --sim m100n1024 --area 0.5 --z_min 0 --z_max 7 --compute_bins
+
+Background and jackknife runs are looked up in the results store
+(src/store.py) by simulation, area and redshift range, preferring the
+run with the requested --a_dust; the fixed paths below are only used
+when the store holds no matching run.
 """
 
 import argparse
@@ -19,21 +24,12 @@ from pathlib import Path
 
 os.environ.setdefault("SPS_HOME", "/home/spujni/fsps")
 
-import h5py
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
-import astropy.units as u
-from astropy.constants import c as c_light
-import pandas as pd
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
-from src.config import load_config
-from src.backgrounds.optical import lightcone_optical_background
-from src.backgrounds.farIR import lightcone_farIR_background
-from src.backgrounds.radio import lightcone_radio_background
+from src.store import ResultsStore
 
-# ── Paths ──────────────────────────────────────────────────────────────────
+# ── Paths (fallbacks when the results store has no matching run) ──────────
 EBL_PATH = Path("/home/spujni/simba_cosmic_background/data/results/"
                 "bg_m100n1024_a0.5_z0.0-7.0.h5")
 JK_PATH  = Path("/home/spujni/simba_cosmic_background/data/jackknife/"
@@ -48,50 +44,58 @@ ZBINS = [
     (4.0, 7.0, "z = 4.0–7.0", "#6ABF69"),
 ]
 
-# ── Plot style ─────────────────────────────────────────────────────────────
-plt.rcParams.update({
-    "font.family":       "serif",
-    "font.size":         11,
-    "axes.labelsize":    13,
-    "axes.titlesize":    13,
-    "legend.fontsize":   10,
-    "xtick.direction":   "in",
-    "ytick.direction":   "in",
-    "xtick.top":         True,
-    "ytick.right":       True,
-    "xtick.minor.visible": True,
-    "ytick.minor.visible": True,
-    "axes.linewidth":    1.2,
-})
-
 FLOOR = 1e-8   # Lowered significantly so faint radio signals aren't dropped
 CGS_TO_NW = 1e6
 
-import matplotlib as mpl
-
-mpl.rcParams.update({
-    # Requires a LaTeX install (TeX Live / MiKTeX). Without one, set
-    # 'text.usetex': False and 'mathtext.fontset': 'cm' instead.
-    'text.usetex'         : True,
-    'text.latex.preamble' : r'\usepackage{amsmath}',
-    'font.family'         : 'serif',   # Computer Modern = default LaTeX font
-
-    # Match your document's font sizes (most journals: 10 pt)
-    'font.size'           : 10,
-    'axes.labelsize'      : 10,
-    'xtick.labelsize'     : 9,
-    'ytick.labelsize'     : 9,
-    'legend.fontsize'     : 9,
 
-    # Okabe–Ito palette — colorblind-safe, one line to replace the default cycle
-    'axes.prop_cycle': mpl.cycler('color', [
-        '#0072B2', '#D55E00', '#009E73',
-        '#E69F00', '#CC79A7', '#56B4E9',
-    ]),
-
-    'lines.linewidth'  : 1.5,
-    'axes.linewidth'   : 0.8,
-})
+# ── Plot style ─────────────────────────────────────────────────────────────
+def _pyplot():
+    """
+    Import pyplot and apply the plot style.  Kept out of the module scope
+    so that importing this script (e.g. for its loaders) stays fast.
+    """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
+
+    plt.rcParams.update({
+        "font.family":       "serif",
+        "font.size":         11,
+        "axes.labelsize":    13,
+        "axes.titlesize":    13,
+        "legend.fontsize":   10,
+        "xtick.direction":   "in",
+        "ytick.direction":   "in",
+        "xtick.top":         True,
+        "ytick.right":       True,
+        "xtick.minor.visible": True,
+        "ytick.minor.visible": True,
+        "axes.linewidth":    1.2,
+    })
+
+    mpl.rcParams.update({
+        # Requires a LaTeX install (TeX Live / MiKTeX). Without one, set
+        # 'text.usetex': False and 'mathtext.fontset': 'cm' instead.
+        'text.usetex'         : True,
+        'text.latex.preamble' : r'\usepackage{amsmath}',
+        'font.family'         : 'serif',   # Computer Modern = default LaTeX font
+
+        # Match your document's font sizes (most journals: 10 pt)
+        'font.size'           : 10,
+        'axes.labelsize'      : 10,
+        'xtick.labelsize'     : 9,
+        'ytick.labelsize'     : 9,
+        'legend.fontsize'     : 9,
+
+        # Okabe–Ito palette — colorblind-safe, one line to replace the default cycle
+        'axes.prop_cycle': mpl.cycler('color', [
+            '#0072B2', '#D55E00', '#009E73',
+            '#E69F00', '#CC79A7', '#56B4E9',
+        ]),
+
+        'lines.linewidth'  : 1.5,
+        'axes.linewidth'   : 0.8,
+    })
+    return plt
 
 
 # ══════════════════════════════════════════════════════════════════════════
@@ -100,6 +104,8 @@ mpl.rcParams.update({
 
 def load_ebl(path: Path) -> dict:
     """Load full EBL from HDF5."""
+    import h5py
+
     with h5py.File(path, "r") as f:
         opt_lam  = f["optical/lam_AA"][:]  * 1e-4        # → µm
         opt_nW   = f["optical/nuInu_nW"][:]
@@ -114,8 +120,26 @@ def load_ebl(path: Path) -> dict:
                 rad_lam=rad_lam, rad_nW=rad_nW,
                 opt_nodust_nW=opt_nodust_nW)
 
+def find_run_path(runs: list, fallback: Path, **prefer) -> Path:
+    """
+    Pick a stored run, preferring one whose parameters match ``prefer``
+    (newest first); fall back to a fixed file when the store has none.
+    """
+    for run in runs:
+        print(f"  stored run {run.hash}: {run.params}")
+    for run in runs:
+        if all(run.params.get(k) is not None and np.isclose(run.params[k], v)
+               for k, v in prefer.items()):
+            return run.path
+    if runs:
+        return runs[0].path
+    return fallback
+
+
 def load_jackknife(path: Path) -> dict:
     """Load jackknife mean and std from HDF5."""
+    import h5py
+
     with h5py.File(path, "r") as f:
         data = {}
         for key in ("optical", "farIR", "radio"):
@@ -127,16 +151,61 @@ def load_jackknife(path: Path) -> dict:
             if key == "optical":
                 data[key]["mean_nodust"] = f[f"{key}/mean_nodust"][:]
                 data[key]["std_nodust"] = f[f"{key}/std_nodust"][:]
+            if f"{key}/zbins" in f:
+                zgrp = f[f"{key}/zbins"]
+                data[key]["zbins"] = {k: zgrp[k][:] for k in zgrp.keys()
+                                      if not k.startswith("samples")}
     return data
 
 
-def load_observed(path: Path) -> pd.DataFrame:
+def jackknife_zbins(jk: dict) -> list:
+    """
+    Split a jackknife result written with redshift bins into one
+    jackknife-like dict per bin.
+
+    Returns
+    -------
+    list of (label, dict) with the same layout as ``load_jackknife``.
+    """
+    z_edges = jk["optical"]["zbins"]["z_edges"]
+    bins = []
+    for b in range(len(z_edges) - 1):
+        label = f"z = {z_edges[b]:.1f}–{z_edges[b + 1]:.1f}"
+        data = {}
+        for key in ("optical", "farIR", "radio"):
+            zb = jk[key]["zbins"]
+            data[key] = {
+                "lam_um": jk[key]["lam_um"],
+                "mean":   zb["mean"][b],
+                "std":    zb["std"][b],
+            }
+            if key == "optical":
+                data[key]["mean_nodust"] = zb["mean_nodust"][b]
+                data[key]["std_nodust"] = zb["std_nodust"][b]
+        bins.append((label, data))
+    return bins
+
+
+def load_jackknife_bins(paths: list, labels: list) -> list:
+    """Load one jackknife file per redshift bin (legacy layout)."""
+    bins = []
+    for path, label in zip(paths, labels):
+        if not path.exists():
+            print(f"  WARN: {path} not found, skipping {label}...")
+            continue
+        bins.append((label, load_jackknife(path)))
+    return bins
+
+
+def load_observed(path: Path) -> "pandas.DataFrame":
     """
     Load observed EBL data from ebldata.csv.
     Expected columns: wave (µm), ebl (nW m⁻² sr⁻¹), debl (uncertainty).
     An 'instrument' column is used for grouping if present, otherwise all
     points are labelled 'Observed'.
     """
+    import pandas as pd
+
     df = pd.read_csv(path)
     df.columns = df.columns.str.strip().str.lower()
 
@@ -191,6 +260,8 @@ def _plot_component(ax, lam, val, std=None, color="steelblue",
 
 def _obs_scatter(ax, df):
     """Scatter observed EBL measurements, grouped by instrument."""
+    import matplotlib.pyplot as plt
+
     markers = ["o", "s", "^", "D", "v", "P", "X", "*", "h"]
     instruments = df["instrument"].unique()
     cmap = plt.colormaps["tab10"].resampled(len(instruments))
@@ -210,8 +281,9 @@ def _obs_scatter(ax, df):
 # Figure 1 — Full EBL with jackknife errors
 # ══════════════════════════════════════════════════════════════════════════
 
-def plot_full_ebl(ebl: dict, jk: dict, obs: pd.DataFrame,
+def plot_full_ebl(ebl: dict, jk: dict, obs: "pandas.DataFrame",
                  save_dir: Path) -> None:
+    plt = _pyplot()
 
     fig, ax = plt.subplots(figsize=(9, 5.5))
 
@@ -265,27 +337,24 @@ def plot_full_ebl(ebl: dict, jk: dict, obs: pd.DataFrame,
 # Figure 2 — EBL decomposed by redshift bins
 # ══════════════════════════════════════════════════════════════════════════
 
-def plot_redshift_binned_ebl(jk_paths, obs, save_dir):
+def plot_redshift_binned_ebl(jk_bins, obs, save_dir):
     """
-    Plot EBL for three jackknife bins (0–1, 1–3, 3–7) in a 3-row, 1-column layout.
+    Plot EBL for each jackknife redshift bin in an n-row, 1-column layout.
+    ``jk_bins`` is a list of (label, jackknife dict), e.g. from
+    ``jackknife_zbins`` or ``load_jackknife_bins``.
     Each panel shows optical, far-IR, and radio with jackknife errors, plus observed data.
     """
-    bin_labels = [
-        "z = 0.0–1.0", 
-        "z = 1.0–3.0",
-        "z = 3.0–7.0"
-    ]
-    bin_colors = [
-        ("#4C9BE8", "#024588", "#E85C4C", "#6ABF69"),  # optical, optical no dust, farIR, radio
-        ("#4C9BE8", "#024588", "#E85C4C", "#6ABF69"),
-        ("#4C9BE8", "#024588", "#E85C4C", "#6ABF69"),
-    ]
-
-    fig, axes = plt.subplots(3, 1, figsize=(9, 13), sharex=True)
+    plt = _pyplot()
+    # optical, optical no dust, farIR, radio
+    colors = ("#4C9BE8", "#024588", "#E85C4C", "#6ABF69")
+
+    n_bins = len(jk_bins)
+    fig, axes = plt.subplots(n_bins, 1, figsize=(9, 13 * n_bins / 3),
+                             sharex=True, squeeze=False)
+    axes = axes[:, 0]
     #fig.suptitle("SIMBA Extragalactic Background Light by Redshift Bin", fontsize=14, y=0.99)
 
-    for i, (jk_path, label, colors) in enumerate(zip(jk_paths, bin_labels, bin_colors)):
-        jk = load_jackknife(jk_path)
+    for i, (label, jk) in enumerate(jk_bins):
         ax = axes[i]
         # Optical
         _plot_component(ax,
@@ -329,29 +398,19 @@ def plot_redshift_binned_ebl(jk_paths, obs, save_dir):
 # Figure 3 — EBL decomposed by redshift bins (Single Axis)
 # ══════════════════════════════════════════════════════════════════════════
 
-def plot_redshift_binned_single_ax(jk_paths: list, obs: pd.DataFrame, save_dir: Path) -> None:
+def plot_redshift_binned_single_ax(jk_bins: list, obs: "pandas.DataFrame", save_dir: Path) -> None:
     """
-    Plot EBL for three jackknife bins on a single graph.
+    Plot EBL for each jackknife redshift bin on a single graph.
     Each redshift bin is assigned a unique colour applied to its optical, far-IR, and radio curves.
     """
-    bin_labels = [
-        "z = 0.0–1.0",
-        "z = 1.0–3.0",
-        "z = 3.0–7.0"
-    ]
-    
+    plt = _pyplot()
     # Use distinct, colourblind-safe colours for each redshift bin
-    bin_colours = ["#4C9BE8", "#E8834C", "#6ABF69"]  
+    palette = ["#4C9BE8", "#E8834C", "#6ABF69", "#CC79A7", "#56B4E9", "#E69F00"]
+    bin_colours = [palette[i % len(palette)] for i in range(len(jk_bins))]
 
     fig, ax = plt.subplots(figsize=(9, 5.5))
 
-    for jk_path, label, colour in zip(jk_paths, bin_labels, bin_colours):
-        if not jk_path.exists():
-            print(f"  WARN: {jk_path} not found, skipping {label}...")
-            continue
-            
-        jk = load_jackknife(jk_path)
-        
+    for (label, jk), colour in zip(jk_bins, bin_colours):
         # Plot Optical (with label for the legend)
         _plot_component(ax,
                         jk["optical"]["lam_um"], jk["optical"]["mean"],
@@ -407,31 +466,48 @@ def main():
                         help="Recompute redshift-bin decomposition "
                              "(slow — run once, then cached)")
     parser.add_argument("--a_dust", type=float, default=-0.017341)
+    parser.add_argument("--fig_dir", type=Path, default=FIG_DIR,
+                        help="Directory for the figures")
     args = parser.parse_args()
 
-    FIG_DIR.mkdir(parents=True, exist_ok=True)
+    fig_dir = args.fig_dir
+    fig_dir.mkdir(parents=True, exist_ok=True)
+
+    store = ResultsStore()
+    query = dict(sim=args.sim, area_deg2=args.area,
+                 z_min=args.z_min, z_max=args.z_max)
 
     print("Loading EBL results …")
-    ebl = load_ebl(EBL_PATH)
+    ebl_runs = store.find("background", **query)
+    ebl_path = find_run_path(ebl_runs, EBL_PATH, a_dust=args.a_dust)
+    ebl = load_ebl(ebl_path)
 
     print("Loading jackknife results …")
-    jk = load_jackknife(JK_PATH)
+    jk_runs = store.find("jackknife", **query)
+    jk = load_jackknife(find_run_path(jk_runs, JK_PATH, a_dust=args.a_dust))
 
     print("Loading observed EBL data …")
     obs = load_observed(OBS_PATH)
 
     # ── Figure 1 ──────────────────────────────────────────────────
     print("\n── Figure 1: Full EBL with jackknife uncertainty ──")
-    plot_full_ebl(ebl, jk, obs, FIG_DIR)
+    plot_full_ebl(ebl, jk, obs, fig_dir)
 
     # ── Figure 2 ──────────────────────────────────────────────────
     print("\n── Figure 2: EBL by redshift bin ──")
-    jk_bin_paths = [
-        Path("data/jackknife/jackknife_m100n1024_a0.5_z0.0-1.0.h5"),
-        Path("data/jackknife/jackknife_m100n1024_a0.5_z1.0-3.0.h5"),
-        Path("data/jackknife/jackknife_m100n1024_a0.5_z3.0-7.0.h5"),
-    ]
-    plot_redshift_binned_ebl(jk_bin_paths, obs, FIG_DIR)
+    if "zbins" in jk["optical"]:
+        jk_bins = jackknife_zbins(jk)
+    else:
+        # Older jackknife files: one lightcone and run per bin
+        jk_bins = load_jackknife_bins(
+            [
+                Path("data/jackknife/jackknife_m100n1024_a0.5_z0.0-1.0.h5"),
+                Path("data/jackknife/jackknife_m100n1024_a0.5_z1.0-3.0.h5"),
+                Path("data/jackknife/jackknife_m100n1024_a0.5_z3.0-7.0.h5"),
+            ],
+            ["z = 0.0–1.0", "z = 1.0–3.0", "z = 3.0–7.0"],
+        )
+    plot_redshift_binned_ebl(jk_bins, obs, fig_dir)
 
     print("\nDone.")
 
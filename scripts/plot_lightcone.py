@@ -16,6 +16,14 @@ from pathlib import Path
 from astropy.cosmology import Planck15 as cosmo
 import astropy.units as u
 from scipy.ndimage import gaussian_filter
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import load_config
+from src.lightcone.join import join_catalogue_columns
+from src.lightcone.layout import read_lightcone, read_radec_deg
+from src.analysis.raster import axes_shape, draw_raster, raster_extent, rasterize
 
 # ── paths ────────────────────────────────────────────────────────────────
 ROOT = Path(__file__).resolve().parent.parent
@@ -23,9 +31,8 @@ LC_FILE = ROOT / "data" / "lightcones" / "lc_m100n1024_a0.5_z0.0-7.0.h5"
 FIG_DIR = ROOT / "figures" / "lightcone"
 FIG_DIR.mkdir(parents=True, exist_ok=True)
 
-# HDF5 snapshot directory (same layout used by src/config)
-HDF5_DIR = Path("/home/spujni/sim/m100n1024/s50/Groups/")
-SNAP_PREFIX = "m100n1024"
+# Snapshot catalogues of the simulation the lightcone was built from
+CFG = load_config("m100n1024")
 
 import matplotlib as mpl
 
@@ -55,56 +62,29 @@ mpl.rcParams.update({
 
 
 def load_lightcone(path):
-    """Load lightcone data from HDF5."""
+    """Load lightcone data from HDF5 (RA/DEC in degrees)."""
+    lc = read_lightcone(path, ("z", "stellar_mass", "snap", "galaxy_index"))
+    ra, dec = read_radec_deg(path)
     with h5py.File(path, "r") as f:
-        data = {
-            "ra": f["RA"][:],
-            "dec": f["DEC"][:],
-            "z": f["z"][:],
-            "stellar_mass": f["stellar_mass"][:],
-            "snap": f["snap"][:],
-            "galaxy_index": f["galaxy_index"][:],
-            "area_deg2": f.attrs["area_deg2"],
-        }
-    return data
+        area_deg2 = f.attrs["area_deg2"]
+    return {
+        "ra": ra,
+        "dec": dec,
+        "z": lc["z"],
+        "stellar_mass": lc["stellar_mass"],
+        "snap": lc["snap"],
+        "galaxy_index": lc["galaxy_index"],
+        "area_deg2": area_deg2,
+    }
 
 def load_app_mag(data, filter_name="g"):
     """
-    Load apparent magnitude for each galaxy from Caesar snapshot files for a given filter.
-    filter_name: e.g. 'g', 'r', etc. (for 'appmag.g', 'appmag.r', ...)
-    Returns an array of apparent magnitudes (same length as lightcone).
+    Apparent magnitude of each lightcone galaxy in a filter, joined from
+    the snapshot catalogues ('appmag.g', 'appmag.r', ...).  NaN where
+    unavailable.
     """
-    n_gal = len(data["z"])
-    app_mag = np.full(n_gal, np.nan)
-    snap_arr = data["snap"]
-    gal_idx = data["galaxy_index"]
-    key_name = f"appmag.{filter_name}"
-
-    cache = {}
-    for snap in np.unique(snap_arr):
-        snap = int(snap)
-        hdf5 = HDF5_DIR / f"{SNAP_PREFIX}_{snap:03d}.hdf5"
-        if not hdf5.exists():
-            hdf5 = HDF5_DIR / f"{SNAP_PREFIX}_{snap}.hdf5"
-        if not hdf5.exists():
-            print(f"  WARN: missing {hdf5}, skipping snap {snap}")
-            continue
-        with h5py.File(hdf5, "r") as f:
-            group = f["galaxy_data/dicts"]
-            if key_name not in group:
-                print(f"  WARN: {key_name} missing in snap {snap}, skipping")
-                continue
-            cache[snap] = group[key_name][:]
-
-    for i in range(n_gal):
-        s = int(snap_arr[i])
-        gi = int(gal_idx[i])
-        if s in cache and gi < len(cache[s]):
-            val = cache[s][gi]
-            if np.isfinite(val):
-                app_mag[i] = val
-
-    return app_mag
+    key = f"appmag.{filter_name}"
+    return join_catalogue_columns(CFG, data["snap"], data["galaxy_index"], [key])[key]
 
 def load_lfir(data):
     """
@@ -113,88 +93,31 @@ def load_lfir(data):
     Returns an array of L_FIR values (L_sun) with the same length as the
     lightcone.  Galaxies for which L_FIR is unavailable are set to NaN.
     """
-    n_gal = len(data["z"])
-    lfir = np.full(n_gal, np.nan)
-
-    snap_arr = data["snap"]
-    gal_idx = data["galaxy_index"]
-
-    cache = {}
-    for snap in np.unique(snap_arr):
-        snap = int(snap)
-        # Try zero-padded then unpadded filename
-        hdf5 = HDF5_DIR / f"{SNAP_PREFIX}_{snap:03d}.hdf5"
-        if not hdf5.exists():
-            hdf5 = HDF5_DIR / f"{SNAP_PREFIX}_{snap}.hdf5"
-        if not hdf5.exists():
-            print(f"  WARN: missing {hdf5}, skipping snap {snap}")
-            continue
-        with h5py.File(hdf5, "r") as f:
-            if "galaxy_data/L_FIR" not in f:
-                print(f"  WARN: L_FIR missing in snap {snap}, skipping")
-                continue
-            cache[snap] = f["galaxy_data/L_FIR"][:]
-
-    for i in range(n_gal):
-        s = int(snap_arr[i])
-        gi = int(gal_idx[i])
-        if s in cache and gi < len(cache[s]):
-            val = cache[s][gi]
-            if np.isfinite(val) and val > 0:
-                lfir[i] = val
-
+    lfir = join_catalogue_columns(CFG, data["snap"], data["galaxy_index"],
+                                  ["L_FIR"])["L_FIR"]
+    with np.errstate(invalid="ignore"):
+        lfir[~(lfir > 0)] = np.nan
     return lfir
 
 def load_appmag_v(data):
-    """
-    Cross-reference snapshot catalogues to retrieve per-galaxy apparent magnitude in the 'v' filter.
-
-    Returns an array of apparent magnitudes (same length as the lightcone).
-    Galaxies for which appmag.v is unavailable are set to NaN.
-    """
-    n_gal = len(data["z"])
-    appmag_v = np.full(n_gal, np.nan)
-
-    snap_arr = data["snap"]
-    gal_idx = data["galaxy_index"]
-    key_name = "appmag.v"
-
-    cache = {}
-    for snap in np.unique(snap_arr):
-        snap = int(snap)
-        hdf5 = HDF5_DIR / f"{SNAP_PREFIX}_{snap:03d}.hdf5"
-        if not hdf5.exists():
-            hdf5 = HDF5_DIR / f"{SNAP_PREFIX}_{snap}.hdf5"
-        if not hdf5.exists():
-            print(f"  WARN: missing {hdf5}, skipping snap {snap}")
-            continue
-        with h5py.File(hdf5, "r") as f:
-            group = f["galaxy_data/dicts"]
-            if key_name not in group:
-                print(f"  WARN: {key_name} missing in snap {snap}, skipping")
-                continue
-            cache[snap] = group[key_name][:]
-
-    for i in range(n_gal):
-        s = int(snap_arr[i])
-        gi = int(gal_idx[i])
-        if s in cache and gi < len(cache[s]):
-            val = cache[s][gi]
-            if np.isfinite(val):
-                appmag_v[i] = val
-
-    return appmag_v
+    """Per-galaxy apparent magnitude in the 'v' filter (NaN where unavailable)."""
+    return load_app_mag(data, "v")
 
 with h5py.File(ROOT / "data" / "results" / "radio_flux_1p4GHz_m100n1024.h5", "r") as f:
     radio_flux = f["flux_total"][:]
 
-def plot_three_panel_wedge_with_radio(data, appmag_v, lfir, radio_flux, outpath, random_seed=42, max_points=240883):
+def plot_three_panel_wedge_with_radio(data, appmag_v, lfir, radio_flux, outpath, random_seed=42,
+                                      max_points=240883, render="raster", dpi=200):
     """
     Three-panel wedge diagram for the SIMBA light cone.
     Panel 1: v-band apparent magnitude (optical)
     Panel 2: log10(L_FIR / L_sun) (far-IR)
     Panel 3: log10(radio flux at 1.4 GHz) [erg/s/cm^2/Hz]
     All: x-axis is comoving radial distance [Mpc], y is transverse.
+
+    render="raster" (default) draws every galaxy as per-pixel images at
+    the output DPI (mean m_V, brightest L_FIR and radio flux per pixel);
+    render="scatter" scatters a random subsample of max_points galaxies.
     """
     # Geometry
     z = data["z"]
@@ -205,8 +128,11 @@ def plot_three_panel_wedge_with_radio(data, appmag_v, lfir, radio_flux, outpath,
     d_transverse = delta_ra_rad * d_radial
 
     n_gal = len(z)
-    rng = np.random.default_rng(random_seed)
-    idx = rng.choice(n_gal, size=min(max_points, n_gal), replace=False)
+    if render == "scatter":
+        rng = np.random.default_rng(random_seed)
+        idx = rng.choice(n_gal, size=min(max_points, n_gal), replace=False)
+    else:
+        idx = slice(None)
 
     # Subsampled arrays
     d_radial_sub = d_radial[idx]
@@ -228,7 +154,8 @@ def plot_three_panel_wedge_with_radio(data, appmag_v, lfir, radio_flux, outpath,
     vmax_lfir = np.nanpercentile(lfir_log_sub, 98)
 
     # Panel 3: log10(radio flux)
-    radio_log = np.log10(radio_flux_sub)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        radio_log = np.log10(radio_flux_sub)
     radio_log[~np.isfinite(radio_log)] = np.nan
     vmin_radio = np.nanpercentile(radio_log, 2)
     vmax_radio = np.nanpercentile(radio_log, 98)
@@ -241,6 +168,7 @@ def plot_three_panel_wedge_with_radio(data, appmag_v, lfir, radio_flux, outpath,
     panels = [
         {
             "c": appmag_v_sub,
+            "statistic": "mean",
             "cmap": "viridis_r",
             "vmin": vmin_v,
             "vmax": vmax_v,
@@ -249,6 +177,7 @@ def plot_three_panel_wedge_with_radio(data, appmag_v, lfir, radio_flux, outpath,
         },
         {
             "c": lfir_log_sub,
+            "statistic": "max",
             "cmap": "inferno",
             "vmin": vmin_lfir,
             "vmax": vmax_lfir,
@@ -257,6 +186,7 @@ def plot_three_panel_wedge_with_radio(data, appmag_v, lfir, radio_flux, outpath,
         },
         {
             "c": radio_log,
+            "statistic": "max",
             "cmap": "plasma",
             "vmin": vmin_radio,
             "vmax": vmax_radio,
@@ -264,13 +194,21 @@ def plot_three_panel_wedge_with_radio(data, appmag_v, lfir, radio_flux, outpath,
         }
     ]
 
+    extent = (x_lim[0], x_lim[1], -y_lim, y_lim)
     for i, ax in enumerate(axes):
-        im = ax.scatter(
-            d_radial_sub, d_transverse_sub, s=0.5, alpha=0.3,
-            c=panels[i]["c"], cmap=panels[i]["cmap"],
-            vmin=panels[i]["vmin"], vmax=panels[i]["vmax"],
-            rasterized=True
-        )
+        if render == "scatter":
+            im = ax.scatter(
+                d_radial_sub, d_transverse_sub, s=0.5, alpha=0.3,
+                c=panels[i]["c"], cmap=panels[i]["cmap"],
+                vmin=panels[i]["vmin"], vmax=panels[i]["vmax"],
+                rasterized=True
+            )
+        else:
+            image, _ = rasterize(d_radial_sub, d_transverse_sub, panels[i]["c"],
+                                 statistic=panels[i]["statistic"],
+                                 shape=axes_shape(ax, dpi), extent=extent)
+            im = draw_raster(ax, image, extent, cmap=panels[i]["cmap"],
+                             vmin=panels[i]["vmin"], vmax=panels[i]["vmax"])
         cb = fig.colorbar(im, ax=ax, pad=0.02)
         cb.set_label(panels[i]["label"], fontsize=11)
         ax.set_ylim(-y_lim, y_lim)
@@ -309,7 +247,34 @@ def plot_three_panel_wedge_with_radio(data, appmag_v, lfir, radio_flux, outpath,
     
     # Adjust the top margin manually to leave room for the twin axis and the suptitle
     fig.subplots_adjust(top=0.88)    
-    fig.savefig(outpath, dpi=200, bbox_inches="tight")
+    fig.savefig(outpath, dpi=dpi, bbox_inches="tight")
+    plt.close(fig)
+    print(f"Saved: {outpath}")
+
+def plot_sky_density(data, outpath, pix_arcsec=2.0, smooth_pix=1.5, dpi=200):
+    """
+    Sky-plane galaxy surface density: every lightcone galaxy counted per
+    pix_arcsec pixel, smoothed by a Gaussian of smooth_pix pixels.
+    """
+    ra, dec = data["ra"], data["dec"]
+    x = (ra - np.median(ra)) * np.cos(np.deg2rad(np.median(dec)))
+    y = dec - np.median(dec)
+    extent = raster_extent(x, y)
+    pix_deg = pix_arcsec / 3600.0
+    shape = (max(1, int(np.ceil((extent[3] - extent[2]) / pix_deg))),
+             max(1, int(np.ceil((extent[1] - extent[0]) / pix_deg))))
+    counts, extent = rasterize(x, y, statistic="count", shape=shape, extent=extent)
+    density = gaussian_filter(counts, smooth_pix) / (pix_arcsec / 60.0) ** 2
+
+    fig, ax = plt.subplots(figsize=(6, 5))
+    im = draw_raster(ax, density, extent, cmap="magma", aspect="equal",
+                     norm=LogNorm(vmin=max(np.percentile(density[density > 0], 1), 1e-3)))
+    cb = fig.colorbar(im, ax=ax, pad=0.02)
+    cb.set_label(r"$N_\mathrm{gal}\ [\mathrm{arcmin^{-2}}]$", fontsize=11)
+    ax.set_xlabel(r"$\Delta\alpha \cos\delta$ [deg]", fontsize=12)
+    ax.set_ylabel(r"$\Delta\delta$ [deg]", fontsize=12)
+    fig.tight_layout()
+    fig.savefig(outpath, dpi=dpi, bbox_inches="tight")
     plt.close(fig)
     print(f"Saved: {outpath}")
 
@@ -324,4 +289,5 @@ plot_three_panel_wedge_with_radio(
     data, appmag_v, lfir, radio_flux,
     FIG_DIR / "lightcone_wedge_three_panel.png"
 )
+plot_sky_density(data, FIG_DIR / "lightcone_sky_density.png")
 
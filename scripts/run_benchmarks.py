@@ -0,0 +1,171 @@
+"""
+Benchmark the pipelines on synthetic CAESAR-like snapshots.
+
+Writes mock catalogues (see src/mock.py) at each requested galaxy count,
+then times lightcone generation, the three background pipelines, the
+jackknife and a small far-IR a_dust sweep, reporting throughput
+(lightcone galaxies / s) and peak traced memory per stage.
+
+Usage:
+    python scripts/run_benchmarks.py --sizes 1000 10000 100000
+    python scripts/run_benchmarks.py --sizes 1000 --stages lightcone farIR radio
+    python scripts/run_benchmarks.py --sizes 10000 --json data/bench/bench.json
+    python scripts/run_benchmarks.py --sizes 100000 --n_workers 8
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+os.environ.setdefault('SPS_HOME', '/home/spujni/fsps')
+
+import numpy as np
+import h5py
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from src.mock import make_mock_simulation
+
+STAGES = ["lightcone", "optical", "farIR", "radio", "jackknife", "sweep"]
+
+
+def _measure(fn):
+    """Run fn() quietly; return (result, wall seconds, peak traced MB)."""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1e6
+
+
+def run_stage(stage, cfg, args):
+    """Return a zero-argument callable running one benchmark stage."""
+    from argparse import Namespace
+
+    if stage == "lightcone":
+        from src.lightcone.generate import generate_lightcone
+        from src.backgrounds.farIR import LIGHTCONE_DIR
+        lc_path = LIGHTCONE_DIR / f"lc_{cfg.name}_a{args.area}_z{args.z_min}-{args.z_max}.h5"
+        lc_path.parent.mkdir(parents=True, exist_ok=True)
+        if lc_path.exists():
+            lc_path.unlink()
+        np.random.seed(args.seed)
+        return lambda: generate_lightcone(cfg, args.area, args.z_min, args.z_max,
+                                          lc_path, snap_step=2, verbose=False)
+    if stage == "optical":
+        from src.backgrounds.optical import lightcone_optical_background
+        return lambda: lightcone_optical_background(
+            cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max,
+            n_workers=args.n_workers)
+    if stage == "farIR":
+        from src.backgrounds.farIR import lightcone_farIR_background
+        return lambda: lightcone_farIR_background(
+            cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max,
+            n_workers=args.n_workers)
+    if stage == "radio":
+        from src.backgrounds.radio import lightcone_radio_background
+        return lambda: lightcone_radio_background(
+            cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max,
+            n_workers=args.n_workers)
+    if stage == "jackknife":
+        from run_jackknife import run_jackknife
+        jk_args = Namespace(area=args.area, z_min=args.z_min, z_max=args.z_max,
+                            n_workers=args.n_workers)
+        return lambda: run_jackknife(cfg, jk_args, n_regions_per_side=4,
+                                     z_edges=[args.z_min, args.z_max])
+    if stage == "sweep":
+        from src.backgrounds.farIR import lightcone_farIR_background
+        a_values = np.linspace(-0.5, 0.5, args.n_sweep)
+        return lambda: [lightcone_farIR_background(
+            cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max,
+            a_dust=a, n_workers=args.n_workers) for a in a_values]
+    raise ValueError(f"Unknown stage {stage!r}")
+
+
+def lightcone_size(cfg, args):
+    """Number of galaxies in the benchmark lightcone (0 if not built)."""
+    from src.backgrounds.farIR import LIGHTCONE_DIR
+    lc_path = LIGHTCONE_DIR / f"lc_{cfg.name}_a{args.area}_z{args.z_min}-{args.z_max}.h5"
+    if not lc_path.exists():
+        return 0
+    with h5py.File(lc_path, "r") as f:
+        return int(f.attrs["n_galaxies"])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark pipelines on synthetic Simba-like snapshots")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="Galaxies per mock snapshot (10^3 … 10^7)")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    parser.add_argument("--mock_dir", type=Path, default=Path("data/mock"))
+    parser.add_argument("--box", type=float, default=100.0,
+                        help="Mock box size [Mpc/h]")
+    parser.add_argument("--area", type=float, default=0.1)
+    parser.add_argument("--z_min", type=float, default=0.0)
+    parser.add_argument("--z_max", type=float, default=1.0)
+    parser.add_argument("--n_sweep", type=int, default=5,
+                        help="Number of a_dust values in the sweep stage")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--n_workers", type=int, default=1,
+                        help="Processes for the background stages")
+    parser.add_argument("--json", type=Path, default=None,
+                        help="Also write the results table as JSON")
+    args = parser.parse_args()
+
+    rows = []
+    for n_gal in args.sizes:
+        print(f"\n=== N = {n_gal} galaxies per snapshot ===")
+        t0 = time.perf_counter()
+        cfg = make_mock_simulation(args.mock_dir / f"n{n_gal}", n_gal,
+                                   box_size_mpc_h=args.box, z_max=args.z_max + 0.5,
+                                   seed=args.seed, verbose=False)
+        print(f"  mock catalogues ready ({cfg.n_snapshots} snapshots, "
+              f"{time.perf_counter() - t0:.1f} s)")
+
+        stages = [s for s in STAGES if s in args.stages]
+        # Every background needs the lightcone; build it first if absent
+        if "lightcone" not in stages and lightcone_size(cfg, args) == 0:
+            stages.insert(0, "lightcone")
+
+        for stage in stages:
+            try:
+                fn = run_stage(stage, cfg, args)
+                _, elapsed, peak_mb = _measure(fn)
+            except ImportError as e:
+                print(f"  {stage:<10s} skipped ({e})")
+                rows.append({"n_gal": n_gal, "stage": stage, "skipped": str(e)})
+                continue
+            n_lc = lightcone_size(cfg, args)
+            rate = n_lc / elapsed if elapsed > 0 else np.inf
+            print(f"  {stage:<10s} {elapsed:9.2f} s   {rate:12.1f} gal/s   "
+                  f"peak {peak_mb:9.1f} MB   (N_lc = {n_lc})")
+            rows.append({"n_gal": n_gal, "stage": stage, "n_lightcone": n_lc,
+                         "seconds": elapsed, "galaxies_per_s": rate,
+                         "peak_traced_MB": peak_mb})
+
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    print(f"\nProcess peak RSS: {max_rss_mb:.1f} MB")
+
+    if args.json is not None:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump({"rows": rows, "max_rss_MB": max_rss_mb,
+                       "n_workers": args.n_workers,
+                       "area_deg2": args.area, "z_min": args.z_min,
+                       "z_max": args.z_max}, f, indent=2)
+        print(f"Saved → {args.json}")
+
+
+if __name__ == "__main__":
+    main()
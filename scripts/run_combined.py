@@ -6,6 +6,9 @@ Usage:
     
     # Load cached results instead of recomputing:
     python scripts/run_combined.py --sim m25n256 --area 1.0 --z_min 0 --z_max 3 --load
+
+    # Write a timing / I/O report alongside the results:
+    python scripts/run_combined.py --sim m25n256 --area 1.0 --z_min 0 --z_max 3 --profile
 """
 import argparse
 import os
@@ -15,26 +18,32 @@ from pathlib import Path
 os.environ.setdefault('SPS_HOME', '/home/spujni/fsps')
 
 import numpy as np
-import matplotlib.pyplot as plt
-import astropy.units as u
-from astropy.constants import c as c_light
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
+from src import instrument
 from src.config import load_config
-from src.backgrounds.optical import lightcone_optical_background
-from src.backgrounds.farIR import lightcone_farIR_background
-from src.backgrounds.radio import lightcone_radio_background
-from src.utils import save_background_results, load_background_results
+from src.backgrounds.mpi import is_root
+from src.utils import save_background_results, load_background_results, RESULTS_DIR
 
 
 def compute_backgrounds(cfg, args, a_dust=-0.017341):
     """Compute all background components from scratch."""
-    
+    # Imported here so that --load does not pay for the pipelines' imports
+    import astropy.units as u
+    from astropy.constants import c as c_light
+    from src.backgrounds.optical import lightcone_optical_background
+    from src.backgrounds.farIR import lightcone_farIR_background
+    from src.backgrounds.radio import lightcone_radio_background
+
+    comm = getattr(args, "comm", None)
+
     # ── Optical / near-IR ─────────────────────────────────────────
     print("=== Optical/NIR background ===")
     lam_opt, I_nu_opt, I_nu_opt_nodust = lightcone_optical_background(
-        cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max
+        cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max,
+        checkpoint=args.checkpoint,
+        n_workers=args.n_workers, comm=comm
     )
     nu_opt = (c_light / (lam_opt * u.AA)).to_value(u.Hz)
     nuInu_opt        = nu_opt * I_nu_opt          # erg/s/cm²/sr
@@ -44,14 +53,17 @@ def compute_backgrounds(cfg, args, a_dust=-0.017341):
     print("\n=== Far-IR background ===")
     lam_fir, I_lam_fir, dust_temps, dust_zs = lightcone_farIR_background(
         cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max,
-        a_dust=a_dust, return_dust_temps=True
+        a_dust=a_dust, return_dust_temps=True, checkpoint=args.checkpoint,
+        n_workers=args.n_workers, comm=comm
     )
     nuInu_fir = lam_fir * I_lam_fir
 
     # ── Radio (SF + AGN) ──────────────────────────────────────────
     print("\n=== Radio background (SF + AGN) ===")
     nu_radio, I_nu_radio, _, _ = lightcone_radio_background(
-        cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max
+        cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max,
+        checkpoint=args.checkpoint,
+        n_workers=args.n_workers, comm=comm
     )
     lam_radio_um = (c_light / (nu_radio * u.Hz)).to_value(u.AA) * 1e-4
     nuInu_radio  = nu_radio * I_nu_radio
@@ -66,22 +78,25 @@ def compute_backgrounds(cfg, args, a_dust=-0.017341):
     lam_opt_um = lam_opt * 1e-4
     lam_fir_um = lam_fir * 1e-4
 
-    # ── Save results ──────────────────────────────────────────────
-    save_background_results(
-        cfg, args,
-        lam_opt, I_nu_opt, nuInu_opt_nW,
-        I_nu_opt_nodust, nuInu_opt_nodust_nW,
-        lam_fir, I_lam_fir, nuInu_fir_nW,
-        nu_radio, I_nu_radio, lam_radio_um, nuInu_radio_nW,
-        dust_temps=dust_temps, dust_redshifts=dust_zs,
-        a_dust=a_dust,
-    )
+    # ── Save results (root rank only under MPI) ───────────────────
+    outpath = None
+    if is_root(comm):
+        outpath = save_background_results(
+            cfg, args,
+            lam_opt, I_nu_opt, nuInu_opt_nW,
+            I_nu_opt_nodust, nuInu_opt_nodust_nW,
+            lam_fir, I_lam_fir, nuInu_fir_nW,
+            nu_radio, I_nu_radio, lam_radio_um, nuInu_radio_nW,
+            dust_temps=dust_temps, dust_redshifts=dust_zs,
+            a_dust=a_dust,
+        )
 
     return {
         "optical": {"lam_um": lam_opt_um, "nuInu_nW": nuInu_opt_nW,
                      "nuInu_nodust_nW": nuInu_opt_nodust_nW},
         "farIR":   {"lam_um": lam_fir_um, "nuInu_nW": nuInu_fir_nW},
         "radio":   {"lam_um": lam_radio_um, "nuInu_nW": nuInu_radio_nW},
+        "path":    outpath,
     }
 
 def load_cached(cfg, args):
@@ -102,7 +117,8 @@ def load_cached(cfg, args):
 
 def plot_combined(cfg, args, results):
     """Create the combined background plot."""
-    
+    import matplotlib.pyplot as plt
+
     lam_opt_um          = results["optical"]["lam_um"]
     nuInu_opt_nW        = results["optical"]["nuInu_nW"]
     nuInu_opt_nodust_nW = results["optical"].get("nuInu_nodust_nW")
@@ -179,7 +195,17 @@ def main():
     parser.add_argument("--z_max", type=float, default=7.0)
     parser.add_argument("--load", action="store_true",
                         help="Load cached results instead of recomputing")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="Checkpoint per-snapshot partial sums and resume "
+                             "from them (data/checkpoints)")
+    parser.add_argument("--n_workers", type=int, default=1,
+                        help="Processes for the per-snapshot background sums")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record stage timings and I/O; write a JSON run "
+                             "report next to the results")
     args = parser.parse_args()
+    if args.profile:
+        instrument.enable("run_combined")
 
     cfg = load_config(args.sim)
     print(f"Running on {cfg.name} (box={cfg.box_size_mpc_h} Mpc/h)\n")
@@ -197,7 +223,12 @@ def main():
         results = compute_backgrounds(cfg, args)
 
     # ── Plot ──────────────────────────────────────────────────────
-    plot_combined(cfg, args, results)
+    with instrument.stage("plot"):
+        plot_combined(cfg, args, results)
+
+    report = results.get("path") or (
+        RESULTS_DIR / f"bg_{cfg.name}_a{args.area}_z{args.z_min}-{args.z_max}.h5")
+    instrument.write_report(report.with_suffix(".report.json"))
 
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 """
 Usage:
     python scripts/run_farIR.py --sim m25n256 --area 1.0 --z_min 0 --z_max 3
+    python scripts/run_farIR.py --sim m25n256 --area 1.0 --z_min 0 --z_max 3 --rtol 1e-3
 """
 import argparse
 import sys
@@ -11,6 +12,7 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from src.config import load_config
 from src.backgrounds.farIR import lightcone_farIR_background
+from src.backgrounds.farIR_fit import lightcone_farIR_adaptive
 
 def main():
     parser = argparse.ArgumentParser(description="Far-IR cosmic background")
@@ -19,14 +21,25 @@ def main():
     parser.add_argument("--area", type=float, default=1.0)
     parser.add_argument("--z_min", type=float, default=0.0)
     parser.add_argument("--z_max", type=float, default=3.0)
+    parser.add_argument("--rtol", type=float, default=None,
+                        help="Refine an adaptive wavelength grid to this "
+                             "relative interpolation error instead of the "
+                             "500-point grid")
     args = parser.parse_args()
 
     cfg = load_config(args.sim)
     print(f"Running on {cfg.name} (box={cfg.box_size_mpc_h} Mpc/h)")
 
-    lam, intensity = lightcone_farIR_background(
-        cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max
-    )
+    if args.rtol is None:
+        lam, intensity = lightcone_farIR_background(
+            cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max
+        )
+    else:
+        lam, intensity = lightcone_farIR_adaptive(
+            cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max,
+            rtol=args.rtol
+        )
+        print(f"Adaptive grid: {len(lam)} wavelengths")
 
     fig, ax = plt.subplots(figsize=(8, 5))
     nu_I_nu = intensity * lam  # λ I_λ = ν I_ν
@@ -1,3 +1,16 @@
+"""
+Far-IR a_dust (and beta) sweep.
+
+Each beta is saved as its own sweep (parameter "beta"), readable with
+``load_farIR_parameter_sweep(..., beta=b)``.  By default every grid point
+is a full pipeline run; --templates reads the per-galaxy inputs once and
+evaluates the whole (a_dust, beta) grid from MBB template tables (see
+``farIR_fit.farIR_grid``).
+
+Usage:
+    python scripts/run_farIR_sweep.py --sim m100n1024 --n_a 90
+    python scripts/run_farIR_sweep.py --sim m100n1024 --n_a 90 --beta 1.5 1.8 2.0 2.2 --templates
+"""
 import sys
 import argparse
 from pathlib import Path
@@ -5,11 +18,41 @@ import numpy as np
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
+from src import instrument
 from src.config import load_config
 from src.backgrounds.farIR import lightcone_farIR_background
+from src.backgrounds.farIR_fit import farIR_galaxy_table, farIR_grid
 from src.utils import save_farIR_parameter_sweep
 
 
+def pipeline_sweep(cfg, args, a_values, beta):
+    """{a_dust: (lam, nuInu_nW)} from one pipeline run per a_dust."""
+    results_dict = {}
+    for i, a in enumerate(a_values):
+        print(f"  [{i+1}/{len(a_values)}] a_dust = {a:.4f}, beta = {beta:.2f}")
+        lam_fir, I_lam_fir = lightcone_farIR_background(
+            cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max,
+            a_dust=a, beta=beta, checkpoint=args.checkpoint,
+            n_workers=args.n_workers
+        )
+        nuInu_fir = lam_fir * I_lam_fir
+        nuInu_nW = nuInu_fir * 1e6
+        results_dict[a] = (lam_fir, nuInu_nW)
+    return results_dict
+
+
+def template_sweeps(cfg, args, a_values):
+    """[{a_dust: (lam, nuInu_nW)} per beta] from one read of the galaxies."""
+    table = farIR_galaxy_table(cfg, area_deg2=args.area, z_min=args.z_min,
+                               z_max=args.z_max, checkpoint=args.checkpoint,
+                               n_workers=args.n_workers)
+    with instrument.stage("farIR_grid"):
+        lam_fir, I_grid = farIR_grid(table, a_values, args.beta)
+    nuInu_nW = lam_fir * I_grid * 1e6
+    return [{a: (lam_fir, nuInu_nW[j, i]) for i, a in enumerate(a_values)}
+            for j in range(len(args.beta))]
+
+
 def main():
     parser = argparse.ArgumentParser(description="Far-IR a_dust sweep")
     parser.add_argument("--sim", default="m100n1024")
@@ -18,30 +61,47 @@ def main():
     parser.add_argument("--z_max", type=float, default=7.0)
     parser.add_argument("--a_min", type=float, default=-0.5)
     parser.add_argument("--a_max", type=float, default=0.5)
-    parser.add_argument("--n_a", type=int, default=90) 
+    parser.add_argument("--n_a", type=int, default=90)
+    parser.add_argument("--beta", type=float, nargs="+", default=[2.0],
+                        help="Emissivity index values (one sweep file each)")
+    parser.add_argument("--templates", action="store_true",
+                        help="Read the galaxies once and evaluate the grid "
+                             "from MBB template tables instead of one "
+                             "pipeline run per point")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="Checkpoint per-snapshot partial sums and resume "
+                             "from them (data/checkpoints)")
+    parser.add_argument("--n_workers", type=int, default=1,
+                        help="Processes for the per-snapshot background sums")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record stage timings and I/O; write a JSON run "
+                             "report next to the results")
     args = parser.parse_args()
+    if args.profile:
+        instrument.enable("run_farIR_sweep")
 
     cfg = load_config(args.sim)
     a_values = np.linspace(args.a_min, args.a_max, args.n_a)
 
     print(f"Running far-IR sweep: {cfg.name}, area={args.area}, "
-          f"z=[{args.z_min}, {args.z_max}], {len(a_values)} a_dust values")
+          f"z=[{args.z_min}, {args.z_max}], {len(a_values)} a_dust x "
+          f"{len(args.beta)} beta values")
 
-    results_dict = {}
-    for i, a in enumerate(a_values):
-        print(f"  [{i+1}/{len(a_values)}] a_dust = {a:.4f}")
-        lam_fir, I_lam_fir = lightcone_farIR_background(
-            cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max,
-            a_dust=a
-        )
-        nuInu_fir = lam_fir * I_lam_fir
-        nuInu_nW = nuInu_fir * 1e6
-        results_dict[a] = (lam_fir, nuInu_nW)
+    if args.templates:
+        sweeps = template_sweeps(cfg, args, a_values)
+    else:
+        sweeps = (pipeline_sweep(cfg, args, a_values, beta) for beta in args.beta)
 
-    save_farIR_parameter_sweep(cfg.name, args.z_min, args.z_max,
-                               a_values, results_dict)
+    for beta, results_dict in zip(args.beta, sweeps):
+        params = {"beta": beta}
+        if args.templates:
+            params["method"] = "templates"
+        out = save_farIR_parameter_sweep(cfg.name, args.z_min, args.z_max,
+                                         a_values, results_dict, area=args.area,
+                                         params=params)
+    instrument.write_report(out.with_suffix(".report.json"))
     print("Done.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
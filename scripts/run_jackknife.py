@@ -5,8 +5,16 @@ Splits the lightcone into 16 spatial regions (4x4 grid in RA/DEC),
 then computes backgrounds leaving out one region at a time.
 Uses jackknife variance formula to estimate errors.
 
+All leave-one-out samples come from a single pass with per-region
+accumulation, which also gives the analytic shot-noise error of every
+band.  Each sample is also split into redshift bins (--z_bins) and
+per-snapshot shells, so binned and cumulative EBL errors need no
+separate lightcones.
+
 Usage:
     python scripts/run_jackknife.py --sim m100n1024 --area 0.5 --z_min 0 --z_max 7
+    python scripts/run_jackknife.py --sim m100n1024 --z_bins 0 1 3 7
+    python scripts/run_jackknife.py --sim m100n1024 --profile   # + JSON run report
 """
 import argparse
 import os
@@ -17,16 +25,19 @@ os.environ.setdefault('SPS_HOME', '/home/spujni/fsps')
 
 import numpy as np
 import matplotlib.pyplot as plt
-import h5py
 import astropy.units as u
 from astropy.constants import c as c_light
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
+from src import instrument
 from src.config import load_config
 from src.backgrounds.optical import lightcone_optical_background, build_lightcone as build_lc_optical
 from src.backgrounds.farIR import lightcone_farIR_background, build_lightcone as build_lc_farIR
 from src.backgrounds.radio import lightcone_radio_background, build_lightcone as build_lc_radio
+from src.backgrounds.accumulate import SpectrumAccumulator, region_labels
+from src.lightcone.layout import read_lightcone
+from src.store import ResultsStore, lightcone_params
 
 
 def load_lightcone_coords(cfg, area_deg2, z_min, z_max):
@@ -34,10 +45,9 @@ def load_lightcone_coords(cfg, area_deg2, z_min, z_max):
     # Build/load the lightcone (uses optical's build_lightcone)
     lc_path = build_lc_optical(cfg, area_deg2, z_min, z_max)
 
-    with h5py.File(lc_path, "r") as lc:
-        ra = lc["RA"][:]
-        dec = lc["DEC"][:]
-        n_gal = len(ra)
+    lc = read_lightcone(lc_path, ("RA", "DEC"))
+    ra, dec = lc["RA"], lc["DEC"]
+    n_gal = len(ra)
 
     return ra, dec, n_gal
 
@@ -105,11 +115,21 @@ def jackknife_variance(samples):
     return mean, variance, std
 
 
-def run_jackknife(cfg, args, n_regions_per_side=4, a_dust=-0.017341):
+def run_jackknife(cfg, args, n_regions_per_side=4, a_dust=-0.017341,
+                  z_edges=None):
     """
     Run jackknife error estimation for all three backgrounds.
+
+    Each background is computed once with per-region accumulation; the
+    leave-one-region-out samples are the total minus each region's sum,
+    identical to rerunning with ``galaxy_mask = ~region_mask``.  The same
+    pass gives the shot-noise (Poisson) error of every band and, if
+    ``z_edges`` is given, redshift-binned and per-snapshot-shell samples.
     """
     n_regions = n_regions_per_side ** 2
+    checkpoint = getattr(args, "checkpoint", False)
+    n_workers = getattr(args, "n_workers", 1)
+    comm = getattr(args, "comm", None)
     print(f"\n=== Jackknife Error Estimation ({n_regions} regions) ===\n")
 
     # Load lightcone coordinates
@@ -120,149 +140,126 @@ def run_jackknife(cfg, args, n_regions_per_side=4, a_dust=-0.017341):
     # Create spatial regions
     print(f"Splitting into {n_regions} spatial regions...")
     region_masks = create_spatial_regions(ra, dec, n_regions_per_side)
+    regions = region_labels(region_masks, n_gal)
 
     region_counts = [mask.sum() for mask in region_masks]
     print(f"Galaxies per region: min={min(region_counts)}, max={max(region_counts)}, "
           f"mean={np.mean(region_counts):.1f}")
 
-    # Storage for jackknife samples
-    optical_samples = []
-    optical_samples_nodust = []
-    farIR_samples = []
-    radio_samples = []
-
-    # Reference wavelength grids (will be set from first run)
-    lam_opt = None
-    lam_fir = None
-    nu_radio = None
-
-    # Run backgrounds leaving out each region
-    for i in range(n_regions):
-        print(f"\n--- Jackknife sample {i + 1}/{n_regions} (excluding region {i}) ---")
-
-        # Create mask: include all galaxies EXCEPT those in region i
-        jackknife_mask = ~region_masks[i]
-        n_included = jackknife_mask.sum()
-        print(f"Including {n_included} galaxies ({100 * n_included / n_gal:.1f}%)")
-
-        # Optical/NIR
-        print("  Computing optical/NIR background...")
-        lam, I_nu, I_nu_nodust = lightcone_optical_background(
-            cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max,
-            galaxy_mask=jackknife_mask
-        )
-
-        valid = np.isfinite(lam) & np.isfinite(I_nu) & (lam > 0)
-        lam   = lam[valid]
-        I_nu  = I_nu[valid]
-        I_nu_nodust = I_nu_nodust[valid]
-
-        if lam_opt is None:
-            lam_opt = lam
-        nu_opt = (c_light / (lam * u.AA)).to_value(u.Hz)
-        nuInu = nu_opt * I_nu * 1e6  # nW m^-2 sr^-1
-        nuInu_nodust = nu_opt * I_nu_nodust * 1e6  # nW m^-2 sr^-1
-
-        optical_samples.append(nuInu)
-        optical_samples_nodust.append(nuInu_nodust)
-
-        # Far-IR
-        print("  Computing far-IR background...")
-        lam_f, I_lam_f, _, _ = lightcone_farIR_background(
-            cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max,
-            a_dust=a_dust, return_dust_temps=True, galaxy_mask=jackknife_mask
-        )
-        if lam_fir is None:
-            lam_fir = lam_f
-        nuInu_fir = lam_f * I_lam_f * 1e6  # nW m^-2 sr^-1
-        farIR_samples.append(nuInu_fir)
-
-        # Radio
-        print("  Computing radio background...")
-        nu_r, I_nu_r, _, _ = lightcone_radio_background(
-            cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max,
-            galaxy_mask=jackknife_mask
-        )
-        if nu_radio is None:
-            nu_radio = nu_r
-        nuInu_radio = nu_r * I_nu_r * 1e6  # nW m^-2 sr^-1
-        radio_samples.append(nuInu_radio)
-
-    # Convert to arrays
-    optical_samples = np.array(optical_samples)
-    optical_samples_nodust = np.array(optical_samples_nodust)
-    farIR_samples = np.array(farIR_samples)
-    radio_samples = np.array(radio_samples)
+    acc_opt = SpectrumAccumulator(z_edges, regions=regions)
+    acc_fir = SpectrumAccumulator(z_edges, regions=regions)
+    acc_rad = SpectrumAccumulator(z_edges, regions=regions)
+
+    # Optical/NIR
+    print("\n  Computing optical/NIR background...")
+    lam, I_nu, _ = lightcone_optical_background(
+        cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max,
+        accumulator=acc_opt, checkpoint=checkpoint, n_workers=n_workers,
+        comm=comm
+    )
+    opt_valid = np.isfinite(lam) & np.isfinite(I_nu) & (lam > 0)
+    lam_opt = lam[opt_valid]
+    nu_opt = (c_light / (lam_opt * u.AA)).to_value(u.Hz)
+
+    # Far-IR
+    print("  Computing far-IR background...")
+    lam_fir, _, _, _ = lightcone_farIR_background(
+        cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max,
+        a_dust=a_dust, return_dust_temps=True, accumulator=acc_fir,
+        checkpoint=checkpoint, n_workers=n_workers, comm=comm
+    )
+
+    # Radio
+    print("  Computing radio background...")
+    nu_radio, _, _, _ = lightcone_radio_background(
+        cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max,
+        accumulator=acc_rad, checkpoint=checkpoint, n_workers=n_workers,
+        comm=comm
+    )
+
+    # band -> (accumulator, {result suffix: component},
+    #          intensity → νIν [nW m^-2 sr^-1] factor, channel mask)
+    bands = {
+        "optical": (acc_opt, {"": "dust", "_nodust": "nodust"},
+                    nu_opt * 1e6, opt_valid),
+        "farIR":   (acc_fir, {"": "total"}, lam_fir * 1e6, None),
+        "radio":   (acc_rad, {"": "total"}, nu_radio * 1e6, None),
+    }
 
     # Compute jackknife statistics
     print("\n=== Computing jackknife statistics ===")
 
-    opt_mean, opt_var, opt_std = jackknife_variance(optical_samples)
-    opt_nodust_mean, opt_nodust_var, opt_nodust_std = jackknife_variance(optical_samples_nodust)
-    fir_mean, fir_var, fir_std = jackknife_variance(farIR_samples)
-    radio_mean, radio_var, radio_std = jackknife_variance(radio_samples)
-
     # Convert wavelengths to microns
-    lam_opt_um = lam_opt * 1e-4
-    lam_fir_um = lam_fir * 1e-4
-    lam_radio_um = (c_light / (nu_radio * u.Hz)).to_value(u.AA) * 1e-4
-
-    results = {
-        "optical": {
-            "lam_um": lam_opt_um,
-            "mean": opt_mean,
-            "std": opt_std,
-            "samples": optical_samples,
-            "mean_nodust": opt_nodust_mean,
-            "std_nodust": opt_nodust_std,
-            "samples_nodust": optical_samples_nodust,
-        },
-        "farIR": {
-            "lam_um": lam_fir_um,
-            "mean": fir_mean,
-            "std": fir_std,
-            "samples": farIR_samples,
-        },
-        "radio": {
-            "lam_um": lam_radio_um,
-            "mean": radio_mean,
-            "std": radio_std,
-            "samples": radio_samples,
-        },
-        "n_regions": n_regions,
-        "region_counts": region_counts,
+    lam_um = {
+        "optical": lam_opt * 1e-4,
+        "farIR": lam_fir * 1e-4,
+        "radio": (c_light / (nu_radio * u.Hz)).to_value(u.AA) * 1e-4,
     }
 
+    results = {"n_regions": n_regions, "region_counts": region_counts,
+               "a_dust": a_dust, "z_edges": z_edges}
+    for band, (acc, comps, to_nW, valid) in bands.items():
+        keep = slice(None) if valid is None else valid
+        res = {"lam_um": lam_um[band]}
+        zbins = {"z_edges": np.asarray(z_edges, dtype=float)} if z_edges is not None else None
+        shells = {}
+
+        for suffix, comp in comps.items():
+            samples = acc.jackknife_samples(comp)[:, keep] * to_nW
+            mean, _, std = jackknife_variance(samples)
+            shot_var = acc.shot_noise_variance(comp)[keep] * to_nW ** 2
+            res["mean" + suffix] = mean
+            res["std" + suffix] = std
+            res["samples" + suffix] = samples
+            res["shot_std" + suffix] = np.sqrt(shot_var)
+
+            if zbins is not None:
+                zb = acc.jackknife_zbinned(comp)[..., keep] * to_nW
+                zb_mean, _, zb_std = jackknife_variance(zb)
+                zbins["mean" + suffix] = zb_mean
+                zbins["std" + suffix] = zb_std
+                zbins["samples" + suffix] = zb
+
+                snaps, z_mean, sh = acc.jackknife_shells(comp)
+                shells["snaps"] = snaps
+                shells["z_mean"] = z_mean
+                shells["samples" + suffix] = sh[..., keep] * to_nW
+
+        if zbins is not None:
+            res["zbins"] = zbins
+            res["shells"] = shells
+        results[band] = res
+
     return results
 
 
 def save_results(cfg, args, results):
-    """Save jackknife results to HDF5."""
-    out_dir = Path("data/jackknife")
-    out_dir.mkdir(parents=True, exist_ok=True)
-
-    out_file = out_dir / f"jackknife_{cfg.name}_a{args.area}_z{args.z_min}-{args.z_max}.h5"
-
-    with h5py.File(out_file, "w") as f:
-        f.attrs["simulation"] = cfg.name
-        f.attrs["area_deg2"] = args.area
-        f.attrs["z_min"] = args.z_min
-        f.attrs["z_max"] = args.z_max
-        f.attrs["n_regions"] = results["n_regions"]
-
-        for band in ["optical", "farIR", "radio"]:
-            grp = f.create_group(band)
-            grp.create_dataset("lam_um", data=results[band]["lam_um"])
-            grp.create_dataset("mean", data=results[band]["mean"])
-            grp.create_dataset("std", data=results[band]["std"])
-            grp.create_dataset("samples", data=results[band]["samples"])
-            if band == "optical":
-                grp.create_dataset("mean_nodust", data=results[band]["mean_nodust"])
-                grp.create_dataset("std_nodust", data=results[band]["std_nodust"])
-                grp.create_dataset("samples_nodust", data=results[band]["samples_nodust"])
-
-    print(f"\nSaved results → {out_file}")
-    return out_file
+    """Save jackknife results to the results store."""
+    params = {
+        "sim": cfg.name, "area_deg2": args.area,
+        "z_min": args.z_min, "z_max": args.z_max,
+        "n_regions": results["n_regions"], "a_dust": results["a_dust"],
+        "z_bins": results["z_edges"],
+        **lightcone_params(cfg.name, args.area, args.z_min, args.z_max),
+    }
+
+    data = {}
+    for band in ["optical", "farIR", "radio"]:
+        keys = ["lam_um", "mean", "std", "samples", "shot_std"]
+        if band == "optical":
+            keys += ["mean_nodust", "std_nodust", "samples_nodust", "shot_std_nodust"]
+        data[band] = {key: results[band][key] for key in keys}
+        if "zbins" in results[band]:
+            data[band]["zbins"] = results[band]["zbins"]
+            data[band]["shells"] = results[band]["shells"]
+
+    attrs = {"/": {"simulation": cfg.name, "area_deg2": args.area,
+                   "z_min": args.z_min, "z_max": args.z_max,
+                   "n_regions": results["n_regions"]}}
+    run = ResultsStore().put("jackknife", params, data, attrs=attrs)
+
+    print(f"\nSaved results → {run.path}")
+    return run.path
 
 
 def print_summary(results):
@@ -284,11 +281,14 @@ def print_summary(results):
             peak_val = mean[valid][peak_idx]
             peak_err = std[valid][peak_idx]
             rel_err = 100 * peak_err / peak_val if peak_val > 0 else 0
+            shot_err = data["shot_std"][valid][peak_idx]
+            rel_shot = 100 * shot_err / peak_val if peak_val > 0 else 0
 
             print(f"\n{band.upper()}:")
             print(f"  Peak at λ = {peak_lam:.2f} µm")
             print(f"  νIν = {peak_val:.4f} ± {peak_err:.4f} nW m⁻² sr⁻¹")
-            print(f"  Relative error: {rel_err:.1f}%")
+            print(f"  Relative error: {rel_err:.1f}% "
+                  f"(shot noise: {rel_shot:.1f}%)")
 
         if band == "optical":
             mean_nodust = data["mean_nodust"]
@@ -318,14 +318,31 @@ def main():
     parser.add_argument("--z_max", type=float, default=7.0)
     parser.add_argument("--n_regions", type=int, default=4,
                         help="Number of regions per side (default: 4 → 16 total)")
+    parser.add_argument("--z_bins", type=float, nargs="*",
+                        default=[0.0, 1.0, 3.0, 7.0],
+                        help="Redshift bin edges for the one-pass decomposition "
+                             "(pass with no values to disable)")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="Checkpoint per-snapshot partial sums and resume "
+                             "from them (data/checkpoints)")
+    parser.add_argument("--n_workers", type=int, default=1,
+                        help="Processes for the per-snapshot background sums")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record stage timings and I/O; write a JSON run "
+                             "report next to the results")
     args = parser.parse_args()
+    if args.profile:
+        instrument.enable("run_jackknife")
 
     cfg = load_config(args.sim)
     print(f"Running jackknife on {cfg.name} (box={cfg.box_size_mpc_h} Mpc/h)")
 
-    results = run_jackknife(cfg, args, n_regions_per_side=args.n_regions)
+    z_edges = args.z_bins if args.z_bins and len(args.z_bins) >= 2 else None
+    results = run_jackknife(cfg, args, n_regions_per_side=args.n_regions,
+                            z_edges=z_edges)
 
-    save_results(cfg, args, results)
+    out_file = save_results(cfg, args, results)
+    instrument.write_report(out_file.with_suffix(".report.json"))
 
     print_summary(results)
 
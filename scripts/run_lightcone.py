@@ -3,6 +3,7 @@ Usage:
     python scripts/run_lightcone.py --sim m100n1024 --area 0.5 --z_min 0 --z_max 7
     python scripts/run_lightcone.py --sim m100n1024 --area 0.5 --z_min 0 --z_max 7 --midsnap
     python scripts/run_lightcone.py --sim m25n256 --area 1.0 --z_min 0 --z_max 3 --snap_step 1
+    python scripts/run_lightcone.py --compact data/lightcones/*.h5
 """
 import argparse
 import sys
@@ -10,8 +11,10 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
+from src import instrument
 from src.config import load_config
 from src.lightcone.generate import generate_lightcone
+from src.lightcone.layout import compact_lightcone
 
 
 def main():
@@ -29,13 +32,33 @@ def main():
                         help="Use even snapshot set (0,2,4,...) and centre "
                              "the comoving offset on the intermediate snap. "
                              "Default uses the odd set (1,3,5,...).")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Seed for the random axes and box offsets")
+    parser.add_argument("--compact", nargs="+", metavar="LC_FILE",
+                        help="Rewrite existing lightcone files in the current "
+                             "compressed layout and exit")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record per-snapshot timings and I/O; write a JSON "
+                             "run report next to the lightcone")
     args = parser.parse_args()
+    if args.compact:
+        for path in map(Path, args.compact):
+            before = path.stat().st_size
+            if compact_lightcone(path):
+                print(f"{path}: {before / 1e6:.1f} → {path.stat().st_size / 1e6:.1f} MB")
+            else:
+                print(f"{path}: already compact")
+        return
+    if args.profile:
+        instrument.enable("run_lightcone")
 
     cfg = load_config(args.sim)
     print(f"Generating lightcone for {cfg.name}")
 
-    generate_lightcone(cfg, args.area, args.z_min, args.z_max,
-                       snap_step=args.snap_step, midsnap=args.midsnap)
+    out = generate_lightcone(cfg, args.area, args.z_min, args.z_max,
+                             snap_step=args.snap_step, midsnap=args.midsnap,
+                             seed=args.seed)
+    instrument.write_report(Path(out).with_suffix(".report.json"))
 
 
 if __name__ == "__main__":
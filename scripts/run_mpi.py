@@ -0,0 +1,128 @@
+"""
+Run the background pipelines across MPI ranks (requires mpi4py).
+
+  combined  – optical + far-IR + radio backgrounds, snapshot shells
+              split across ranks (same result as run_combined.py)
+  jackknife – the one-pass jackknife, shells split across ranks
+              (same result as run_jackknife.py)
+  sweep     – far-IR a_dust sweep, sweep points split across ranks
+              (same result as run_farIR_sweep.py)
+
+Every rank computes its share and the spectra are combined with MPI
+collectives; only rank 0 writes to the results store.  On one machine:
+
+Usage:
+    mpirun -n 4 python scripts/run_mpi.py combined --sim m25n256 --area 1.0 --z_max 3
+    mpirun -n 4 python scripts/run_mpi.py jackknife --sim m100n1024 --z_bins 0 1 3 7
+    mpirun -n 4 python scripts/run_mpi.py sweep --sim m100n1024 --n_a 90
+    mpirun -n 2 python scripts/run_mpi.py combined --n_workers 4   # 2 ranks x 4 processes
+    mpirun -n 4 python scripts/run_mpi.py sweep --profile          # one report per rank
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault('SPS_HOME', '/home/spujni/fsps')
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from src import instrument
+from src.config import load_config
+from src.backgrounds.mpi import get_comm, is_root, split_items, gather_items, prepare_lightcone
+from src.backgrounds.optical import build_lightcone
+from src.backgrounds.farIR import lightcone_farIR_background
+from src.utils import save_farIR_parameter_sweep
+
+
+def run_combined(cfg, args):
+    from run_combined import compute_backgrounds
+    return compute_backgrounds(cfg, args)["path"]
+
+
+def run_jackknife(cfg, args):
+    from run_jackknife import run_jackknife, save_results, print_summary
+    z_edges = args.z_bins if args.z_bins and len(args.z_bins) >= 2 else None
+    results = run_jackknife(cfg, args, n_regions_per_side=args.n_regions,
+                            z_edges=z_edges)
+    if not is_root(args.comm):
+        return None
+    print_summary(results)
+    return save_results(cfg, args, results)
+
+
+def run_sweep(cfg, args):
+    comm = args.comm
+    a_values = np.linspace(args.a_min, args.a_max, args.n_a)
+    local = []
+    for i, a in split_items(comm, a_values):
+        print(f"  [rank {comm.Get_rank()}] [{i+1}/{len(a_values)}] a_dust = {a:.4f}")
+        lam_fir, I_lam_fir = lightcone_farIR_background(
+            cfg, area_deg2=args.area, z_min=args.z_min, z_max=args.z_max,
+            a_dust=a, checkpoint=args.checkpoint, n_workers=args.n_workers
+        )
+        local.append((i, (lam_fir, lam_fir * I_lam_fir * 1e6)))
+
+    spectra = gather_items(comm, local)
+    if spectra is None:
+        return None
+    return save_farIR_parameter_sweep(cfg.name, args.z_min, args.z_max, a_values,
+                                      dict(zip(a_values, spectra)), area=args.area)
+
+
+MODES = {"combined": run_combined, "jackknife": run_jackknife, "sweep": run_sweep}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="MPI-distributed cosmic background pipelines")
+    parser.add_argument("mode", choices=sorted(MODES))
+    parser.add_argument("--sim", default="m100n1024",
+                        choices=["m25n256", "m50n512", "m100n1024"])
+    parser.add_argument("--area", type=float, default=0.5)
+    parser.add_argument("--z_min", type=float, default=0.0)
+    parser.add_argument("--z_max", type=float, default=7.0)
+    parser.add_argument("--n_regions", type=int, default=4,
+                        help="jackknife: regions per side")
+    parser.add_argument("--z_bins", type=float, nargs="*",
+                        default=[0.0, 1.0, 3.0, 7.0],
+                        help="jackknife: redshift bin edges")
+    parser.add_argument("--a_min", type=float, default=-0.5)
+    parser.add_argument("--a_max", type=float, default=0.5)
+    parser.add_argument("--n_a", type=int, default=90,
+                        help="sweep: number of a_dust values")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="Checkpoint per-snapshot partial sums and resume "
+                             "from them (data/checkpoints)")
+    parser.add_argument("--n_workers", type=int, default=1,
+                        help="Processes per rank for the per-snapshot sums")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record stage timings and I/O; write one JSON "
+                             "run report per rank next to the results")
+    args = parser.parse_args()
+
+    comm = get_comm()
+    args.comm = comm
+    rank, size = comm.Get_rank(), comm.Get_size()
+    if args.profile:
+        instrument.enable(f"run_mpi.{args.mode}.rank{rank}")
+
+    cfg = load_config(args.sim)
+    if is_root(comm):
+        print(f"Running {args.mode} on {cfg.name} across {size} MPI ranks")
+
+    prepare_lightcone(comm, build_lightcone, cfg, args.area, args.z_min, args.z_max)
+    out = MODES[args.mode](cfg, args)
+
+    out = comm.bcast(out, root=0)
+    if out is not None:
+        instrument.write_report(Path(out).with_suffix(f".rank{rank}.report.json"))
+    if is_root(comm):
+        print("Done.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Production campaign: lightcones → backgrounds → jackknife → EBL figures.
+
+For every simulation and redshift range the campaign chains
+
+    run_lightcone.py → run_combined.py ┐
+                     → run_jackknife.py ┴→ plot_ebl.py
+
+as a task graph (see ``src.pipeline``).  Tasks whose command line,
+input contents (their script, all of ``src``, the simulation config and
+snapshot catalogues, the observed EBL for the figures) and upstream
+outputs are unchanged since their last successful run are
+skipped; the rest run concurrently, different simulations and redshift
+ranges side by side, within --cores.  Task logs and records go to
+data/pipeline/.
+
+Usage:
+    python scripts/run_pipeline.py --cores 16 --n_workers 4
+    python scripts/run_pipeline.py --sims m25n256 m50n512 --z_ranges 0-1 1-3 3-7
+    python scripts/run_pipeline.py --dry_run
+    python scripts/run_pipeline.py --force "jackknife:m100n1024*"
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import CONFIG_DIR, load_config
+from src.pipeline import ROOT, Pipeline, StoreOutput, Task
+from src.store import LIGHTCONE_DIR
+
+SCRIPTS = ROOT / "scripts"
+SRC = ROOT / "src"
+FIG_ROOT = Path("figures/ebl_final")
+# Observed EBL points plot_ebl.py overlays
+OBS_EBL = ROOT / "data" / "ebl" / "ebldata.csv"
+
+
+def z_range(text):
+    """'1-3' → (1.0, 3.0)."""
+    lo, hi = text.split("-")
+    return float(lo), float(hi)
+
+
+def snapshot_files(cfg):
+    """Every catalogue file the pipelines of a simulation read."""
+    pattern = f"{cfg.snapshot_prefix}_*.hdf5"
+    return sorted(set(cfg.catalogue_dir.glob(pattern)) | set(cfg.hdf5_dir.glob(pattern)))
+
+
+def campaign(args):
+    """The campaign's tasks: one chain per (simulation, redshift range)."""
+    python = sys.executable
+    tasks = []
+    for sim in args.sims:
+        cfg = load_config(sim)
+        catalogues = snapshot_files(cfg)
+        config = CONFIG_DIR / f"{sim}.yaml"
+        for z_min, z_max in args.z_ranges:
+            tag = f"{sim}:a{args.area}_z{z_min}-{z_max}"
+            field = ["--sim", sim, "--area", args.area, "--z_min", z_min, "--z_max", z_max]
+            query = dict(sim=sim, area_deg2=args.area, z_min=z_min, z_max=z_max)
+            workers = ["--n_workers", args.n_workers] + (["--checkpoint"] if args.checkpoint else [])
+
+            lightcone_argv = [python, SCRIPTS / "run_lightcone.py", *field,
+                              "--snap_step", args.snap_step]
+            if args.seed is not None:
+                lightcone_argv += ["--seed", args.seed]
+            lightcone = Task(
+                f"lightcone:{tag}", lightcone_argv,
+                inputs=[SCRIPTS / "run_lightcone.py", SRC, config, *catalogues],
+                outputs=[LIGHTCONE_DIR / f"lc_{sim}_a{args.area}_z{z_min}-{z_max}.h5"])
+
+            sources = [SRC, config, *catalogues]
+            combined = Task(
+                f"combined:{tag}",
+                [python, SCRIPTS / "run_combined.py", *field, *workers],
+                inputs=[SCRIPTS / "run_combined.py", *sources],
+                outputs=[StoreOutput("background", **query)],
+                deps=[lightcone], cores=args.n_workers)
+
+            z_bins = [z_min] + [z for z in args.z_bins if z_min < z < z_max] + [z_max]
+            jackknife = Task(
+                f"jackknife:{tag}",
+                [python, SCRIPTS / "run_jackknife.py", *field, *workers,
+                 "--n_regions", args.n_regions, "--z_bins", *z_bins],
+                inputs=[SCRIPTS / "run_jackknife.py", *sources],
+                outputs=[StoreOutput("jackknife", **query)],
+                deps=[lightcone], cores=args.n_workers)
+
+            fig_dir = FIG_ROOT / f"{sim}_a{args.area}_z{z_min}-{z_max}"
+            plot = Task(
+                f"plot:{tag}",
+                [python, SCRIPTS / "plot_ebl.py", *field, "--fig_dir", fig_dir],
+                inputs=[SCRIPTS / "plot_ebl.py", SRC, OBS_EBL],
+                outputs=[ROOT / fig_dir / "ebl_full_jackknife.png",
+                         ROOT / fig_dir / "ebl_jackknife_bins.png"],
+                deps=[combined, jackknife])
+            tasks.append(plot)
+    return tasks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the production campaign")
+    parser.add_argument("--sims", nargs="+", default=["m25n256", "m50n512", "m100n1024"],
+                        choices=["m25n256", "m50n512", "m100n1024"])
+    parser.add_argument("--area", type=float, default=0.5)
+    parser.add_argument("--z_ranges", type=z_range, nargs="+", default=[(0.0, 7.0)],
+                        help="Redshift ranges, each its own lightcone and "
+                             "chain of tasks (e.g. 0-1 1-3 3-7)")
+    parser.add_argument("--z_bins", type=float, nargs="*", default=[1.0, 3.0],
+                        help="Inner jackknife redshift-bin edges, applied "
+                             "within each range")
+    parser.add_argument("--n_regions", type=int, default=4)
+    parser.add_argument("--snap_step", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Lightcone seed (recommended: without one a "
+                             "rebuilt lightcone differs and invalidates "
+                             "everything downstream)")
+    parser.add_argument("--n_workers", type=int, default=1,
+                        help="Processes per background / jackknife task")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="Checkpoint per-snapshot partial sums in the "
+                             "background and jackknife tasks")
+    parser.add_argument("--cores", type=int, default=os.cpu_count() or 1,
+                        help="Cores shared by the concurrently running tasks")
+    parser.add_argument("--force", nargs="+", default=[], metavar="PATTERN",
+                        help="Rerun tasks matching these names / glob patterns")
+    parser.add_argument("--dry_run", action="store_true",
+                        help="Only list the tasks that would run")
+    args = parser.parse_args()
+
+    pipeline = Pipeline(campaign(args))
+    print(f"{len(pipeline.order)} tasks, {args.cores} cores")
+    status = pipeline.run(max_cores=args.cores, force=args.force, dry_run=args.dry_run)
+
+    counts = {}
+    for s in status.values():
+        counts[s] = counts.get(s, 0) + 1
+    print(", ".join(f"{n} {s}" for s, n in sorted(counts.items())))
+    if any(s in ("failed", "blocked") for s in status.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Angular auto- and cross-power spectra of the background maps.
+
+Reads the map cubes written by ``make_maps.py`` for the given bands
+(all on the same pixel grid), transforms every channel once and
+computes the binned C_ell of every channel pair — CIB and radio
+anisotropies and the far-IR x radio, optical x far-IR, ... cross-spectra
+— from the shared transforms (see ``src.analysis.power``).  Results go
+to the results store as kind "power_spectra".
+
+Usage:
+    python scripts/run_power_spectra.py --sim m100n1024 --pix_arcsec 5
+    python scripts/run_power_spectra.py --bands farIR radio --n_bins 25 --raw
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src import instrument
+from src.analysis.maps import load_map_cube, map_path
+from src.analysis.power import cross_correlation, ell_bins, map_transforms, power_spectra
+from src.store import ResultsStore, lightcone_params
+
+C_UM_GHZ = 2.99792458e5     # speed of light [µm GHz]
+
+
+def load_fields(args):
+    """Stacked maps of every band channel, their labels and the common grid."""
+    maps, labels, grid = [], [], None
+    for band in args.bands:
+        cube = load_map_cube(map_path(band, args.sim, args.area, args.z_min,
+                                      args.z_max, args.pix_arcsec))
+        # Cubes binned from RA/DEC read as degrees but stored in radians
+        # cover (pi/180)^2 of the cone; their multipoles are meaningless
+        cone_sr = args.area * (np.pi / 180.0) ** 2
+        if cube["grid"].n_pix * cube["grid"].pixel_sr < 0.5 * cone_sr:
+            raise ValueError(f"{band} maps cover less than the {args.area} deg^2 "
+                             f"cone; rerun make_maps.py to rebuild them")
+        if grid is None:
+            grid = cube["grid"]
+        elif cube["grid"].attrs() != grid.attrs():
+            raise ValueError(f"{band} maps are on a different grid "
+                             f"({cube['grid'].attrs()} != {grid.attrs()})")
+        key = "maps" if args.raw or "convolved" not in cube else "convolved"
+        maps.append(cube[key])
+        if band == "radio":
+            labels += [f"radio_{C_UM_GHZ / lam:.3g}GHz" for lam in cube["channels"]]
+        else:
+            labels += [f"{band}_{lam:.3g}um" for lam in cube["channels"]]
+    return np.concatenate(maps), labels, grid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Angular power spectra of background maps")
+    parser.add_argument("--sim", default="m100n1024",
+                        choices=["m25n256", "m50n512", "m100n1024"])
+    parser.add_argument("--area", type=float, default=0.5)
+    parser.add_argument("--z_min", type=float, default=0.0)
+    parser.add_argument("--z_max", type=float, default=7.0)
+    parser.add_argument("--pix_arcsec", type=float, default=5.0)
+    parser.add_argument("--bands", nargs="+", default=["optical", "farIR", "radio"],
+                        choices=["optical", "farIR", "radio"])
+    parser.add_argument("--n_bins", type=int, default=20)
+    parser.add_argument("--ell_min", type=float, default=None)
+    parser.add_argument("--ell_max", type=float, default=None)
+    parser.add_argument("--raw", action="store_true",
+                        help="Use the maps before PSF convolution")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record stage timings and I/O; write a JSON run "
+                             "report next to the results")
+    args = parser.parse_args()
+    if args.profile:
+        instrument.enable("run_power_spectra")
+
+    maps, labels, grid = load_fields(args)
+    print(f"Power spectra of {len(labels)} maps ({grid.n_x} x {grid.n_y} pixels)")
+
+    edges = ell_bins(grid, args.n_bins, args.ell_min, args.ell_max)
+    with instrument.stage("fft"):
+        transforms = map_transforms(maps, grid)
+    with instrument.stage("spectra"):
+        ell, n_modes, cl = power_spectra(transforms, grid, edges)
+
+    params = {"sim": args.sim, "area_deg2": args.area,
+              "z_min": args.z_min, "z_max": args.z_max,
+              "pix_arcsec": args.pix_arcsec, "bands": args.bands,
+              "n_bins": args.n_bins, "ell_min": args.ell_min,
+              "ell_max": args.ell_max, "raw": args.raw}
+    params.update(lightcone_params(args.sim, args.area, args.z_min, args.z_max))
+    data = {"ell": ell, "ell_edges": edges, "n_modes": n_modes, "cl": cl,
+            "r": cross_correlation(cl)}
+    attrs = {"/": {"fields": json.dumps(labels), "unit": "(nW m^-2 sr^-1)^2 sr"}}
+    run = ResultsStore().put("power_spectra", params, data, attrs=attrs)
+    print(f"Power spectra saved → {run.path}")
+    instrument.write_report(run.path.with_suffix(".report.json"))
+
+
+if __name__ == "__main__":
+    main()
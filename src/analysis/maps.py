@@ -0,0 +1,271 @@
+"""
+Sky intensity maps of the lightcone backgrounds.
+
+Lightcone galaxies are projected onto a tangent-plane pixel grid about
+the cone centre (:class:`SkyGrid`, positions in degrees) and their per-channel fluxes summed
+per pixel with ``np.bincount``, one block of galaxies at a time, so
+memory stays at one block of fluxes plus the map cube however many
+galaxies and channels there are.  Maps are convolved with instrument
+PSFs through zero-padded FFTs (:func:`convolve_fft`, or
+:func:`convolve_psf` for Gaussian beams of per-channel width) and
+written as chunked HDF5 cubes of shape (n_channels, n_y, n_x).
+"""
+
+from pathlib import Path
+
+import numpy as np
+import h5py
+
+from src.backgrounds.accumulate import BLOCK_ROWS
+
+MAP_DIR = Path(__file__).resolve().parent.parent.parent / "data" / "maps"
+
+ARCSEC_PER_RAD = 180.0 / np.pi * 3600.0
+FWHM_TO_SIGMA = 1.0 / np.sqrt(8.0 * np.log(2.0))
+
+
+def map_path(band, sim, area_deg2, z_min, z_max, pix_arcsec):
+    """Default location of a band's map cube in ``MAP_DIR``."""
+    return MAP_DIR / f"map_{band}_{sim}_a{area_deg2}_z{z_min}-{z_max}_p{pix_arcsec}.h5"
+
+
+class SkyGrid:
+    """
+    Square-pixel grid on the plane tangent to the sky at (ra0, dec0).
+
+    Parameters
+    ----------
+    ra0, dec0  : float – tangent point [deg]
+    pix_arcsec : float – pixel side
+    n_x, n_y   : int   – pixels along RA and DEC; the tangent point is
+                         the grid centre
+    """
+
+    def __init__(self, ra0, dec0, pix_arcsec, n_x, n_y):
+        self.ra0 = float(ra0)
+        self.dec0 = float(dec0)
+        self.pix_arcsec = float(pix_arcsec)
+        self.n_x = int(n_x)
+        self.n_y = int(n_y)
+
+    @classmethod
+    def covering(cls, ra, dec, pix_arcsec):
+        """
+        The smallest grid centred on the cone that holds every galaxy,
+        given their RA and DEC in degrees (``layout.read_radec_deg``;
+        lightcone files store radians).
+        """
+        ra = np.asarray(ra, dtype=float)
+        dec = np.asarray(dec, dtype=float)
+        ra0 = 0.5 * (ra.min() + ra.max())
+        dec0 = 0.5 * (dec.min() + dec.max())
+        x, y = cls(ra0, dec0, pix_arcsec, 1, 1).project(ra, dec)
+        pix_rad = pix_arcsec / ARCSEC_PER_RAD
+        n_x = 2 * int(np.abs(x).max() // pix_rad) + 2
+        n_y = 2 * int(np.abs(y).max() // pix_rad) + 2
+        return cls(ra0, dec0, pix_arcsec, n_x, n_y)
+
+    @property
+    def shape(self):
+        return (self.n_y, self.n_x)
+
+    @property
+    def n_pix(self):
+        return self.n_y * self.n_x
+
+    @property
+    def pixel_sr(self):
+        """Solid angle of one pixel [sr] (flat-sky)."""
+        return (self.pix_arcsec / ARCSEC_PER_RAD) ** 2
+
+    def project(self, ra, dec):
+        """Gnomonic (x, y) [rad] of sky positions [deg]; x grows with RA."""
+        ra = np.deg2rad(np.asarray(ra, dtype=float))
+        dec = np.deg2rad(np.asarray(dec, dtype=float))
+        ra0, dec0 = np.deg2rad(self.ra0), np.deg2rad(self.dec0)
+        dra = ra - ra0
+        cos_c = (np.sin(dec0) * np.sin(dec)
+                 + np.cos(dec0) * np.cos(dec) * np.cos(dra))
+        x = np.cos(dec) * np.sin(dra) / cos_c
+        y = (np.cos(dec0) * np.sin(dec)
+             - np.sin(dec0) * np.cos(dec) * np.cos(dra)) / cos_c
+        return x, y
+
+    def pixel(self, ra, dec):
+        """Flat pixel index (row-major, y then x) per position; -1 off the grid."""
+        x, y = self.project(ra, dec)
+        pix_rad = self.pix_arcsec / ARCSEC_PER_RAD
+        ix = np.floor(x / pix_rad + 0.5 * self.n_x).astype(int)
+        iy = np.floor(y / pix_rad + 0.5 * self.n_y).astype(int)
+        on = (ix >= 0) & (ix < self.n_x) & (iy >= 0) & (iy < self.n_y)
+        return np.where(on, iy * self.n_x + ix, -1)
+
+    def attrs(self):
+        """Grid parameters, e.g. for HDF5 attributes."""
+        return {"ra0": self.ra0, "dec0": self.dec0,
+                "pix_arcsec": self.pix_arcsec,
+                "n_x": self.n_x, "n_y": self.n_y}
+
+
+def bin_map(grid, pixels, fluxes, n_rows, n_channels, block_rows=BLOCK_ROWS):
+    """
+    Sum per-galaxy fluxes into pixel maps.
+
+    Parameters
+    ----------
+    grid       : SkyGrid
+    pixels     : int array (n_rows,) – ``grid.pixel`` of each galaxy
+    fluxes     : callable(rows) -> array (len(rows), n_channels), called
+                 with consecutive slices of rows, or an array
+                 (n_rows, n_channels)
+    n_rows     : int
+    n_channels : int
+
+    Returns
+    -------
+    array (n_channels, n_y, n_x) – summed flux per pixel
+    """
+    if not callable(fluxes):
+        table = np.asarray(fluxes, dtype=float).reshape(n_rows, n_channels)
+        fluxes = table.__getitem__
+    pixels = np.asarray(pixels, dtype=int)
+    out = np.zeros(grid.n_pix * n_channels)
+    channel = np.arange(n_channels)
+    # Each bincount costs a pass over the whole map, so blocks hold at
+    # least as many rows as there are pixels
+    block_rows = max(block_rows, grid.n_pix)
+    for start in range(0, n_rows, block_rows):
+        b = slice(start, min(start + block_rows, n_rows))
+        pix = pixels[b]
+        on = pix >= 0
+        if not np.any(on):
+            continue
+        block = np.asarray(fluxes(b), dtype=float)[on]
+        # Pixel-major flat index: one bincount fills every channel
+        index = pix[on][:, None] * n_channels + channel
+        out += np.bincount(index.ravel(), weights=block.ravel(),
+                           minlength=out.size)
+    return out.reshape(grid.n_y, grid.n_x, n_channels).transpose(2, 0, 1).copy()
+
+
+def _fft_length(n):
+    """Smallest 2^a 3^b 5^c >= n, a fast FFT length."""
+    while True:
+        m = n
+        for p in (2, 3, 5):
+            while m % p == 0:
+                m //= p
+        if m == 1:
+            return n
+        n += 1
+
+
+def gaussian_psf(fwhm_pix, radius=None):
+    """
+    Unit-sum circular Gaussian kernel of FWHM ``fwhm_pix`` pixels,
+    truncated at ``radius`` pixels (default 4 sigma).
+    """
+    sigma = fwhm_pix * FWHM_TO_SIGMA
+    r = int(np.ceil(4.0 * sigma if radius is None else radius))
+    y, x = np.mgrid[-r:r + 1, -r:r + 1]
+    kernel = np.exp(-0.5 * (x ** 2 + y ** 2) / max(sigma, 1e-12) ** 2)
+    return kernel / kernel.sum()
+
+
+def convolve_fft(maps, kernel, block_channels=16):
+    """
+    Convolve maps (..., n_y, n_x) with a centred PSF kernel (k_y, k_x),
+    or one kernel per channel (n_channels, k_y, k_x), by zero-padded
+    real FFTs; the output has the maps' shape ("same" convolution, no
+    wrap-around).  Channels are transformed ``block_channels`` at a time.
+    """
+    maps = np.asarray(maps, dtype=float)
+    kernel = np.asarray(kernel, dtype=float)
+    n_y, n_x = maps.shape[-2:]
+    k_y, k_x = kernel.shape[-2:]
+    shape = (_fft_length(n_y + k_y - 1), _fft_length(n_x + k_x - 1))
+    y0, x0 = k_y // 2, k_x // 2
+
+    flat = maps.reshape(-1, n_y, n_x)
+    per_channel = kernel.ndim == 3
+    if per_channel and len(kernel) != len(flat):
+        raise ValueError(f"{len(kernel)} kernels for {len(flat)} maps")
+    out = np.empty_like(flat)
+    kernel_ft = None if per_channel else np.fft.rfft2(kernel, shape)
+    for start in range(0, len(flat), block_channels):
+        b = slice(start, start + block_channels)
+        ft = np.fft.rfft2(flat[b], shape)
+        ft *= np.fft.rfft2(kernel[b], shape) if per_channel else kernel_ft
+        out[b] = np.fft.irfft2(ft, shape)[:, y0:y0 + n_y, x0:x0 + n_x]
+    return out.reshape(maps.shape)
+
+
+def convolve_psf(maps, fwhm_arcsec, pix_arcsec, block_channels=16):
+    """
+    Convolve maps (n_channels, n_y, n_x) with Gaussian beams of FWHM
+    ``fwhm_arcsec`` (scalar, or one value per channel, e.g. scaling with
+    wavelength for a diffraction-limited beam).
+    """
+    fwhm = np.broadcast_to(np.asarray(fwhm_arcsec, dtype=float) / pix_arcsec,
+                           (len(maps),))
+    if np.all(fwhm == fwhm[0]):
+        return convolve_fft(maps, gaussian_psf(fwhm[0]), block_channels)
+    radius = int(np.ceil(4.0 * fwhm.max() * FWHM_TO_SIGMA))
+    kernels = np.array([gaussian_psf(f, radius) for f in fwhm])
+    return convolve_fft(maps, kernels, block_channels)
+
+
+def save_map_cube(path, maps, grid, channels, channel_unit, unit,
+                  convolved=None, fwhm_arcsec=None, attrs=None):
+    """
+    Write a map cube to HDF5, chunked one channel (up to 256 x 256
+    pixels) per chunk so single-channel and cut-out reads touch little
+    of the file.
+
+    Datasets: "maps" (n_channels, n_y, n_x), "channels", optionally
+    "convolved" and "fwhm_arcsec"; the grid and units go to attributes.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    maps = np.asarray(maps, dtype=float)
+    chunks = (1, min(grid.n_y, 256), min(grid.n_x, 256))
+    tmp = path.with_suffix(".tmp.h5")
+    with h5py.File(tmp, "w") as f:
+        f.create_dataset("maps", data=maps, chunks=chunks,
+                         compression="gzip", shuffle=True)
+        if convolved is not None:
+            f.create_dataset("convolved", data=np.asarray(convolved, dtype=float),
+                             chunks=chunks, compression="gzip", shuffle=True)
+        if fwhm_arcsec is not None:
+            f.create_dataset("fwhm_arcsec", data=np.broadcast_to(
+                np.asarray(fwhm_arcsec, dtype=float), (len(maps),)))
+        f.create_dataset("channels", data=np.asarray(channels, dtype=float))
+        f.attrs.update(grid.attrs())
+        f.attrs["channel_unit"] = channel_unit
+        f.attrs["unit"] = unit
+        for key, value in (attrs or {}).items():
+            f.attrs[key] = value
+    tmp.replace(path)
+    return path
+
+
+def load_map_cube(path, channels=None):
+    """
+    Read a cube written by :func:`save_map_cube`, optionally only the
+    channel indices ``channels``.
+
+    Returns
+    -------
+    dict with "maps", "channels", "grid" (SkyGrid), "convolved" and
+    "fwhm_arcsec" (if saved) and "attrs"
+    """
+    sel = slice(None) if channels is None else np.sort(np.atleast_1d(channels))
+    with h5py.File(path, "r") as f:
+        out = {"maps": f["maps"][sel], "channels": f["channels"][sel],
+               "attrs": dict(f.attrs)}
+        for name in ("convolved", "fwhm_arcsec"):
+            if name in f:
+                out[name] = f[name][sel]
+    a = out["attrs"]
+    out["grid"] = SkyGrid(a["ra0"], a["dec0"], a["pix_arcsec"], a["n_x"], a["n_y"])
+    return out
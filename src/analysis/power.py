@@ -0,0 +1,132 @@
+"""
+Flat-sky angular power spectra of background intensity maps.
+
+Every map (one per band and channel, on a common :class:`SkyGrid`) is
+Fourier transformed once, in batches of channels; the binned auto- and
+cross-spectra of all map pairs then follow from the stored transforms
+as one Hermitian matrix product per multipole bin,
+
+    C_ij(b) = sum_{k in b} w_k Re[a_i(k) a_j*(k)] / (Omega sum_{k in b} w_k),
+
+so the full N x N matrix costs N transforms plus N^2 n_modes
+multiply-adds.  Only the half plane of the real transform is kept;
+``w_k`` counts each mode's conjugate partner.  Intensities in
+nW m^-2 sr^-1 give C_ell in (nW m^-2 sr^-1)^2 sr.
+
+Multipoles follow from the grid's pixel side (``pix_arcsec``), so the
+maps must have been binned from RA/DEC in degrees
+(``layout.read_radec_deg``; lightcone files store radians).
+"""
+
+import numpy as np
+
+from src.analysis.maps import ARCSEC_PER_RAD
+
+
+def multipoles(grid):
+    """
+    |ell| = 2 pi |k| of every mode of ``np.fft.rfft2`` on the grid, shape
+    (n_y, n_x//2+1), with k in cycles per radian of the arcsec pixels.
+    """
+    pix_rad = grid.pix_arcsec / ARCSEC_PER_RAD
+    ky = np.fft.fftfreq(grid.n_y, d=pix_rad)
+    kx = np.fft.rfftfreq(grid.n_x, d=pix_rad)
+    return 2.0 * np.pi * np.hypot(ky[:, None], kx[None, :])
+
+
+def _mode_weights(grid):
+    """Modes per stored rfft2 coefficient: 1 on the self-conjugate columns, else 2."""
+    w = np.full((grid.n_y, grid.n_x // 2 + 1), 2.0)
+    w[:, 0] = 1.0
+    if grid.n_x % 2 == 0:
+        w[:, -1] = 1.0
+    return w
+
+
+def ell_bins(grid, n_bins=20, ell_min=None, ell_max=None):
+    """
+    Log-spaced multipole bin edges between the fundamental mode of the
+    map (or ``ell_min``) and the Nyquist multipole (or ``ell_max``).
+    """
+    pix_rad = grid.pix_arcsec / ARCSEC_PER_RAD
+    if ell_min is None:
+        ell_min = 2.0 * np.pi / (max(grid.n_x, grid.n_y) * pix_rad)
+    if ell_max is None:
+        ell_max = np.pi / pix_rad
+    return np.logspace(np.log10(ell_min), np.log10(ell_max), n_bins + 1)
+
+
+def map_transforms(maps, grid, subtract_mean=True, block_channels=16):
+    """
+    Fourier coefficients a(k) = Omega_pix sum_x delta(x) e^{-i k x} of
+    maps (n_maps, n_y, n_x), computed ``block_channels`` maps at a time.
+    With ``subtract_mean`` each map's mean is removed first, so the
+    spectra are those of the fluctuations.
+
+    Returns a complex array (n_maps, n_y, n_x//2 + 1).
+    """
+    maps = np.asarray(maps, dtype=float).reshape(-1, grid.n_y, grid.n_x)
+    out = np.empty((len(maps), grid.n_y, grid.n_x // 2 + 1), dtype=complex)
+    for start in range(0, len(maps), block_channels):
+        b = slice(start, start + block_channels)
+        block = maps[b]
+        if subtract_mean:
+            block = block - block.mean(axis=(1, 2), keepdims=True)
+        out[b] = np.fft.rfft2(block)
+    out *= grid.pixel_sr
+    return out
+
+
+def power_spectra(transforms, grid, edges):
+    """
+    Binned auto- and cross-spectra of every pair of transformed maps.
+
+    Parameters
+    ----------
+    transforms : complex array (n_maps, n_y, n_x//2 + 1) from
+                 :func:`map_transforms`
+    grid       : SkyGrid
+    edges      : multipole bin edges
+
+    Returns
+    -------
+    ell     : array (n_bins,) – mode-weighted mean multipole per bin
+    n_modes : array (n_bins,) – Fourier modes per bin over the full
+              plane; an auto-spectrum's Gaussian variance is
+              2 C_ell^2 / n_modes
+    cl      : array (n_maps, n_maps, n_bins) – C_ell of each pair,
+              symmetric in the first two axes (NaN in empty bins)
+    """
+    edges = np.asarray(edges, dtype=float)
+    n_bins = len(edges) - 1
+    n_maps = len(transforms)
+    ell = multipoles(grid).ravel()
+    w = _mode_weights(grid).ravel()
+    a = np.asarray(transforms).reshape(n_maps, -1)
+
+    k = np.searchsorted(edges, ell, side="right") - 1
+    in_bin = (k >= 0) & (k < n_bins) & (ell > 0)
+    order = np.flatnonzero(in_bin)[np.argsort(k[in_bin], kind="stable")]
+    bounds = np.searchsorted(k[order], np.arange(n_bins + 1))
+
+    omega_map = grid.n_pix * grid.pixel_sr
+    ell_mean = np.full(n_bins, np.nan)
+    n_modes = np.zeros(n_bins)
+    cl = np.full((n_maps, n_maps, n_bins), np.nan)
+    for b in range(n_bins):
+        sel = order[bounds[b]:bounds[b + 1]]
+        if len(sel) == 0:
+            continue
+        wb = w[sel]
+        n_modes[b] = wb.sum()
+        ell_mean[b] = wb @ ell[sel] / wb.sum()
+        ab = a[:, sel]
+        cl[:, :, b] = ((ab * wb) @ ab.conj().T).real / (wb.sum() * omega_map)
+    return ell_mean, n_modes, cl
+
+
+def cross_correlation(cl):
+    """Correlation coefficients r_ij = C_ij / sqrt(C_ii C_jj) of a spectra matrix."""
+    auto = np.sqrt(np.abs(np.einsum("iib->ib", cl)))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return cl / (auto[:, None] * auto[None, :])
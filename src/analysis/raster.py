@@ -0,0 +1,133 @@
+"""
+Rasterised rendering of large point sets.
+
+Scatter plots of a multi-million-galaxy lightcone draw one marker per
+galaxy and must be subsampled to stay tractable.  :func:`rasterize`
+instead aggregates the points into a fine 2-D pixel grid — the count,
+or the mean, max or min of a value per pixel — one block of points at a
+time with ``np.bincount`` and sorted ``reduceat``, and
+:func:`draw_raster` shows the result as a single image, so the cost of
+a figure is set by its pixel count rather than by the number of
+galaxies.  :func:`axes_shape` sizes the grid to the pixels an axes
+covers at the output DPI.
+"""
+
+import numpy as np
+
+from src.backgrounds.accumulate import BLOCK_ROWS
+
+STATISTICS = ("count", "mean", "max", "min")
+
+
+def axes_shape(ax, dpi=None, oversample=1.0):
+    """
+    (n_y, n_x) pixels covered by a matplotlib axes at ``dpi`` (default
+    the figure's), times ``oversample``.
+    """
+    fig = ax.get_figure()
+    dpi = fig.dpi if dpi is None else dpi
+    bbox = ax.get_window_extent().transformed(fig.dpi_scale_trans.inverted())
+    return (max(1, int(round(bbox.height * dpi * oversample))),
+            max(1, int(round(bbox.width * dpi * oversample))))
+
+
+def raster_extent(x, y):
+    """(x_min, x_max, y_min, y_max) of the finite points."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    ok = np.isfinite(x) & np.isfinite(y)
+    return (float(x[ok].min()), float(x[ok].max()),
+            float(y[ok].min()), float(y[ok].max()))
+
+
+def rasterize(x, y, values=None, statistic="mean", shape=(512, 512),
+              extent=None, block_rows=BLOCK_ROWS):
+    """
+    Aggregate points onto a regular pixel grid.
+
+    Parameters
+    ----------
+    x, y      : arrays (n,) – point positions
+    values    : array (n,) – per-point value (unused for "count")
+    statistic : "count", "mean", "max" or "min"
+    shape     : (n_y, n_x) pixels
+    extent    : (x_min, x_max, y_min, y_max); default the points' range.
+                Points outside, or with non-finite position or value,
+                are dropped.
+
+    Returns
+    -------
+    image  : array (n_y, n_x) – row 0 at y_min; NaN in empty pixels
+             except for "count"
+    extent : the (x_min, x_max, y_min, y_max) used
+    """
+    if statistic not in STATISTICS:
+        raise ValueError(f"Unknown statistic {statistic!r}; expected one of {STATISTICS}")
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if statistic != "count":
+        if values is None:
+            raise ValueError(f"statistic {statistic!r} needs values")
+        values = np.asarray(values, dtype=float)
+    n_y, n_x = int(shape[0]), int(shape[1])
+    x0, x1, y0, y1 = raster_extent(x, y) if extent is None else map(float, extent)
+    # A degenerate range still gets a finite pixel size
+    sx = n_x / ((x1 - x0) or 1.0)
+    sy = n_y / ((y1 - y0) or 1.0)
+
+    n_pix = n_y * n_x
+    count = np.zeros(n_pix, dtype=np.int64)
+    if statistic == "mean":
+        total = np.zeros(n_pix)
+    elif statistic == "max":
+        best = np.full(n_pix, -np.inf)
+    elif statistic == "min":
+        best = np.full(n_pix, np.inf)
+
+    # Each bincount costs a pass over the whole grid, so blocks hold at
+    # least as many points as there are pixels
+    block_rows = max(block_rows, n_pix)
+    for start in range(0, len(x), block_rows):
+        b = slice(start, start + block_rows)
+        bx, by = x[b], y[b]
+        ok = (bx >= x0) & (bx <= x1) & (by >= y0) & (by <= y1)
+        if statistic != "count":
+            v = values[b]
+            ok &= np.isfinite(v)
+        if not np.any(ok):
+            continue
+        # The upper edge belongs to the last pixel
+        ix = np.minimum(((bx[ok] - x0) * sx).astype(int), n_x - 1)
+        iy = np.minimum(((by[ok] - y0) * sy).astype(int), n_y - 1)
+        pix = iy * n_x + ix
+        count += np.bincount(pix, minlength=n_pix)
+        if statistic == "mean":
+            total += np.bincount(pix, weights=v[ok], minlength=n_pix)
+        elif statistic in ("max", "min"):
+            order = np.argsort(pix, kind="stable")
+            pix = pix[order]
+            starts = np.flatnonzero(np.r_[True, pix[1:] != pix[:-1]])
+            reduce = np.maximum if statistic == "max" else np.minimum
+            hit = pix[starts]
+            best[hit] = reduce(best[hit], reduce.reduceat(v[ok][order], starts))
+
+    if statistic == "count":
+        image = count.astype(float)
+    elif statistic == "mean":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            image = total / count
+    else:
+        image = np.where(count > 0, best, np.nan)
+    return image.reshape(n_y, n_x), (x0, x1, y0, y1)
+
+
+def draw_raster(ax, image, extent, **kwargs):
+    """
+    Show a :func:`rasterize` image on ``ax`` (pixels unsmoothed, empty
+    pixels transparent); extra keywords go to ``ax.imshow``.  Returns
+    the AxesImage, e.g. for a colorbar.
+    """
+    kwargs.setdefault("interpolation", "nearest")
+    kwargs.setdefault("aspect", "auto")
+    return ax.imshow(np.ma.masked_invalid(image), origin="lower",
+                     extent=extent, **kwargs)
@@ -0,0 +1,509 @@
+"""
+Per-snapshot-shell accumulation of background spectra.
+
+Every lightcone galaxy belongs to exactly one snapshot, so the snapshots
+partition the cone into redshift shells.  The background pipelines add
+each galaxy's contribution to the partial sum of its shell; totals,
+redshift-binned and cumulative spectra are all sums over shells, so a
+single pass yields every decomposition.
+
+Alongside each sum the shells keep the sum of squared per-galaxy
+contributions (the Poisson / shot-noise variance of the sum) and, when
+the cone is split into spatial regions, per-region sums and second
+moments.  Leave-one-region-out jackknife samples are then differences
+of these sums and need no further pipeline runs.  Galaxy groups (e.g.
+star-forming / quenched, or stellar-mass bins) are kept the same way, so
+a full decomposition of the background also costs one pass.
+"""
+
+import numpy as np
+
+# Galaxies per block when the pipelines evaluate a shell's SEDs as one
+# (rows × channels) array; bounds the temporaries at a few tens of MB.
+BLOCK_ROWS = 4096
+
+
+class ShellPartial:
+    """
+    Partial sums of one or more spectral components for a single
+    snapshot shell.
+
+    Parameters
+    ----------
+    snap       : int
+    components : sequence of str
+        Component names, e.g. ("dust", "nodust") or ("sf", "agn").
+    n_channels : int
+        Length of the wavelength / frequency grid.
+    z_edges    : array or None
+        Redshift bin edges.  Galaxies outside [z_edges[0], z_edges[-1])
+        still contribute to ``sum`` but to no bin.
+    regions    : int array or None
+        Spatial region label per lightcone galaxy (-1 for none).
+    n_regions  : int
+    groups     : int array or None
+        Galaxy group label per lightcone galaxy (-1 for none).
+    n_groups   : int
+    """
+
+    # Per-label sums kept alongside the totals: label -> attribute prefix
+    LABELS = ("region", "group")
+    ATTRS = ("sum", "sumsq", "zbin") + tuple(
+        f"{label}{suffix}" for label in LABELS for suffix in ("", "_sumsq", "_zbin"))
+
+    def __init__(self, snap, components, n_channels, z_edges=None,
+                 regions=None, n_regions=0, groups=None, n_groups=0):
+        self.snap = int(snap)
+        self.components = tuple(components)
+        self.n_channels = int(n_channels)
+        self.z_edges = None if z_edges is None else np.asarray(z_edges, dtype=float)
+        n_zbins = 0 if self.z_edges is None else len(self.z_edges) - 1
+        self.regions = regions
+        self.n_regions = int(n_regions) if regions is not None else 0
+        self.groups = groups
+        self.n_groups = int(n_groups) if groups is not None else 0
+
+        shape = (self.n_channels,)
+        self.sum = {c: np.zeros(shape) for c in self.components}
+        self.sumsq = {c: np.zeros(shape) for c in self.components}
+        self.zbin = {c: np.zeros((n_zbins,) + shape) for c in self.components}
+        for label in self.LABELS:
+            n = getattr(self, f"n_{label}s")
+            setattr(self, label, {c: np.zeros((n,) + shape)
+                                  for c in self.components})
+            setattr(self, f"{label}_sumsq", {c: np.zeros((n,) + shape)
+                                             for c in self.components})
+            setattr(self, f"{label}_zbin", {c: np.zeros((n, n_zbins) + shape)
+                                            for c in self.components})
+
+        # Redshift extent of the lightcone galaxies in this shell
+        self.n_gal = 0
+        self.z_sum = 0.0
+        self.z_lo = np.inf
+        self.z_hi = -np.inf
+
+        # Per-galaxy side products (e.g. dust temperatures), name -> array
+        self.extras = {}
+        # Lightcone rows of the galaxies (set by ``new_shell``)
+        self.rows = None
+
+    def record_redshifts(self, gal_z):
+        """Record the redshifts of the lightcone galaxies in this shell."""
+        gal_z = np.asarray(gal_z, dtype=float)
+        if gal_z.size == 0:
+            return
+        self.n_gal += gal_z.size
+        self.z_sum += float(gal_z.sum())
+        self.z_lo = min(self.z_lo, float(gal_z.min()))
+        self.z_hi = max(self.z_hi, float(gal_z.max()))
+
+    @property
+    def z_mean(self):
+        return self.z_sum / self.n_gal if self.n_gal else np.nan
+
+    def _zbin_index(self, gz):
+        if self.z_edges is None:
+            return -1
+        k = int(np.searchsorted(self.z_edges, gz, side="right")) - 1
+        if k < 0 or k >= len(self.z_edges) - 1:
+            return -1
+        return k
+
+    def add(self, component, contrib, gz, lc_index=None):
+        """
+        Add one galaxy's contribution (array of n_channels) at redshift
+        ``gz``.  ``lc_index`` is the galaxy's row in the lightcone and is
+        needed only when the accumulator tracks spatial regions or groups.
+        """
+        sq = contrib * contrib
+        self.sum[component] += contrib
+        self.sumsq[component] += sq
+        k = self._zbin_index(gz)
+        if k >= 0:
+            self.zbin[component][k] += contrib
+
+        if lc_index is None:
+            return
+        for label in self.LABELS:
+            n = getattr(self, f"n_{label}s")
+            if not n:
+                continue
+            r = int(getattr(self, f"{label}s")[lc_index])
+            if 0 <= r < n:
+                getattr(self, label)[component][r] += contrib
+                getattr(self, f"{label}_sumsq")[component][r] += sq
+                if k >= 0:
+                    getattr(self, f"{label}_zbin")[component][r, k] += contrib
+
+    def add_many(self, component, contribs, gz, lc_index=None):
+        """
+        Add a block of galaxies at once: ``contribs`` is (N, n_channels)
+        and ``gz`` / ``lc_index`` have length N.  Equivalent to calling
+        ``add`` on every row.
+        """
+        contribs = np.asarray(contribs, dtype=float)
+        if len(contribs) == 0:
+            return
+        sq = contribs * contribs
+        self.sum[component] += contribs.sum(axis=0)
+        self.sumsq[component] += sq.sum(axis=0)
+
+        gz = np.asarray(gz, dtype=float)
+        if self.z_edges is not None:
+            k = np.searchsorted(self.z_edges, gz, side="right") - 1
+            in_bin = (k >= 0) & (k < len(self.z_edges) - 1)
+            np.add.at(self.zbin[component], k[in_bin], contribs[in_bin])
+        else:
+            k = np.full(len(gz), -1)
+            in_bin = np.zeros(len(gz), dtype=bool)
+
+        if lc_index is None:
+            return
+        lc_index = np.asarray(lc_index, dtype=int)
+        for label in self.LABELS:
+            n = getattr(self, f"n_{label}s")
+            if not n:
+                continue
+            r = np.asarray(getattr(self, f"{label}s"))[lc_index]
+            in_label = (r >= 0) & (r < n)
+            np.add.at(getattr(self, label)[component], r[in_label],
+                      contribs[in_label])
+            np.add.at(getattr(self, f"{label}_sumsq")[component], r[in_label],
+                      sq[in_label])
+            both = in_label & in_bin
+            np.add.at(getattr(self, f"{label}_zbin")[component],
+                      (r[both], k[both]), contribs[both])
+
+    def merge(self, other):
+        """Add another partial of the same snapshot (e.g. a galaxy chunk)."""
+        for attr in self.ATTRS:
+            mine, theirs = getattr(self, attr), getattr(other, attr)
+            for c in self.components:
+                mine[c] += theirs[c]
+        if other.n_gal:
+            self.n_gal += other.n_gal
+            self.z_sum += other.z_sum
+            self.z_lo = min(self.z_lo, other.z_lo)
+            self.z_hi = max(self.z_hi, other.z_hi)
+        for name, arr in other.extras.items():
+            self.extras[name] = (np.concatenate([self.extras[name], arr])
+                                 if name in self.extras else arr)
+        return self
+
+    def to_arrays(self):
+        """Flatten to a dict of arrays (e.g. for ``np.savez``)."""
+        out = {
+            "snap": np.array(self.snap),
+            "components": np.array(self.components),
+            "n_channels": np.array(self.n_channels),
+            "z_edges": (np.array([]) if self.z_edges is None else self.z_edges),
+            "has_z_edges": np.array(self.z_edges is not None),
+            "n_regions": np.array(self.n_regions),
+            "n_groups": np.array(self.n_groups),
+            "z_stats": np.array([self.n_gal, self.z_sum, self.z_lo, self.z_hi]),
+        }
+        for attr in self.ATTRS:
+            for c in self.components:
+                out[f"{attr}/{c}"] = getattr(self, attr)[c]
+        for name, arr in self.extras.items():
+            out[f"extras/{name}"] = arr
+        return out
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Inverse of :meth:`to_arrays`; the result carries no region or
+        group labels.  Partials written before groups existed load with
+        ``n_groups = 0``.
+        """
+        self = cls.__new__(cls)
+        self.snap = int(arrays["snap"])
+        self.components = tuple(str(c) for c in arrays["components"])
+        self.n_channels = int(arrays["n_channels"])
+        self.z_edges = (np.asarray(arrays["z_edges"], dtype=float)
+                        if bool(arrays["has_z_edges"]) else None)
+        self.regions = None
+        self.n_regions = int(arrays["n_regions"])
+        self.groups = None
+        self.n_groups = int(arrays["n_groups"]) if "n_groups" in arrays else 0
+        n_gal, self.z_sum, self.z_lo, self.z_hi = arrays["z_stats"]
+        self.n_gal = int(n_gal)
+        n_zbins = 0 if self.z_edges is None else len(self.z_edges) - 1
+        for attr in self.ATTRS:
+            if attr.startswith("group") and f"{attr}/{self.components[0]}" not in arrays:
+                shape = (0,) + ((n_zbins,) if attr.endswith("_zbin") else ())
+                setattr(self, attr, {c: np.zeros(shape + (self.n_channels,))
+                                     for c in self.components})
+                continue
+            setattr(self, attr, {c: np.array(arrays[f"{attr}/{c}"])
+                                 for c in self.components})
+        self.extras = {k.split("/", 1)[1]: np.array(arrays[k])
+                       for k in arrays.keys() if k.startswith("extras/")}
+        self.rows = None
+        return self
+
+
+class SpectrumAccumulator:
+    """
+    Collects :class:`ShellPartial` objects from a background pipeline.
+
+    Pass an instance as ``accumulator=`` to ``lightcone_optical_background``,
+    ``lightcone_farIR_background`` or ``lightcone_radio_background``.  The
+    pipeline return values are unchanged; the accumulator is filled as a
+    side effect and already carries the pipeline's unit scaling, so every
+    array it returns is in the same units as the pipeline's intensity.
+
+    Parameters
+    ----------
+    z_edges : array-like or None
+        Redshift bin edges, e.g. [0, 1, 3, 7].
+    regions : int array-like or None
+        Spatial region label for every lightcone galaxy (0 … n_regions-1,
+        or -1 for none), e.g. from ``region_labels``.  Enables per-region
+        sums and jackknife samples.
+    groups : int array-like or None
+        Group label for every lightcone galaxy (0 … n_groups-1, or -1 for
+        none), e.g. from ``optical.star_forming_labels`` or
+        ``optical.mass_bin_labels``.  Enables per-group spectra, which
+        equal the pipeline runs with ``galaxy_mask = groups == g``.
+    n_groups : int, optional
+        Number of groups; defaults to the largest label + 1 (set it when
+        the last group may be empty).
+    """
+
+    def __init__(self, z_edges=None, regions=None, groups=None, n_groups=None):
+        self.z_edges = None if z_edges is None else np.asarray(z_edges, dtype=float)
+        if self.z_edges is not None and (
+                self.z_edges.ndim != 1 or len(self.z_edges) < 2
+                or np.any(np.diff(self.z_edges) <= 0)):
+            raise ValueError("z_edges must be a strictly increasing 1-D array "
+                             "with at least two entries")
+        self.regions = None if regions is None else np.asarray(regions, dtype=int)
+        self.n_regions = 0 if self.regions is None else int(self.regions.max()) + 1
+        self.groups = None if groups is None else np.asarray(groups, dtype=int)
+        if self.groups is None:
+            self.n_groups = 0
+        elif n_groups is None:
+            self.n_groups = int(self.groups.max(initial=-1)) + 1
+        else:
+            self.n_groups = int(n_groups)
+        self.components = ()
+        self.n_channels = 0
+        self.scale = 1.0
+        self.shells = {}        # snap -> ShellPartial
+
+    @property
+    def n_zbins(self):
+        return 0 if self.z_edges is None else len(self.z_edges) - 1
+
+    def check_lightcone(self, n_gal):
+        """Raise if the region or group labels do not match a lightcone of n_gal rows."""
+        for name in ("regions", "groups"):
+            labels = getattr(self, name)
+            if labels is not None and len(labels) != n_gal:
+                raise ValueError(f"accumulator {name} length ({len(labels)}) "
+                                 f"!= lightcone length ({n_gal})")
+
+    def start(self, components, n_channels):
+        """Reset for a pipeline run producing the given components."""
+        self.components = tuple(components)
+        self.n_channels = int(n_channels)
+        self.scale = 1.0
+        self.shells = {}
+
+    def shell(self, snap):
+        """Return (creating if needed) the partial for snapshot ``snap``."""
+        snap = int(snap)
+        if snap not in self.shells:
+            self.shells[snap] = ShellPartial(snap, self.components,
+                                             self.n_channels, self.z_edges,
+                                             self.regions, self.n_regions,
+                                             self.groups, self.n_groups)
+        return self.shells[snap]
+
+    def new_shell(self, snap, rows):
+        """
+        A fresh, detached partial for the lightcone galaxies ``rows`` of
+        snapshot ``snap``.  Its ``add`` takes ``lc_index`` as a position
+        within ``rows``, which it keeps as ``rows``; insert it with
+        :meth:`add_shell` when filled.
+        """
+        regions = None if self.regions is None else self.regions[rows]
+        groups = None if self.groups is None else self.groups[rows]
+        partial = ShellPartial(snap, self.components, self.n_channels,
+                               self.z_edges, regions, self.n_regions,
+                               groups, self.n_groups)
+        partial.rows = np.asarray(rows)
+        return partial
+
+    def add_shell(self, partial):
+        """Insert a filled partial (from :meth:`new_shell` or a checkpoint)."""
+        self.shells[partial.snap] = partial
+
+    def extras(self, name):
+        """Concatenate a per-galaxy side product over shells in snapshot order."""
+        parts = [p.extras[name] for p in self._ordered() if name in p.extras]
+        return np.concatenate(parts) if parts else np.array([])
+
+    def set_scale(self, scale):
+        """Flux-sum → intensity conversion applied by all accessors."""
+        self.scale = float(scale)
+
+    # ── accessors ──────────────────────────────────────────────────
+
+    def _ordered(self):
+        return [self.shells[s] for s in sorted(self.shells)]
+
+    def _reduce(self, attr, component, shape):
+        out = np.zeros(shape)
+        for p in self._ordered():
+            out += getattr(p, attr)[component]
+        return out
+
+    def _require_zbins(self):
+        if self.z_edges is None:
+            raise ValueError("Accumulator was created without z_edges")
+
+    def _require_regions(self):
+        if self.regions is None:
+            raise ValueError("Accumulator was created without regions")
+
+    def _require_groups(self):
+        if self.groups is None:
+            raise ValueError("Accumulator was created without groups")
+
+    def total(self, component):
+        """Total spectrum of ``component`` summed over all shells."""
+        return self._reduce("sum", component, self.n_channels) * self.scale
+
+    def shot_noise_variance(self, component):
+        """
+        Poisson (shot-noise) variance of ``total(component)``: the sum of
+        squared per-galaxy contributions, in intensity² units.
+        """
+        return (self._reduce("sumsq", component, self.n_channels)
+                * self.scale ** 2)
+
+    def zbinned(self, component):
+        """Spectrum per redshift bin, shape (n_zbins, n_channels)."""
+        self._require_zbins()
+        return self._reduce("zbin", component,
+                            (self.n_zbins, self.n_channels)) * self.scale
+
+    def region_totals(self, component):
+        """Spectrum per spatial region, shape (n_regions, n_channels)."""
+        self._require_regions()
+        return self._reduce("region", component,
+                            (self.n_regions, self.n_channels)) * self.scale
+
+    def region_shot_noise_variance(self, component):
+        """Shot-noise variance per spatial region, shape (n_regions, n_channels)."""
+        self._require_regions()
+        return (self._reduce("region_sumsq", component,
+                             (self.n_regions, self.n_channels))
+                * self.scale ** 2)
+
+    def jackknife_samples(self, component):
+        """
+        Leave-one-region-out spectra, shape (n_regions, n_channels).
+        Row i equals the pipeline run with ``galaxy_mask = regions != i``.
+        """
+        return self.total(component)[None, :] - self.region_totals(component)
+
+    def jackknife_zbinned(self, component):
+        """Leave-one-region-out binned spectra, shape (n_regions, n_zbins, n_channels)."""
+        self._require_zbins()
+        self._require_regions()
+        region_zbin = self._reduce(
+            "region_zbin", component,
+            (self.n_regions, self.n_zbins, self.n_channels)) * self.scale
+        return self.zbinned(component)[None] - region_zbin
+
+    def group_totals(self, component):
+        """Spectrum per galaxy group, shape (n_groups, n_channels)."""
+        self._require_groups()
+        return self._reduce("group", component,
+                            (self.n_groups, self.n_channels)) * self.scale
+
+    def group_shot_noise_variance(self, component):
+        """Shot-noise variance per galaxy group, shape (n_groups, n_channels)."""
+        self._require_groups()
+        return (self._reduce("group_sumsq", component,
+                             (self.n_groups, self.n_channels))
+                * self.scale ** 2)
+
+    def group_zbinned(self, component):
+        """Binned spectrum per galaxy group, shape (n_groups, n_zbins, n_channels)."""
+        self._require_zbins()
+        self._require_groups()
+        return self._reduce("group_zbin", component,
+                            (self.n_groups, self.n_zbins, self.n_channels)) * self.scale
+
+    def cumulative(self, component):
+        """Cumulative spectrum below each upper bin edge, shape (n_zbins, n_channels)."""
+        return np.cumsum(self.zbinned(component), axis=0)
+
+    def shell_table(self, component):
+        """
+        Per-snapshot shell spectra sorted by mean redshift.
+
+        Returns
+        -------
+        snaps   : int array (n_shells,)
+        z_mean  : array (n_shells,) – mean redshift of the shell's galaxies
+        spectra : array (n_shells, n_channels)
+        """
+        parts = sorted(self._ordered(), key=lambda p: p.z_mean)
+        snaps = np.array([p.snap for p in parts], dtype=int)
+        z_mean = np.array([p.z_mean for p in parts])
+        spectra = np.array([p.sum[component] for p in parts]).reshape(
+            len(parts), self.n_channels) * self.scale
+        return snaps, z_mean, spectra
+
+    def jackknife_shells(self, component):
+        """
+        Leave-one-region-out shell spectra, ordered as ``shell_table``.
+
+        Returns
+        -------
+        snaps, z_mean : as ``shell_table``
+        samples       : array (n_regions, n_shells, n_channels)
+        """
+        self._require_regions()
+        snaps, z_mean, spectra = self.shell_table(component)
+        region = np.array([self.shells[int(s)].region[component] for s in snaps])
+        region = region.reshape(len(snaps), self.n_regions, self.n_channels)
+        samples = spectra[None] - np.transpose(region, (1, 0, 2)) * self.scale
+        return snaps, z_mean, samples
+
+
+def region_labels(region_masks, n_gal):
+    """Convert a list of boolean region masks to one integer label per galaxy."""
+    labels = np.full(n_gal, -1, dtype=int)
+    for r, mask in enumerate(region_masks):
+        labels[np.asarray(mask, dtype=bool)] = r
+    return labels
+
+
+def rebin_shells(z_mean, spectra, z_edges):
+    """
+    Re-bin per-shell spectra into arbitrary redshift bins by shell mean
+    redshift.  Works on any leading axes, so jackknife sample stacks of
+    shape (n_samples, n_shells, n_channels) can be passed with
+    ``spectra`` shells on axis -2.
+
+    Returns an array with the shell axis replaced by the bin axis.
+    """
+    z_mean = np.asarray(z_mean, dtype=float)
+    spectra = np.asarray(spectra, dtype=float)
+    z_edges = np.asarray(z_edges, dtype=float)
+    n_bins = len(z_edges) - 1
+
+    k = np.searchsorted(z_edges, z_mean, side="right") - 1
+    shape = spectra.shape[:-2] + (n_bins, spectra.shape[-1])
+    out = np.zeros(shape)
+    for b in range(n_bins):
+        sel = k == b
+        if np.any(sel):
+            out[..., b, :] = spectra[..., sel, :].sum(axis=-2)
+    return out
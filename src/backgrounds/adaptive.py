@@ -0,0 +1,74 @@
+"""
+Adaptive log-spaced grids for background spectra.
+
+The pipelines evaluate their spectra on ``n_points`` log-spaced points,
+as many on the smooth power-law stretches as across the far-IR peak.
+:func:`refine_grid` instead starts from a coarse log-spaced grid and
+bisects (in log x) only the intervals where the log-log interpolation
+between their end points misses the spectrum at the midpoint by more
+than the tolerance; the halves of a bisected interval are tested in
+turn.  An interval is only accepted once its own midpoint has been
+evaluated and found within the tolerance, and that midpoint is kept in
+the grid as well, so the returned grid meets the tolerance unless
+``max_points`` cuts the refinement short.
+"""
+
+import numpy as np
+
+
+def _loglog_midpoint(y0, y1):
+    """Log-log interpolation at the geometric midpoint (linear where y <= 0)."""
+    with np.errstate(invalid="ignore"):
+        return np.where((y0 > 0) & (y1 > 0), np.sqrt(np.abs(y0 * y1)),
+                        0.5 * (y0 + y1))
+
+
+def refine_grid(evaluate, x_min, x_max, n_start=17, rtol=1e-3, atol=0.0,
+                max_points=500):
+    """
+    Adaptively refined log-spaced grid of a positive function.
+
+    Parameters
+    ----------
+    evaluate   : callable – array x (n,) -> values (..., n); with several
+                 leading components an interval is refined if any of
+                 them needs it
+    x_min, x_max : float – grid limits (> 0)
+    n_start    : int – points of the initial log-spaced grid
+    rtol, atol : float – an interval is bisected while the difference
+                 between its midpoint value y and the log-log
+                 interpolation exceeds rtol |y| + atol
+    max_points : int – stop refining at this many points, bisecting the
+                 worst intervals first
+
+    Returns
+    -------
+    x : array (n,) – increasing, non-uniform grid
+    y : array (..., n) – ``evaluate`` on it
+    """
+    x = np.geomspace(x_min, x_max, max(int(n_start), 2))
+    y = np.asarray(evaluate(x), dtype=float)
+    todo = np.arange(len(x) - 1)            # left end points to test
+    score = np.zeros(len(todo))             # their parents' errors
+
+    while len(todo) and len(x) < max_points:
+        room = max_points - len(x)
+        if len(todo) > room:
+            todo = np.sort(todo[np.argsort(-score, kind="stable")[:room]])
+
+        xm = np.sqrt(x[todo] * x[todo + 1])
+        ym = np.asarray(evaluate(xm), dtype=float)
+        guess = _loglog_midpoint(y[..., todo], y[..., todo + 1])
+        excess = np.abs(guess - ym) / (rtol * np.abs(ym) + atol + 1e-300)
+        excess = excess.reshape(-1, len(todo)).max(axis=0)
+        bad = excess > 1.0
+
+        x = np.insert(x, todo + 1, xm)
+        y = np.insert(y, todo + 1, ym, axis=-1)
+        # Left end points move by the insertions before them
+        left = (todo + np.arange(len(todo)))[bad]
+        todo = np.concatenate([left, left + 1])
+        score = np.concatenate([excess[bad], excess[bad]])
+        order = np.argsort(todo)
+        todo, score = todo[order], score[order]
+    return x, y
@@ -2,15 +2,18 @@
 
 from pathlib import Path
 import numpy as np
-import h5py
-import caesar
 import astropy.units as u
 
 from src.config import SimConfig
-from src.utils import get_redshift
+from src import instrument
+from src.utils import get_redshift, load_caesar, open_hdf5, read_dataset
 from src.physics.dust import equivalent_dust_temperature
-from src.physics.sed import mbb, normalised_mbb
+from src.physics.sed import normalised_mbb_batch
 from src.lightcone.generate import generate_lightcone
+from src.lightcone.layout import read_column
+from src.backgrounds.accumulate import BLOCK_ROWS, SpectrumAccumulator
+from src.backgrounds.shells import open_checkpoints, process_shells
+from src.prefetch import DEFAULT_DEPTH
 
 LIGHTCONE_DIR = Path(__file__).resolve().parent.parent.parent / "data" / "lightcones"
 
@@ -19,61 +22,96 @@ def _redshift_for_snap(cfg, snap):
     """Get redshift for a snapshot, trying HDF5 attrs then Caesar."""
     hdf5 = cfg.hdf5_path(snap)
     if hdf5.exists():
-        with h5py.File(hdf5, "r") as f:
+        with open_hdf5(hdf5) as f:
             if "redshift" in f.attrs:
                 return float(f.attrs["redshift"])
     caesar_f = cfg.caesar_path(snap)
     if caesar_f.exists():
-        obj = caesar.load(str(caesar_f))
+        obj = load_caesar(caesar_f)
         return get_redshift(obj)
     raise FileNotFoundError(f"Cannot get redshift for snap {snap}")
 
 
-def summed_mbb_single(cfg, snap, beta=2.0, n_points=500, a_dust=-0.05):
+def build_lightcone(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0):
+    """Generate or load a cached lightcone."""
+    LIGHTCONE_DIR.mkdir(parents=True, exist_ok=True)
+    lc_path = LIGHTCONE_DIR / f"lc_{cfg.name}_a{area_deg2}_z{z_min}-{z_max}.h5"
+
+    if lc_path.exists():
+        print(f"Lightcone cached: {lc_path}")
+        return lc_path
+
+    generate_lightcone(cfg, area_deg2, z_min, z_max, lc_path, verbose=True)
+    return lc_path
+
+
+def farIR_columns(cfg, snap, a_dust):
     """
-    Rest-frame summed MBB SED for one snapshot.
-    Returns wavelength (Angstrom), total SED.
+    L_FIR, equivalent dust temperature and its validity mask for every
+    galaxy of one catalogue, or None if the catalogue is unusable.
     """
     hdf5 = cfg.hdf5_path(snap)
+    if not hdf5.exists():
+        print(f"  WARN: missing {hdf5}, skipping snap {snap}")
+        return None
     z = _redshift_for_snap(cfg, snap)
-
-    with h5py.File(hdf5, "r") as f:
+    with open_hdf5(hdf5) as f:
         if "galaxy_data/L_FIR" not in f:
             print(f"  WARN: L_FIR missing in snap {snap}, skipping")
-            lam = np.logspace(3.5, 5, n_points)
-            return lam, np.zeros(n_points)
-        lfir = f["galaxy_data/L_FIR"][:]
+            return None
+        lfir = read_dataset(f, "galaxy_data/L_FIR")
+    T_eqv, vmask = equivalent_dust_temperature(hdf5, z, a=a_dust)
+    return {"L_FIR": lfir, "T_eqv": T_eqv, "valid": vmask}
 
-    T_eqv, mask = equivalent_dust_temperature(hdf5, z, a=a_dust)
-    lam = np.logspace(4, 5, n_points)
 
-    total_sed = np.zeros_like(lam)
-    for i in range(len(lfir)):
-        if not mask[i]:
-            continue
-        sed = normalised_mbb(lam, lfir[i], T_eqv[i], beta)
-        if sed is not None:
-            total_sed += sed
+def farIR_shell(cfg, snap, gal_z, gal_idx, shell, columns, lam_obs, beta):
+    """
+    Fill ``shell`` (component "total", flux units before division by the
+    solid angle) with the redshifted MBB SEDs of one snapshot's lightcone
+    galaxies, given the snapshot's ``farIR_columns``.  Per-galaxy dust
+    temperatures and redshifts are kept in ``shell.extras``.
+    """
+    lfir, T_eqv, vmask = columns["L_FIR"], columns["T_eqv"], columns["valid"]
+    gal_idx = np.asarray(gal_idx, dtype=int)
+    gal_z = np.asarray(gal_z, dtype=float)
 
-    return lam, total_sed
+    li = np.flatnonzero(gal_idx < len(lfir))
+    gi = gal_idx[li]
+    L, T = lfir[gi], T_eqv[gi]
+    with np.errstate(invalid="ignore"):
+        keep = vmask[gi] & np.isfinite(L) & np.isfinite(T) & (L > 0) & (T > 0)
+    li, L, T = li[keep], L[keep], T[keep]
+    gz = gal_z[li]
 
+    LSUN_ERG_S = 3.828e33
+    buf = np.empty((min(len(li), BLOCK_ROWS), len(lam_obs)))
+    for start in range(0, len(li), BLOCK_ROWS):
+        b = slice(start, start + BLOCK_ROWS)
+        z1 = 1.0 + gz[b]
+        lam_rest = lam_obs / z1[:, None]
+        flux, ok = normalised_mbb_batch(lam_rest, L[b], T[b], beta,
+                                        out=buf[:len(z1)])
 
-def build_lightcone(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0):
-    """Generate or load a cached lightcone."""
-    LIGHTCONE_DIR.mkdir(parents=True, exist_ok=True)
-    lc_path = LIGHTCONE_DIR / f"lc_{cfg.name}_a{area_deg2}_z{z_min}-{z_max}.h5"
+        d_L = cfg.cosmology.luminosity_distance(gz[b]).to(u.cm).value
 
-    if lc_path.exists():
-        print(f"Lightcone cached: {lc_path}")
-        return lc_path
+        flux *= LSUN_ERG_S
+        flux /= (4.0 * np.pi * d_L ** 2 * z1)[:, None]
 
-    generate_lightcone(cfg, area_deg2, z_min, z_max, lc_path, verbose=True)
-    return lc_path
+        ok &= np.all(np.isfinite(flux), axis=1)
+        shell.add_many("total", flux[ok], gz[b][ok], li[b][ok])
+
+    shell.extras["dust_temps"] = np.asarray(T, dtype=float)
+    shell.extras["dust_redshifts"] = gz
+    return shell
 
 
+@instrument.timed("farIR")
 def lightcone_farIR_background(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0,
                                 beta=2.0, n_points=500, a_dust=-0.0455,
-                                return_dust_temps=False, galaxy_mask=None):
+                                return_dust_temps=False, galaxy_mask=None,
+                                accumulator=None, checkpoint=None,
+                                n_workers=1, comm=None,
+                                prefetch=DEFAULT_DEPTH, prefetch_mb=None):
     """
     Compute the far-IR cosmic background intensity by summing
     redshifted MBB SEDs from all lightcone galaxies.
@@ -88,6 +126,22 @@ def lightcone_farIR_background(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0,
     galaxy_mask : array-like, optional
         Boolean mask of same length as lightcone galaxies. If provided,
         only galaxies where mask is True are included. Used for jackknife.
+    accumulator : SpectrumAccumulator, optional
+        If given, filled with per-snapshot-shell, per-redshift-bin and
+        per-region spectra and their shot-noise second moments
+        (component "total") in the same units as ``intensity``.
+    checkpoint : bool or Path, optional
+        Persist each snapshot's partial sums (see ``shells``) in the
+        default or given directory and reuse them on reruns.
+    n_workers : int
+        Compute snapshot shells (chunked above ``shells.CHUNK_SIZE``
+        galaxies) in a pool of this many processes.
+    comm : mpi4py communicator, optional
+        Split the snapshot shells across its ranks (see ``mpi``); every
+        rank returns the full result.
+    prefetch, prefetch_mb : int, float or None
+        Read up to ``prefetch`` catalogues (at most ``prefetch_mb`` MB)
+        ahead of the shell being computed, in a background thread.
 
     Returns
     -------
@@ -97,10 +151,10 @@ def lightcone_farIR_background(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0,
     """
     lc_path = build_lightcone(cfg, area_deg2, z_min, z_max)
 
-    with h5py.File(lc_path, "r") as lc:
-        gal_z = lc["z"][:]
-        snap_arr = lc["snap"][:]
-        gal_idx = lc["galaxy_index"][:]
+    with open_hdf5(lc_path) as lc:
+        gal_z = read_column(lc, "z")
+        snap_arr = read_column(lc, "snap")
+        gal_idx = read_column(lc, "galaxy_index")
 
     # Apply galaxy mask if provided
     if galaxy_mask is not None:
@@ -110,71 +164,33 @@ def lightcone_farIR_background(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0,
                            f"lightcone length ({len(gal_z)})")
     else:
         galaxy_mask = np.ones(len(gal_z), dtype=bool)
+    acc = accumulator if accumulator is not None else SpectrumAccumulator()
+    acc.check_lightcone(len(gal_z))
 
     # ── wavelength grid: 8 µm  →  10 mm ─────────────────
     lam_obs = np.logspace(np.log10(1.5e5), np.log10(1e8), n_points)  # Å
     omega_sr = area_deg2 * (np.pi / 180.0) ** 2
 
-    total_intensity = np.zeros_like(lam_obs)
-    cache = {}
+    acc.start(("total",), n_points)
+    checkpoints = open_checkpoints(
+        checkpoint, "farIR", cfg,
+        {"n_points": n_points, "beta": beta, "a_dust": a_dust},
+        gal_z, gal_idx, acc)
 
-    # Collectors for dust-temperature diagnostics
-    all_temps = [] if return_dust_temps else None
-    all_zs    = [] if return_dust_temps else None
-
-    unique_snaps = np.unique(snap_arr)
     print(f"Processing {galaxy_mask.sum()} galaxies across "
-          f"{len(unique_snaps)} snapshots …")
-
-    for snap in unique_snaps:
-        snap = int(snap)
-        smask = (snap_arr == snap) & galaxy_mask
-
-        if snap not in cache:
-            hdf5 = cfg.hdf5_path(snap)
-            if not hdf5.exists():
-                print(f"  WARN: missing {hdf5}, skipping snap {snap}")
-                continue
-            z = _redshift_for_snap(cfg, snap)
-            with h5py.File(hdf5, "r") as f:
-                if "galaxy_data/L_FIR" not in f:
-                    print(f"  WARN: L_FIR missing in snap {snap}, skipping")
-                    continue
-                lfir = f["galaxy_data/L_FIR"][:]
-            T_eqv, vmask = equivalent_dust_temperature(hdf5, z, a=a_dust)
-            cache[snap] = (lfir, T_eqv, vmask)
-
-        lfir, T_eqv, vmask = cache[snap]
-
-        for gi, gz in zip(gal_idx[smask], gal_z[smask]):
-            gi = int(gi)
-            if gi >= len(lfir) or not vmask[gi]:
-                continue
-            L, T = lfir[gi], T_eqv[gi]
-            if not (np.isfinite(L) and np.isfinite(T) and L > 0 and T > 0):
-                continue
-
-            if return_dust_temps:
-                all_temps.append(T)
-                all_zs.append(gz)
-
-            lam_rest = lam_obs / (1.0 + gz)
-            sed = normalised_mbb(lam_rest, L, T, beta)
-            if sed is None:
-                continue
-
-            d_L = cfg.cosmology.luminosity_distance(gz).to(u.cm).value
-            LSUN_ERG_S = 3.828e33
-
-            flux = sed * LSUN_ERG_S / (4.0 * np.pi * d_L ** 2 * (1.0 + gz))
-
-            if np.all(np.isfinite(flux)):
-                total_intensity += flux
-
-    total_intensity /= omega_sr
+          f"{len(np.unique(snap_arr))} snapshots …")
+
+    process_shells("farIR", cfg, acc, farIR_shell, farIR_columns, snap_arr,
+                   gal_z, gal_idx, galaxy_mask, args=(lam_obs, beta),
+                   load_args=(a_dust,), checkpoints=checkpoints,
+                   n_workers=n_workers, prefetch=prefetch,
+                   prefetch_mb=prefetch_mb, comm=comm)
+
+    acc.set_scale(1.0 / omega_sr)
+    total_intensity = acc.total("total")
     print("Done.")
 
     if return_dust_temps:
         return (lam_obs, total_intensity,
-                np.asarray(all_temps), np.asarray(all_zs))
-    return lam_obs, total_intensity
\ No newline at end of file
+                acc.extras("dust_temps"), acc.extras("dust_redshifts"))
+    return lam_obs, total_intensity
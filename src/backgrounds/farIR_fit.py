@@ -0,0 +1,553 @@
+"""
+Fitting a_dust (and beta) of the far-IR background to observed EBL data.
+
+A lightcone galaxy's observed-frame far-IR flux depends on a_dust and
+redshift only through  u = T_eqv / (1 + z):  the rest-frame MBB at
+lambda_obs / (1 + z) and temperature T is, up to a factor that the
+L_FIR normalisation removes, the MBB at lambda_obs and temperature u.
+Since  T_eqv = 10^a T_0  (T_0 the Liang+19 temperature at a = 0), every
+galaxy contributes
+
+    F(lambda) = w  g(lambda; 10^a u_0, beta),    w = L_FIR / (4 pi d_L^2)
+
+with g the MBB template normalised to unit integral over the pipeline's
+observed grid (``default_lam_obs``), whatever grid it is evaluated on.  The
+per-galaxy table (L_FIR, T_0, z, d_L) is read once with
+:func:`farIR_galaxy_table`; :class:`FarIRModel` bins the weights w on a
+fine grid in log u_0 (a shift in a is a shift of the whole grid), so a
+model spectrum costs one (n_bins x n_lambda) template evaluation rather
+than a pipeline run, and its derivatives in a and beta are analytic.
+:func:`farIR_grid` evaluates whole (a_dust, beta) grids the same way,
+and :func:`farIR_adaptive` one spectrum on an adaptively refined
+wavelength grid.
+:func:`fit_farIR` minimises chi^2 against ``ebldata.csv`` with a bounded
+quasi-Newton optimiser, typically in about ten model evaluations for
+a_dust alone and twenty for (a_dust, beta).
+"""
+
+from pathlib import Path
+
+import numpy as np
+import astropy.units as u
+
+from src import instrument
+from src.utils import open_hdf5
+from src.lightcone.layout import read_column
+from src.physics.sed import (AA_TO_M, C_LIGHT, H_PLANCK, K_BOLTZMANN, mbb,
+                             normalised_mbb_batch)
+from src.backgrounds.accumulate import BLOCK_ROWS, SpectrumAccumulator
+from src.backgrounds.farIR import build_lightcone, farIR_columns
+from src.backgrounds.shells import open_checkpoints, process_shells
+from src.prefetch import DEFAULT_DEPTH
+
+EBL_PATH = Path(__file__).resolve().parent.parent.parent / "data" / "ebl" / "ebldata.csv"
+
+# erg s^-1 cm^-2 -> nW m^-2
+CGS_TO_NW_M2 = 1e6
+LSUN_ERG_S = 3.828e33
+
+# Bin width in log10 u_0 of the binned model.  The binning error scales
+# as its square: ~1e-6 relative near the peak at the default, growing
+# into the Wien tail.
+DLOG_U = 1e-4
+
+_TABLE_COLUMNS = ("L_FIR", "T0", "z", "d_L", "lc_row")
+
+
+# ══════════════════════════════════════════════════════════════════
+# Inputs
+# ══════════════════════════════════════════════════════════════════
+
+def load_observed_ebl(path=EBL_PATH, lam_min_um=None, lam_max_um=None):
+    """
+    Observed EBL points from ``ebldata.csv`` (columns wave [µm],
+    ebl and debl [nW m^-2 sr^-1]), sorted by wavelength, optionally
+    restricted to [lam_min_um, lam_max_um].  Points without a positive
+    uncertainty are dropped.
+
+    Returns
+    -------
+    lam_um, nuInu_nW, err_nW : arrays
+    """
+    import pandas as pd
+
+    df = pd.read_csv(path)
+    df.columns = df.columns.str.strip().str.lower()
+    df = df.dropna(subset=["wave", "ebl", "debl"]).sort_values(by="wave")
+    keep = df["debl"] > 0
+    if lam_min_um is not None:
+        keep &= df["wave"] >= lam_min_um
+    if lam_max_um is not None:
+        keep &= df["wave"] <= lam_max_um
+    df = df[keep]
+    return (df["wave"].to_numpy(float), df["ebl"].to_numpy(float),
+            df["debl"].to_numpy(float))
+
+
+def _table_shell(cfg, snap, gal_z, gal_idx, shell, columns):
+    """Collect (L_FIR, T_0, z, d_L, lightcone row) of a shell's usable galaxies in ``extras``."""
+    lfir, T_eqv, vmask = columns["L_FIR"], columns["T_eqv"], columns["valid"]
+    gal_idx = np.asarray(gal_idx, dtype=int)
+    gal_z = np.asarray(gal_z, dtype=float)
+
+    li = np.flatnonzero(gal_idx < len(lfir))
+    gi = gal_idx[li]
+    L, T = lfir[gi], T_eqv[gi]
+    with np.errstate(invalid="ignore"):
+        keep = vmask[gi] & np.isfinite(L) & np.isfinite(T) & (L > 0) & (T > 0)
+    L, T, gz, rows = L[keep], T[keep], gal_z[li[keep]], shell.rows[li[keep]]
+
+    d_L = (cfg.cosmology.luminosity_distance(gz).to(u.cm).value
+           if len(gz) else np.zeros(0))
+    ok = np.isfinite(d_L) & (d_L > 0)
+    for name, arr in zip(_TABLE_COLUMNS, (L, T, gz, d_L, rows)):
+        shell.extras[name] = arr[ok]
+    return shell
+
+
+@instrument.timed("farIR_table")
+def farIR_galaxy_table(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0,
+                       galaxy_mask=None, checkpoint=None, n_workers=1,
+                       comm=None, prefetch=DEFAULT_DEPTH, prefetch_mb=None):
+    """
+    Per-galaxy far-IR inputs of the lightcone, read once.
+
+    Selects the galaxies ``lightcone_farIR_background`` would include
+    and returns their L_FIR [L_sun], Liang+19 dust temperature at
+    a_dust = 0 (``T0`` [K], so T_eqv = 10^a T0), redshift and luminosity
+    distance [cm], with each galaxy's lightcone row.  The remaining
+    arguments are those of ``lightcone_farIR_background``.
+
+    Returns
+    -------
+    dict with "L_FIR", "T0", "z", "d_L", "lc_row" (arrays) and "omega_sr"
+    """
+    lc_path = build_lightcone(cfg, area_deg2, z_min, z_max)
+    with open_hdf5(lc_path) as lc:
+        gal_z = read_column(lc, "z")
+        snap_arr = read_column(lc, "snap")
+        gal_idx = read_column(lc, "galaxy_index")
+
+    if galaxy_mask is None:
+        galaxy_mask = np.ones(len(gal_z), dtype=bool)
+    galaxy_mask = np.asarray(galaxy_mask)
+    if len(galaxy_mask) != len(gal_z):
+        raise ValueError(f"galaxy_mask length ({len(galaxy_mask)}) != "
+                         f"lightcone length ({len(gal_z)})")
+
+    acc = SpectrumAccumulator()
+    acc.start(("total",), 0)
+    checkpoints = open_checkpoints(checkpoint, "farIR_table", cfg,
+                                   {"columns": list(_TABLE_COLUMNS)},
+                                   gal_z, gal_idx, acc)
+    process_shells("farIR_table", cfg, acc, _table_shell, farIR_columns,
+                   snap_arr, gal_z, gal_idx, galaxy_mask, load_args=(0.0,),
+                   checkpoints=checkpoints, n_workers=n_workers,
+                   prefetch=prefetch, prefetch_mb=prefetch_mb, comm=comm)
+
+    table = {name: acc.extras(name) for name in _TABLE_COLUMNS}
+    table["omega_sr"] = area_deg2 * (np.pi / 180.0) ** 2
+    return table
+
+
+# ══════════════════════════════════════════════════════════════════
+# Binned model
+# ══════════════════════════════════════════════════════════════════
+
+def default_lam_obs(n_points=500):
+    """Observed grid of ``lightcone_farIR_background`` [Angstrom]."""
+    return np.logspace(np.log10(1.5e5), np.log10(1e8), n_points)
+
+
+def flux_weights(table):
+    """
+    Flux weight w = L_FIR L_sun / (4 pi d_L^2) [erg s^-1 cm^-2] and
+    log10 u_0 = log10(T_0 / (1 + z)) of every galaxy of a table.
+    """
+    w = table["L_FIR"] * LSUN_ERG_S / (4.0 * np.pi * table["d_L"] ** 2)
+    return w, np.log10(table["T0"] / (1.0 + table["z"]))
+
+
+def galaxy_fluxes(table, lam_obs, a_dust=-0.0455, beta=2.0, rows=slice(None)):
+    """
+    Observed far-IR flux density F_lambda [erg s^-1 cm^-2 AA^-1] of the
+    galaxies ``rows`` of a table at any wavelengths ``lam_obs``
+    [Angstrom], shape (n_rows, n_lambda).  The SEDs are normalised to
+    L_FIR on the grid of ``lightcone_farIR_background``, as there;
+    galaxies with an invalid SED give zero.
+    """
+    w, log_u0 = flux_weights({k: np.asarray(table[k])[rows]
+                              for k in ("L_FIR", "T0", "z", "d_L")})
+    u_col = 10.0 ** (log_u0 + a_dust)[:, None]
+    grid = default_lam_obs()
+    integral = mbb(grid, u_col, beta) @ np.gradient(grid)
+    F = mbb(np.asarray(lam_obs, dtype=float), u_col, beta)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        F *= (w / integral)[:, None]
+    F[~(np.isfinite(integral) & (integral > 0))] = 0.0
+    F[~np.isfinite(F)] = 0.0
+    return F
+
+
+def _cic(log_u, w, lo, n_bins, dlog_u):
+    """Cloud-in-cell weights of points ``log_u`` on the grid lo + k dlog_u."""
+    pos = (log_u - lo) / dlog_u
+    i = np.floor(pos).astype(int)
+    f = pos - i
+    return (np.bincount(i, w * (1 - f), minlength=n_bins)
+            + np.bincount(i + 1, w * f, minlength=n_bins))
+
+
+def _templates(lam_obs, log_u, beta):
+    """
+    MBB templates at temperatures 10^log_u on ``lam_obs``, each of unit
+    integral over the grid of ``lightcone_farIR_background`` (where the
+    pipeline normalises its SEDs) and zero if invalid.
+
+    Returns the templates, their validity and the same templates on
+    that grid (the first array again if ``lam_obs`` is that grid).
+    """
+    lam_ref = default_lam_obs()
+    lam_obs = np.asarray(lam_obs, dtype=float)
+    if np.array_equal(lam_obs, lam_ref):
+        g, ok = normalised_mbb_batch(lam_ref, np.ones(len(log_u)), 10.0 ** log_u, beta)
+        return g, ok, g
+
+    u_col = 10.0 ** log_u[:, None]
+    g_ref = mbb(lam_ref, u_col, beta)
+    integral = np.sum(g_ref * np.gradient(lam_ref), axis=-1)
+    ok = (np.all(np.isfinite(g_ref), axis=-1) & np.isfinite(integral)
+          & (integral > 0))
+    scale = np.zeros(len(log_u))
+    np.divide(1.0, integral, out=scale, where=ok)
+    g_ref[~ok] = 0.0
+    g_ref *= scale[:, None]
+    g = mbb(lam_obs, u_col, beta) * scale[:, None]
+    g[~ok] = 0.0
+    g[~np.isfinite(g)] = 0.0
+    return g, ok, g_ref
+
+
+def _dlng_dlnu(lam_m, u):
+    """d ln B_lambda / d ln T = x / (1 - e^-x), before the x <= 700 clip."""
+    x = H_PLANCK * C_LIGHT / (lam_m * K_BOLTZMANN * u[:, None])
+    with np.errstate(over="ignore"):
+        return np.where(x < 700, x / -np.expm1(-x), 0.0)
+
+
+class FarIRModel:
+    """
+    Far-IR background as a function of (a_dust, beta) from a galaxy table.
+
+    Parameters
+    ----------
+    table   : dict from :func:`farIR_galaxy_table`
+    lam_obs : array – observed wavelengths [Angstrom]; defaults to the
+              grid of ``lightcone_farIR_background``, on which the
+              templates are normalised whatever ``lam_obs``
+    dlog_u  : float – bin width in log10 u_0
+    """
+
+    def __init__(self, table, lam_obs=None, dlog_u=DLOG_U):
+        self.lam_obs = np.asarray(default_lam_obs() if lam_obs is None else lam_obs,
+                                  dtype=float)
+        self.lam_ref = default_lam_obs()
+        self.dlam_ref = np.gradient(self.lam_ref)
+        self.omega_sr = table["omega_sr"]
+        self.n_gal = len(table["L_FIR"])
+
+        w, log_u0 = flux_weights(table)
+        lo = np.floor(log_u0.min() / dlog_u) * dlog_u if self.n_gal else 0.0
+        n_bins = int(np.floor((log_u0.max() - lo) / dlog_u)) + 2 if self.n_gal else 0
+        W = _cic(log_u0, w, lo, n_bins, dlog_u)
+        nz = W > 0
+        self.log_u0 = (lo + dlog_u * np.arange(n_bins))[nz]
+        self.weights = W[nz]
+
+        # d ln g / d beta = ln(100 µm / lambda), before normalisation
+        self._e = np.log(1e6 / self.lam_obs)
+        self._e_ref = np.log(1e6 / self.lam_ref)
+
+    def spectrum(self, a_dust, beta=2.0, derivs=False):
+        """
+        Background intensity I_lambda [erg s^-1 cm^-2 sr^-1 AA^-1] on
+        ``lam_obs``.  With ``derivs=True`` also returns its derivatives
+        with respect to a_dust and beta, shape (2, n_lambda).
+        """
+        I = np.zeros(len(self.lam_obs))
+        dI = np.zeros((2, len(self.lam_obs)))
+        lam_m = self.lam_obs * AA_TO_M
+        for start in range(0, len(self.weights), BLOCK_ROWS):
+            b = slice(start, start + BLOCK_ROWS)
+            W = self.weights[b]
+            g, ok, g_ref = _templates(self.lam_obs, a_dust + self.log_u0[b], beta)
+            W = np.where(ok, W, 0.0)
+            I += W @ g
+            if not derivs:
+                continue
+
+            # The normalisation integrals run over the reference grid
+            u_k = 10.0 ** (a_dust + self.log_u0[b])
+            gs = g * _dlng_dlnu(lam_m, u_k)
+            gs_ref = gs if g_ref is g else g_ref * _dlng_dlnu(self.lam_ref * AA_TO_M, u_k)
+            dI[0] += np.log(10.0) * (W @ gs - (W * (gs_ref @ self.dlam_ref)) @ g)
+            dI[1] += ((W @ g) * self._e
+                      - (W * (g_ref @ (self._e_ref * self.dlam_ref))) @ g)
+
+        I /= self.omega_sr
+        dI /= self.omega_sr
+        return (I, dI) if derivs else I
+
+    def nuInu_nW(self, a_dust, beta=2.0):
+        """lambda I_lambda = nu I_nu [nW m^-2 sr^-1] on ``lam_obs``."""
+        return self.lam_obs * self.spectrum(a_dust, beta) * CGS_TO_NW_M2
+
+
+def farIR_grid(table, a_values, beta_values, lam_obs=None, dlog_u=DLOG_U):
+    """
+    Far-IR backgrounds on a full (beta, a_dust) grid from one galaxy table.
+
+    The flux weights of every a_dust are binned (cloud-in-cell) on one
+    log u grid covering all shifts; each beta then needs a single table
+    of templates on that grid, and all a_dust spectra follow from one
+    matrix product with it.
+
+    Parameters
+    ----------
+    table       : dict from :func:`farIR_galaxy_table`
+    a_values    : array (n_a,)
+    beta_values : array (n_beta,)
+    lam_obs     : array, optional – observed grid [Angstrom]; the
+                  templates are normalised on the default grid whatever it is
+    dlog_u      : float – bin width in log10 u
+
+    Returns
+    -------
+    lam_obs   : array (n_lambda,) [Angstrom]
+    intensity : array (n_beta, n_a, n_lambda) – I_lambda
+                [erg s^-1 cm^-2 sr^-1 AA^-1]
+    """
+    lam_obs = np.asarray(default_lam_obs() if lam_obs is None else lam_obs,
+                         dtype=float)
+    a_values = np.atleast_1d(np.asarray(a_values, dtype=float))
+    beta_values = np.atleast_1d(np.asarray(beta_values, dtype=float))
+    intensity = np.zeros((len(beta_values), len(a_values), len(lam_obs)))
+    if len(table["L_FIR"]) == 0:
+        return lam_obs, intensity
+
+    w, log_u0 = flux_weights(table)
+    lo = np.floor((log_u0.min() + a_values.min()) / dlog_u) * dlog_u
+    n_bins = int(np.floor((log_u0.max() + a_values.max() - lo) / dlog_u)) + 2
+    W = np.stack([_cic(log_u0 + a, w, lo, n_bins, dlog_u) for a in a_values])
+    used = np.flatnonzero(W.any(axis=0))
+    W = W[:, used]
+    log_u = lo + dlog_u * used
+
+    for j, beta in enumerate(beta_values):
+        for start in range(0, len(used), BLOCK_ROWS):
+            b = slice(start, start + BLOCK_ROWS)
+            g, ok, _ = _templates(lam_obs, log_u[b], beta)
+            intensity[j] += W[:, b][:, ok] @ g[ok]
+    intensity /= table["omega_sr"]
+    return lam_obs, intensity
+
+
+def farIR_adaptive(table, a_dust=-0.0455, beta=2.0, rtol=1e-3, n_start=17,
+                   max_points=500, dlog_u=DLOG_U):
+    """
+    Far-IR background on an adaptively refined wavelength grid
+    (``adaptive.refine_grid``) over the range of
+    ``lightcone_farIR_background``.
+
+    The flux weights are binned in log u as in :class:`FarIRModel` and
+    each bin's MBB normalised to unit L_FIR once, on the pipeline's
+    500-point grid; a new wavelength then costs one template per bin
+    whatever the grid, rather than one SED per galaxy.
+
+    Parameters
+    ----------
+    table      : dict from :func:`farIR_galaxy_table`
+    rtol       : float – target relative interpolation error
+    n_start, max_points : int – initial and largest grid sizes
+
+    Returns
+    -------
+    lam_obs   : array (n,) [Angstrom] – non-uniform grid
+    intensity : array (n,) – I_lambda [erg s^-1 cm^-2 sr^-1 AA^-1]
+    """
+    from src.backgrounds.adaptive import refine_grid
+
+    lam_ref = default_lam_obs()
+    w, log_u0 = flux_weights(table)
+    if len(w) == 0:
+        return lam_ref[[0, -1]], np.zeros(2)
+    log_u0 = log_u0 + a_dust
+    lo = np.floor(log_u0.min() / dlog_u) * dlog_u
+    n_bins = int(np.floor((log_u0.max() - lo) / dlog_u)) + 2
+    W = _cic(log_u0, w, lo, n_bins, dlog_u)
+    used = np.flatnonzero(W > 0)
+    u_col = 10.0 ** (lo + dlog_u * used)[:, None]
+
+    coef = np.zeros(len(used))
+    dlam = np.gradient(lam_ref)
+    for start in range(0, len(used), BLOCK_ROWS):
+        b = slice(start, start + BLOCK_ROWS)
+        integral = mbb(lam_ref, u_col[b], beta) @ dlam
+        ok = np.isfinite(integral) & (integral > 0)
+        np.divide(W[used[b]], integral, out=coef[b], where=ok)
+    coef /= table["omega_sr"]
+
+    def intensity(lam):
+        I = np.zeros(len(lam))
+        for start in range(0, len(used), BLOCK_ROWS):
+            b = slice(start, start + BLOCK_ROWS)
+            F = mbb(lam, u_col[b], beta)
+            F[~np.isfinite(F)] = 0.0
+            I += coef[b] @ F
+        return I
+
+    return refine_grid(intensity, lam_ref[0], lam_ref[-1], n_start=n_start,
+                       rtol=rtol, max_points=max_points)
+
+
+def lightcone_farIR_adaptive(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0,
+                             beta=2.0, a_dust=-0.0455, rtol=1e-3, n_start=17,
+                             max_points=500, galaxy_mask=None, **kwargs):
+    """
+    Adaptive-grid mode of ``lightcone_farIR_background``: read the
+    lightcone galaxies once (:func:`farIR_galaxy_table`, further keyword
+    arguments passed on) and refine the wavelength grid where the
+    spectrum needs it (:func:`farIR_adaptive`).
+
+    Returns
+    -------
+    lam_obs   : array (Angstrom) – non-uniform grid
+    intensity : array (erg/s/cm^2/sr/AA)
+    """
+    table = farIR_galaxy_table(cfg, area_deg2, z_min, z_max,
+                               galaxy_mask=galaxy_mask, **kwargs)
+    with instrument.stage("farIR_adaptive"):
+        return farIR_adaptive(table, a_dust, beta, rtol=rtol, n_start=n_start,
+                              max_points=max_points)
+
+
+def _interp_matrix(x_grid, x):
+    """Matrix P with ``P @ y`` the linear interpolation of y(x_grid) at x."""
+    j = np.clip(np.searchsorted(x_grid, x) - 1, 0, len(x_grid) - 2)
+    t = (x - x_grid[j]) / (x_grid[j + 1] - x_grid[j])
+    P = np.zeros((len(x), len(x_grid)))
+    rows = np.arange(len(x))
+    P[rows, j] = 1.0 - t
+    P[rows, j + 1] = t
+    return P
+
+
+class EBLChi2:
+    """
+    chi^2 of a :class:`FarIRModel` against observed EBL points (model
+    interpolated linearly in log wavelength), with analytic gradient.
+
+    Parameters
+    ----------
+    model : FarIRModel
+    lam_um, nuInu_nW, err_nW : arrays – e.g. from :func:`load_observed_ebl`;
+        points outside the model's wavelength grid are ignored
+    """
+
+    def __init__(self, model, lam_um, nuInu_nW, err_nW):
+        lam_AA = np.asarray(lam_um, dtype=float) * 1e4
+        inside = (lam_AA >= model.lam_obs[0]) & (lam_AA <= model.lam_obs[-1])
+        if not inside.any():
+            raise ValueError("No observed EBL points inside the model's "
+                             "wavelength range")
+        self.model = model
+        self.lam_um = np.asarray(lam_um, dtype=float)[inside]
+        self.y = np.asarray(nuInu_nW, dtype=float)[inside]
+        self.err = np.asarray(err_nW, dtype=float)[inside]
+        self.P = _interp_matrix(np.log(model.lam_obs), np.log(lam_AA[inside]))
+        self.n_eval = 0
+
+    def residuals(self, a_dust, beta=2.0, derivs=False):
+        """
+        Normalised residuals (model - data) / err, and with ``derivs=True``
+        their Jacobian in (a_dust, beta), shape (n_data, 2).
+        """
+        self.n_eval += 1
+        conv = self.model.lam_obs * CGS_TO_NW_M2
+        out = self.model.spectrum(a_dust, beta, derivs=derivs)
+        I, dI = out if derivs else (out, None)
+        r = (self.P @ (conv * I) - self.y) / self.err
+        if not derivs:
+            return r
+        return r, (self.P @ (conv * dI).T) / self.err[:, None]
+
+    def __call__(self, a_dust, beta=2.0):
+        return float(np.sum(self.residuals(a_dust, beta) ** 2))
+
+
+# ══════════════════════════════════════════════════════════════════
+# Fit
+# ══════════════════════════════════════════════════════════════════
+
+def fit_farIR(chi2, a0=-0.0455, beta0=2.0, a_bounds=(-1.0, 1.0),
+              beta_bounds=(1.0, 2.5), fit_beta=False, tol=1e-10):
+    """
+    Best-fitting a_dust (and beta) by bounded L-BFGS-B on ``chi2``.
+
+    Parameter uncertainties are the Gauss-Newton (Delta chi^2 = 1)
+    estimate  cov = (J^T J)^-1  from the Jacobian of the normalised
+    residuals at the best fit.
+
+    Parameters
+    ----------
+    chi2     : EBLChi2
+    a0, beta0 : float – starting point (beta0 is kept fixed unless
+                ``fit_beta``)
+    a_bounds, beta_bounds : (float, float)
+    fit_beta : bool
+
+    Returns
+    -------
+    dict with "a_dust", "beta", "sigma_a", "sigma_beta", "cov", "chi2",
+    "dof", "chi2_red", "n_data", "n_eval", "success", "message"
+    """
+    from scipy.optimize import minimize
+
+    n_par = 2 if fit_beta else 1
+
+    def objective(theta):
+        beta = theta[1] if fit_beta else beta0
+        r, J = chi2.residuals(theta[0], beta, derivs=True)
+        return float(r @ r), 2.0 * (r @ J[:, :n_par])
+
+    n0 = chi2.n_eval
+    x0 = [a0, beta0][:n_par]
+    bounds = [a_bounds, beta_bounds][:n_par]
+    res = minimize(objective, x0, jac=True, method="L-BFGS-B", bounds=bounds,
+                   options={"ftol": tol, "gtol": 1e-8})
+    n_eval = chi2.n_eval - n0
+
+    a_best = float(res.x[0])
+    beta_best = float(res.x[1]) if fit_beta else float(beta0)
+    r, J = chi2.residuals(a_best, beta_best, derivs=True)
+    J = J[:, :n_par]
+    cov = np.linalg.pinv(J.T @ J)
+    sigma = np.sqrt(np.diag(cov))
+
+    n_data = len(r)
+    dof = max(n_data - n_par, 1)
+    chi2_min = float(r @ r)
+    return {
+        "a_dust": a_best,
+        "beta": beta_best,
+        "sigma_a": float(sigma[0]),
+        "sigma_beta": float(sigma[1]) if fit_beta else 0.0,
+        "cov": cov,
+        "chi2": chi2_min,
+        "dof": dof,
+        "chi2_red": chi2_min / dof,
+        "n_data": n_data,
+        "n_eval": n_eval,
+        "success": bool(res.success),
+        "message": str(res.message),
+    }
@@ -0,0 +1,115 @@
+"""
+Optional MPI backend for the background pipelines.
+
+``mpi4py`` is only imported when a communicator is requested, so the
+rest of the package runs without it.  Two ways of splitting work across
+ranks are provided:
+
+* by snapshot shell – pass ``comm`` to any ``lightcone_*_background``.
+  Shells are assigned to ranks largest first (each rank computes its own
+  with the serial or process-pool path, so ``n_workers`` still applies
+  per rank), then the partial sums are all-gathered so every rank ends
+  with the same accumulator and returns the same spectra as a
+  single-process run;
+* by item – :func:`split_items` / :func:`gather_items` hand whole
+  sweep points or realisations to ranks round-robin and collect the
+  results on the root rank.
+
+Only the root rank writes results (:func:`is_root`); ranks never share
+an HDF5 file.
+
+    mpirun -n 4 python scripts/run_mpi.py combined --sim m25n256 --z_max 3
+"""
+
+import numpy as np
+
+ROOT = 0
+
+
+def get_comm(comm=None):
+    """``comm`` if given, else ``MPI.COMM_WORLD`` (requires mpi4py)."""
+    if comm is not None:
+        return comm
+    try:
+        from mpi4py import MPI
+    except ImportError as e:
+        raise ImportError("The MPI backend needs mpi4py "
+                          "(pip install mpi4py) and an MPI runtime") from e
+    return MPI.COMM_WORLD
+
+
+def is_root(comm):
+    """True on the writing rank, and always when running without MPI."""
+    return comm is None or comm.Get_rank() == ROOT
+
+
+def assign_largest_first(sizes, n_ranks):
+    """
+    Greedy longest-processing-time assignment of tasks to ranks.
+
+    Parameters
+    ----------
+    sizes   : sequence of int – cost of each task (e.g. galaxies per shell)
+    n_ranks : int
+
+    Returns
+    -------
+    int array – owning rank of each task.  Ties are broken by task
+    order and rank number, so every rank computes the same assignment.
+    """
+    sizes = np.asarray(sizes)
+    owner = np.zeros(len(sizes), dtype=int)
+    load = np.zeros(n_ranks)
+    for i in sorted(range(len(sizes)), key=lambda i: (-sizes[i], i)):
+        r = int(np.argmin(load))
+        owner[i] = r
+        load[r] += sizes[i]
+    return owner
+
+
+def owned_snaps(comm, snap_arr, galaxy_mask, skip_snaps=()):
+    """Snapshots this rank computes, balanced by masked galaxy count."""
+    snaps = [int(s) for s in np.unique(snap_arr) if int(s) not in skip_snaps]
+    sizes = [np.count_nonzero((snap_arr == s) & galaxy_mask) for s in snaps]
+    owner = assign_largest_first(sizes, comm.Get_size())
+    rank = comm.Get_rank()
+    return {s for s, r in zip(snaps, owner) if r == rank}
+
+
+def allgather_shells(comm, accumulator, snaps):
+    """
+    Share this rank's shells ``snaps`` with every rank, so that each
+    accumulator holds all shells.  Shells are re-added in snapshot order.
+    """
+    local = [accumulator.shells[s] for s in sorted(snaps) if s in accumulator.shells]
+    gathered = comm.allgather(local)
+    for partial in sorted((p for part in gathered for p in part),
+                          key=lambda p: p.snap):
+        accumulator.add_shell(partial)
+
+
+def split_items(comm, items):
+    """This rank's share of ``items`` (round-robin), with their indices."""
+    rank, size = comm.Get_rank(), comm.Get_size()
+    return [(i, item) for i, item in enumerate(items) if i % size == rank]
+
+
+def gather_items(comm, local):
+    """
+    Collect ``[(index, result), ...]`` from every rank on the root.
+
+    Returns the results in index order on the root rank, None elsewhere.
+    """
+    gathered = comm.gather(local, root=ROOT)
+    if not is_root(comm):
+        return None
+    return [result for _, result in sorted(
+        (pair for part in gathered for pair in part), key=lambda p: p[0])]
+
+
+def prepare_lightcone(comm, build_lightcone, cfg, area_deg2, z_min, z_max):
+    """Build (or find) the lightcone on the root rank before any rank reads it."""
+    if is_root(comm):
+        build_lightcone(cfg, area_deg2, z_min, z_max)
+    if comm is not None:
+        comm.Barrier()
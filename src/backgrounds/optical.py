@@ -1,36 +1,48 @@
+import functools
 import numpy as np
-import h5py
 from pathlib import Path
 import astropy.units as u
 from astropy.constants import c
-from astropy.cosmology import Planck15 as cosmo
-import caesar
 import os
 os.environ.setdefault('SPS_HOME', '/home/spujni/fsps')
-import fsps
+from src import instrument
 from src.config import SimConfig
+from src.utils import open_hdf5, read_dataset
 from src.lightcone.generate import generate_lightcone
+from src.lightcone.layout import read_column
+from src.lightcone.join import join_catalogue_columns
+from src.backgrounds.accumulate import SpectrumAccumulator
+from src.backgrounds.shells import open_checkpoints, process_shells
+from src.prefetch import DEFAULT_DEPTH
 
 LIGHTCONE_DIR = Path(__file__).resolve().parent.parent.parent / "data" / "lightcones"
 SKIP_SNAPS = {150, 151}
 
 LSUN_ERG_S = 3.828e33  # erg/s
 
+
+@functools.lru_cache(maxsize=None)
+def get_filter(name):
+    """FSPS filter by name.  fsps is slow to import, so load it on first use."""
+    import fsps
+    return fsps.get_filter(name)
+
+
 def compute_summed_sed_from_appmags(hdf5_path, mask=None):
     """SED from apparent magnitudes, summed over all galaxies."""
-    with h5py.File(hdf5_path, "r") as f:
+    with open_hdf5(hdf5_path) as f:
         appmag_keys = [k for k in f["galaxy_data/dicts"].keys() if k.startswith("appmag.")]
         freqs, fluxes, labels = [], [], []
 
         for k in appmag_keys:
-            mags = f[f"galaxy_data/dicts/{k}"][:]
+            mags = read_dataset(f, f"galaxy_data/dicts/{k}")
             if mask is not None:
                 mags = mags[mask]
             fnu_jy = 3631.0 * 10 ** (-mags / 2.5)
             filt = k.split("appmag.")[-1]
             
             try:
-                fsps_filt = fsps.get_filter(filt)
+                fsps_filt = get_filter(filt)
                 lam_eff = fsps_filt.lambda_eff * u.AA
                 nu = (c / lam_eff).to_value(u.Hz)
                 freqs.append(nu)
@@ -50,19 +62,19 @@ def compute_summed_sed_from_appmags(hdf5_path, mask=None):
 
 def compute_summed_sed_from_absmags(hdf5_path, mask=None):
     """SED from absolute magnitudes, summed over selected galaxies."""
-    with h5py.File(hdf5_path, "r") as f:
+    with open_hdf5(hdf5_path) as f:
         absmag_keys = [k for k in f["galaxy_data/dicts"].keys() if k.startswith("absmag.")]
         freqs, fluxes, labels = [], [], []
 
         for k in absmag_keys:
-            mags = f[f"galaxy_data/dicts/{k}"][:]
+            mags = read_dataset(f, f"galaxy_data/dicts/{k}")
             if mask is not None:
                 mags = mags[mask]
             fnu_jy = 3631.0 * 10 ** (-mags / 2.5)
             filt = k.split("absmag.")[-1]
             
             try:
-                fsps_filt = fsps.get_filter(filt)
+                fsps_filt = get_filter(filt)
                 lam_eff = fsps_filt.lambda_eff * u.AA
                 nu = (c / lam_eff).to_value(u.Hz)
                 freqs.append(nu)
@@ -92,14 +104,15 @@ def classify_galaxies(hdf5_path, redshift):
     - Dictionary with classification arrays
     """
 
-    with h5py.File(hdf5_path, "r") as f:
-        sfr = f["galaxy_data/sfr"][:]
-        sfr_100 = f["galaxy_data/sfr_100"][:]
-        stellar_mass = f["galaxy_data/dicts/masses.stellar"][:]
+    with open_hdf5(hdf5_path) as f:
+        sfr = read_dataset(f, "galaxy_data/sfr")
+        sfr_100 = read_dataset(f, "galaxy_data/sfr_100")
+        stellar_mass = read_dataset(f, "galaxy_data/dicts/masses.stellar")
 
     ssfr = sfr / stellar_mass
 
     # Evolving sSFR threshold: 0.2 / t_H(z)
+    from astropy.cosmology import Planck15 as cosmo
     t_H = cosmo.age(redshift).to('yr').value  # Age of universe at z in years
     ssfr_thresh = 0.2 / t_H  # 1/yr
 
@@ -122,6 +135,88 @@ def get_stellar_mass_bins(stellar_mass, n_bins=5):
     bins = np.logspace(log_mass.min(), log_mass.max(), n_bins + 1)
     return np.digitize(stellar_mass, bins) - 1, bins
 
+# Group names of ``star_forming_labels``, in label order
+SF_GROUPS = ("star_forming", "quenched")
+
+
+def ssfr_threshold(redshift, n_grid=512):
+    """
+    Evolving sSFR threshold 0.2 / t_H(z) [1/yr] of ``classify_galaxies``
+    for an array of redshifts.  The Planck15 age is tabulated on
+    ``n_grid`` redshifts and interpolated, so millions of lightcone
+    galaxies cost one small table.
+    """
+    from astropy.cosmology import Planck15 as cosmo
+    redshift = np.asarray(redshift, dtype=float)
+    if redshift.size == 0:
+        return np.zeros(redshift.shape)
+    z_grid = np.linspace(redshift.min(), redshift.max(), n_grid)
+    t_H = np.interp(redshift, z_grid, cosmo.age(z_grid).to('yr').value)
+    return 0.2 / t_H
+
+
+def optical_galaxy_fluxes(cfg, snap_arr, gal_idx, filters, dust=True):
+    """
+    Flux density [Jy] of every lightcone galaxy in each of ``filters``,
+    shape (n_gal, n_filters), from its apparent magnitude with (or
+    without) dust as in ``optical_shell``; missing magnitudes give zero.
+    """
+    prefix = "appmag" if dust else "appmag_nodust"
+    keys = [f"galaxy_data/dicts/{prefix}.{filt}" for filt in filters]
+    cols = join_catalogue_columns(cfg, snap_arr, gal_idx, keys)
+    mags = np.stack([cols[key] for key in keys], axis=1)
+    fnu = 3631.0 * 10 ** (-mags / 2.5)
+    fnu[~np.isfinite(fnu)] = 0.0
+    return fnu
+
+
+def star_forming_labels(cfg, snap_arr, gal_idx, gal_z):
+    """
+    Group label per lightcone galaxy for ``SpectrumAccumulator(groups=)``:
+    0 star-forming, 1 quenched (sSFR below ``ssfr_threshold`` at the
+    galaxy's lightcone redshift), -1 where sSFR is undefined.
+    """
+    cols = join_catalogue_columns(
+        cfg, snap_arr, gal_idx,
+        ("galaxy_data/sfr", "galaxy_data/dicts/masses.stellar"))
+    sfr = cols["galaxy_data/sfr"]
+    mstar = cols["galaxy_data/dicts/masses.stellar"]
+    labels = np.full(len(sfr), -1, dtype=int)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ssfr = sfr / mstar
+    ok = np.isfinite(ssfr) & (mstar > 0)
+    labels[ok] = (ssfr[ok] < ssfr_threshold(np.asarray(gal_z)[ok])).astype(int)
+    return labels
+
+
+def mass_bin_labels(mstar, bins=None, n_bins=5):
+    """
+    Stellar-mass bin label per lightcone galaxy (0 … len(bins)-2, -1
+    outside the bins or without a stellar mass), from the lightcone's
+    ``stellar_mass`` column.  Without ``bins``, ``n_bins`` equal-log bins
+    span the cone's masses as in ``get_stellar_mass_bins``, the lightest
+    and most massive galaxies included; if no galaxy has a mass, every
+    label is -1 and no bins are returned.
+
+    Returns labels, bins.
+    """
+    mstar = np.asarray(mstar, dtype=float)
+    labels = np.full(len(mstar), -1, dtype=int)
+    ok = np.isfinite(mstar) & (mstar > 0)
+    if bins is None:
+        if not ok.any():
+            return labels, np.empty(0)
+        log_mass = np.log10(mstar[ok])
+        bins = np.logspace(log_mass.min(), log_mass.max(), n_bins + 1)
+        # Exact end points, so the extreme galaxies survive the log round trip
+        bins[[0, -1]] = mstar[ok].min(), mstar[ok].max()
+    bins = np.asarray(bins, dtype=float)
+    k = np.searchsorted(bins, mstar[ok], side="right") - 1
+    k[mstar[ok] == bins[-1]] = len(bins) - 2
+    k[(k < 0) | (k >= len(bins) - 1)] = -1
+    labels[ok] = k
+    return labels, bins
+
 def build_lightcone(cfg, area_deg2=1.0, z_min=0.0, z_max=3.0):
     """Generate or load a cached lightcone."""
     LIGHTCONE_DIR.mkdir(parents=True, exist_ok=True)
@@ -133,11 +228,91 @@ def build_lightcone(cfg, area_deg2=1.0, z_min=0.0, z_max=3.0):
     return lc_path
 
 
-def lightcone_optical_background(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0, galaxy_mask = None):
+def optical_columns(cfg, snap, filters_sorted):
+    """
+    Apparent magnitudes with and without dust of every galaxy of one
+    catalogue, {"dust"|"nodust": {filter: array}}, or None if the
+    catalogue is missing.
+    """
+    hdf5 = cfg.hdf5_path(snap)
+    if not hdf5.exists():
+        print(f"  WARN: missing {hdf5}, skipping snap {snap}")
+        return None
+
+    with open_hdf5(hdf5) as f:
+        mags = {}
+        mags_nodust = {}
+        for filt in filters_sorted:
+            key = f"galaxy_data/dicts/appmag.{filt}"
+            key_nd = f"galaxy_data/dicts/appmag_nodust.{filt}"
+            if key in f:
+                mags[filt] = read_dataset(f, key)
+            if key_nd in f:
+                mags_nodust[filt] = read_dataset(f, key_nd)
+    return {"dust": mags, "nodust": mags_nodust}
+
+
+def _fluxes_jy(mags, filters_sorted, gi):
+    """Flux densities [Jy] (n_rows, n_filters) from magnitudes; zero where missing."""
+    fnu = np.zeros((len(gi), len(filters_sorted)))
+    for i, filt in enumerate(filters_sorted):
+        if filt in mags:
+            mag = mags[filt][gi]
+            fnu[:, i] = np.where(np.isfinite(mag), 3631.0 * 10 ** (-mag / 2.5), 0.0)
+    return fnu
+
+
+def optical_shell(cfg, snap, gal_z, gal_idx, shell, columns, filters_sorted):
+    """
+    Fill ``shell`` with the per-filter fluxes (Jy) of one snapshot's
+    lightcone galaxies from their apparent magnitudes (the snapshot's
+    ``optical_columns``), with ("dust") and without ("nodust") dust.
+    """
+    mags, mags_nodust = columns["dust"], columns["nodust"]
+    gal_idx = np.asarray(gal_idx, dtype=int)
+    gal_z = np.asarray(gal_z, dtype=float)
+
+    n_gals = len(mags[filters_sorted[0]]) if filters_sorted[0] in mags else 0
+    li = np.flatnonzero(gal_idx < n_gals)
+    gi, gz = gal_idx[li], gal_z[li]
+
+    with np.errstate(over="ignore", invalid="ignore"):
+        shell.add_many("dust", _fluxes_jy(mags, filters_sorted, gi), gz, li)
+        shell.add_many("nodust", _fluxes_jy(mags_nodust, filters_sorted, gi), gz, li)
+    return shell
+
+
+@instrument.timed("optical")
+def lightcone_optical_background(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0, galaxy_mask = None,
+                                 accumulator=None, checkpoint=None,
+                                 n_workers=1, comm=None,
+                                 prefetch=DEFAULT_DEPTH, prefetch_mb=None):
     """
     Compute the optical/near-IR cosmic background intensity using
     Caesar's pre-computed apparent magnitudes (with and without dust).
 
+    Parameters
+    ----------
+    galaxy_mask : array-like, optional
+        Boolean mask of same length as lightcone galaxies (jackknife).
+    accumulator : SpectrumAccumulator, optional
+        If given, filled with per-snapshot-shell, per-redshift-bin and
+        per-region spectra and their shot-noise second moments
+        (components "dust" and "nodust") in the same units as
+        ``intensity``.
+    checkpoint : bool or Path, optional
+        Persist each snapshot's partial sums (see ``shells``) in the
+        default or given directory and reuse them on reruns.
+    n_workers : int
+        Compute snapshot shells (chunked above ``shells.CHUNK_SIZE``
+        galaxies) in a pool of this many processes.
+    comm : mpi4py communicator, optional
+        Split the snapshot shells across its ranks (see ``mpi``); every
+        rank returns the full result.
+    prefetch, prefetch_mb : int, float or None
+        Read up to ``prefetch`` catalogues (at most ``prefetch_mb`` MB)
+        ahead of the shell being computed, in a background thread.
+
     Returns
     -------
     lam_obs          : array (Angstrom) — filter effective wavelengths
@@ -146,10 +321,10 @@ def lightcone_optical_background(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0, galax
     """
     lc_path = build_lightcone(cfg, area_deg2, z_min, z_max)
 
-    with h5py.File(lc_path, "r") as lc:
-        gal_z = lc["z"][:]
-        snap_arr = lc["snap"][:]
-        gal_idx = lc["galaxy_index"][:]
+    with open_hdf5(lc_path) as lc:
+        gal_z = read_column(lc, "z")
+        snap_arr = read_column(lc, "snap")
+        gal_idx = read_column(lc, "galaxy_index")
 
     # Apply galaxy mask if provided for jackknife error sampling
     if galaxy_mask is not None:
@@ -157,19 +332,20 @@ def lightcone_optical_background(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0, galax
         if len(galaxy_mask) != len(gal_z):
             raise ValueError(f"galaxy_mask length ({len(galaxy_mask)}) != "
                            f"lightcone length ({len(gal_z)})")
-        gal_z = gal_z[galaxy_mask]
-        snap_arr = snap_arr[galaxy_mask]
-        gal_idx = gal_idx[galaxy_mask]
     else:
         galaxy_mask = np.ones(len(gal_z), dtype=bool)
+    acc = accumulator if accumulator is not None else SpectrumAccumulator()
+    acc.check_lightcone(len(gal_z))
 
     omega_sr = area_deg2 * (np.pi / 180.0) ** 2
 
     # We'll accumulate flux at each filter's effective wavelength
     # First pass: figure out which filters are available
-    unique_snaps = np.unique(snap_arr)
+    unique_snaps = np.unique(snap_arr[galaxy_mask])
     
-    # Get filter list from first valid snapshot
+    # Get filter list from first valid snapshot.  Import FSPS up front so
+    # that a missing install is reported as such, not as "no filters".
+    import fsps  # noqa: F401
     filter_info = {}  # filter_name -> (nu_Hz, lam_AA)
     for snap in unique_snaps:
         snap = int(snap)
@@ -178,7 +354,7 @@ def lightcone_optical_background(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0, galax
         hdf5 = cfg.hdf5_path(snap)
         if not hdf5.exists():
             continue
-        with h5py.File(hdf5, "r") as f:
+        with open_hdf5(hdf5) as f:
             if "galaxy_data/dicts" not in f:
                 continue
             for k in f["galaxy_data/dicts"].keys():
@@ -186,7 +362,7 @@ def lightcone_optical_background(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0, galax
                     filt = k.split("appmag.")[-1]
                     if filt not in filter_info:
                         try:
-                            fsps_filt = fsps.get_filter(filt)
+                            fsps_filt = get_filter(filt)
                             lam_eff = fsps_filt.lambda_eff  # Angstrom
                             nu = (c / (lam_eff * u.AA)).to_value(u.Hz)
                             filter_info[filt] = (nu, lam_eff)
@@ -202,71 +378,26 @@ def lightcone_optical_background(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0, galax
     nu_arr = np.array([filter_info[f][0] for f in filters_sorted])
     lam_arr = np.array([filter_info[f][1] for f in filters_sorted])
 
-    total_fnu = np.zeros(len(filters_sorted))
-    total_fnu_nodust = np.zeros(len(filters_sorted))
+    acc.start(("dust", "nodust"), len(filters_sorted))
+    checkpoints = open_checkpoints(checkpoint, "optical", cfg,
+                                   {"filters": filters_sorted},
+                                   gal_z, gal_idx, acc)
 
-    # Cache HDF5 data per snapshot
-    cache = {}
-
-    print(f"Processing {len(gal_z)} galaxies across "
+    print(f"Processing {galaxy_mask.sum()} galaxies across "
           f"{len(unique_snaps)} snapshots …")
 
-    for snap in unique_snaps:
-        snap = int(snap)
-        if snap in SKIP_SNAPS:
-            continue
-
-        smask = snap_arr == snap
-        hdf5 = cfg.hdf5_path(snap)
-        if not hdf5.exists():
-            print(f"  WARN: missing {hdf5}, skipping snap {snap}")
-            continue
-
-        if snap not in cache:
-            with h5py.File(hdf5, "r") as f:
-                mags = {}
-                mags_nodust = {}
-                for filt in filters_sorted:
-                    key = f"galaxy_data/dicts/appmag.{filt}"
-                    key_nd = f"galaxy_data/dicts/appmag_nodust.{filt}"
-                    if key in f:
-                        mags[filt] = f[key][:]
-                    if key_nd in f:
-                        mags_nodust[filt] = f[key_nd][:]
-            cache[snap] = (mags, mags_nodust)
-
-        mags, mags_nodust = cache[snap]
-        n_gals = len(mags[filters_sorted[0]]) if filters_sorted[0] in mags else 0
-
-        print(f"  snap {snap}: {smask.sum()} lightcone galaxies")
-
-        for gi in gal_idx[smask]:
-            gi = int(gi)
-            if gi >= n_gals:
-                continue
+    process_shells("optical", cfg, acc, optical_shell, optical_columns,
+                   snap_arr, gal_z, gal_idx, galaxy_mask,
+                   args=(filters_sorted,), load_args=(filters_sorted,),
+                   checkpoints=checkpoints, skip_snaps=SKIP_SNAPS,
+                   n_workers=n_workers, prefetch=prefetch,
+                   prefetch_mb=prefetch_mb, comm=comm)
 
-            for i, filt in enumerate(filters_sorted):
-                # With dust
-                if filt in mags:
-                    mag = mags[filt][gi]
-                    if np.isfinite(mag):
-                        fnu_jy = 3631.0 * 10 ** (-mag / 2.5)
-                        total_fnu[i] += fnu_jy
-
-                # Without dust
-                if filt in mags_nodust:
-                    mag_nd = mags_nodust[filt][gi]
-                    if np.isfinite(mag_nd):
-                        fnu_jy_nd = 3631.0 * 10 ** (-mag_nd / 2.5)
-                        total_fnu_nodust[i] += fnu_jy_nd
-
-    # Convert Jy to cgs: 1 Jy = 1e-23 erg/s/cm²/Hz
-    total_fnu_cgs = total_fnu * 1e-23
-    total_fnu_nodust_cgs = total_fnu_nodust * 1e-23
-
-    # Divide by solid angle to get intensity
-    intensity = total_fnu_cgs / omega_sr
-    intensity_nodust = total_fnu_nodust_cgs / omega_sr
+    # Convert Jy to cgs (1 Jy = 1e-23 erg/s/cm²/Hz) and divide by the
+    # solid angle to get intensity
+    acc.set_scale(1e-23 / omega_sr)
+    intensity = acc.total("dust")
+    intensity_nodust = acc.total("nodust")
 
     print("Done.")
-    return lam_arr, intensity, intensity_nodust
\ No newline at end of file
+    return lam_arr, intensity, intensity_nodust
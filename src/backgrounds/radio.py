@@ -1,13 +1,21 @@
+import itertools
 from pathlib import Path
 import numpy as np
 import h5py
 import astropy.units as u
-import caesar
 
 from src.config import SimConfig
-from src.utils import get_redshift
-from src.physics.radio import radio_luminosity_sf, agn_radio_luminosity, CHABRIER_FRAC_M5
+from src import instrument
+from src.utils import get_redshift, load_caesar, open_hdf5, read_dataset
+from src.physics.radio import (AGN_ALPHA, AGN_EXPONENT, CONDON_A_NT, CONDON_A_TH,
+                               CONDON_ALPHA_NT, CONDON_ALPHA_TH,
+                               MSUN_PER_YR_TO_G_PER_S, agn_radio_luminosity,
+                               imf_fraction, radio_luminosity_sf)
 from src.lightcone.generate import generate_lightcone
+from src.lightcone.layout import read_column
+from src.backgrounds.accumulate import BLOCK_ROWS, SpectrumAccumulator
+from src.backgrounds.shells import open_checkpoints, process_shells
+from src.prefetch import DEFAULT_DEPTH
 
 LIGHTCONE_DIR = Path(__file__).resolve().parent.parent.parent / "data" / "lightcones"
 
@@ -15,12 +23,12 @@ def _redshift_for_snap(cfg, snap):
     """Get redshift for a snapshot, trying HDF5 attrs then Caesar."""
     hdf5 = cfg.hdf5_path(snap)
     if hdf5.exists():
-        with h5py.File(hdf5, "r") as f:
+        with open_hdf5(hdf5) as f:
             if "redshift" in f.attrs:
                 return float(f.attrs["redshift"])
     caesar_f = cfg.caesar_path(snap)
     if caesar_f.exists():
-        obj = caesar.load(str(caesar_f))
+        obj = load_caesar(caesar_f)
         return get_redshift(obj)
     raise FileNotFoundError(f"Cannot get redshift for snap {snap}")
 
@@ -35,10 +43,10 @@ def save_radio_flux_per_galaxy_1p4GHz(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0,
     outpath = results_dir / f"radio_flux_1p4GHz_{cfg.name}.h5"
 
     lc_path = build_lightcone(cfg, area_deg2, z_min, z_max)
-    with h5py.File(lc_path, "r") as lc:
-        gal_z    = lc["z"][:]
-        snap_arr = lc["snap"][:]
-        gal_idx  = lc["galaxy_index"][:]
+    with open_hdf5(lc_path) as lc:
+        gal_z    = read_column(lc, "z")
+        snap_arr = read_column(lc, "snap")
+        gal_idx  = read_column(lc, "galaxy_index")
 
     if galaxy_mask is not None:
         galaxy_mask = np.asarray(galaxy_mask)
@@ -65,12 +73,12 @@ def save_radio_flux_per_galaxy_1p4GHz(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0,
             if not hdf5.exists():
                 print(f"  WARN: missing {hdf5}, skipping snap {snap}")
                 continue
-            with h5py.File(hdf5, "r") as f:
+            with open_hdf5(hdf5) as f:
                 if "galaxy_data/sfr" not in f:
                     print(f"  WARN: SFR missing in snap {snap}, skipping")
                     continue
-                sfr = f["galaxy_data/sfr"][:]
-                bhmdot = f["galaxy_data/bhmdot"][:] if "galaxy_data/bhmdot" in f else np.zeros_like(sfr)
+                sfr = read_dataset(f, "galaxy_data/sfr")
+                bhmdot = read_dataset(f, "galaxy_data/bhmdot") if "galaxy_data/bhmdot" in f else np.zeros_like(sfr)
             cache[snap] = (sfr, bhmdot)
         sfr, bhmdot = cache[snap]
         for i, (gi, gz) in enumerate(zip(gal_idx[smask], gal_z[smask])):
@@ -115,8 +123,91 @@ def build_lightcone(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0):
     generate_lightcone(cfg, area_deg2, z_min, z_max, lc_path, verbose=True)
     return lc_path
 
+def radio_columns(cfg, snap):
+    """
+    SFR and BH accretion rate of every galaxy of one catalogue, or None
+    if the catalogue is unusable.
+    """
+    hdf5 = cfg.hdf5_path(snap)
+    if not hdf5.exists():
+        print(f"  WARN: missing {hdf5}, skipping snap {snap}")
+        return None
+    with open_hdf5(hdf5) as f:
+        if "galaxy_data/sfr" not in f:
+            print(f"  WARN: SFR missing in snap {snap}, skipping")
+            return None
+        sfr   = read_dataset(f, "galaxy_data/sfr")
+        bhmdot = (read_dataset(f, "galaxy_data/bhmdot")
+                  if "galaxy_data/bhmdot" in f
+                  else np.zeros_like(sfr))
+    return {"sfr": sfr, "bhmdot": bhmdot}
+
+
+def radio_shell(cfg, snap, gal_z, gal_idx, shell, columns, nu_obs_hz):
+    """
+    Fill ``shell`` with the SF ("sf"), AGN ("agn") and per-galaxy summed
+    ("total") radio fluxes of one snapshot's lightcone galaxies, given
+    the snapshot's ``radio_columns``, before division by the solid angle.
+    """
+    sfr, bhmdot = columns["sfr"], columns["bhmdot"]
+    gal_idx = np.asarray(gal_idx, dtype=int)
+    gal_z = np.asarray(gal_z, dtype=float)
+
+    li = np.flatnonzero(gal_idx < len(sfr))
+    gi = gal_idx[li]
+
+    n_rows = min(len(li), BLOCK_ROWS)
+    flux_sf = np.empty((n_rows, len(nu_obs_hz)))
+    flux_agn = np.empty_like(flux_sf)
+    for start in range(0, len(li), BLOCK_ROWS):
+        b = slice(start, start + BLOCK_ROWS)
+        gz, lb = gal_z[li[b]], li[b]
+        sfr_gal, bhmdot_gal = sfr[gi[b]], bhmdot[gi[b]]
+        n = len(gz)
+
+        # Rest-frame frequencies for observed grid
+        nu_rest_ghz = nu_obs_hz * (1.0 + gz[:, None]) / 1e9
+
+        # Luminosity distance  (cm)
+        d_L = cfg.cosmology.luminosity_distance(gz).to(u.cm).value
+        prefactor = ((1.0 + gz) / (4.0 * np.pi * d_L ** 2))[:, None]
+
+        # ── SF contribution ──────────────────────────────
+        with np.errstate(invalid="ignore"):
+            sf_ok = np.isfinite(sfr_gal) & (sfr_gal > 0)
+        fsf = radio_luminosity_sf(sfr_gal[:, None], nu_rest_ghz,
+                                  out=flux_sf[:n])        # W/Hz
+        fsf *= 1e7                                        # erg/s/Hz
+        np.multiply(prefactor, fsf, out=fsf)
+        sf_ok &= np.all(np.isfinite(fsf), axis=1)
+        shell.add_many("sf", fsf[sf_ok], gz[sf_ok], lb[sf_ok])
+
+        # ── AGN contribution ─────────────────────────────
+        with np.errstate(invalid="ignore"):
+            agn_ok = np.isfinite(bhmdot_gal) & (bhmdot_gal > 0)
+            fagn = agn_radio_luminosity(bhmdot_gal[:, None], nu_rest_ghz,
+                                        out=flux_agn[:n])  # erg/s/Hz
+        np.multiply(prefactor, fagn, out=fagn)
+        agn_ok &= np.all(np.isfinite(fagn), axis=1)
+        shell.add_many("agn", fagn[agn_ok], gz[agn_ok], lb[agn_ok])
+
+        # Per-galaxy total keeps the SF×AGN cross term in the
+        # shot-noise second moment
+        fsf[~sf_ok] = 0.0
+        fagn[~agn_ok] = 0.0
+        fsf += fagn
+        any_ok = sf_ok | agn_ok
+        shell.add_many("total", fsf[any_ok], gz[any_ok], lb[any_ok])
+
+    return shell
+
+
+@instrument.timed("radio")
 def lightcone_radio_background(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0,
-                                n_points=500, galaxy_mask=None):
+                                n_points=500, galaxy_mask=None,
+                                accumulator=None, checkpoint=None,
+                                n_workers=1, comm=None,
+                                prefetch=DEFAULT_DEPTH, prefetch_mb=None):
     """
     Compute the radio cosmic background intensity from star formation
     (Condon 1992 / Thomas+2021) **and** AGN accretion.
@@ -133,6 +224,23 @@ def lightcone_radio_background(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0,
     galaxy_mask : array-like, optional
         Boolean mask of same length as lightcone galaxies. If provided,
         only galaxies where mask is True are included. Used for jackknife.
+    accumulator : SpectrumAccumulator, optional
+        If given, filled with per-snapshot-shell, per-redshift-bin and
+        per-region spectra and their shot-noise second moments
+        (components "sf", "agn" and their per-galaxy sum "total") in the
+        same units as ``intensity``.
+    checkpoint : bool or Path, optional
+        Persist each snapshot's partial sums (see ``shells``) in the
+        default or given directory and reuse them on reruns.
+    n_workers : int
+        Compute snapshot shells (chunked above ``shells.CHUNK_SIZE``
+        galaxies) in a pool of this many processes.
+    comm : mpi4py communicator, optional
+        Split the snapshot shells across its ranks (see ``mpi``); every
+        rank returns the full result.
+    prefetch, prefetch_mb : int, float or None
+        Read up to ``prefetch`` catalogues (at most ``prefetch_mb`` MB)
+        ahead of the shell being computed, in a background thread.
 
     Returns
     -------
@@ -143,10 +251,10 @@ def lightcone_radio_background(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0,
     """
     lc_path = build_lightcone(cfg, area_deg2, z_min, z_max)
 
-    with h5py.File(lc_path, "r") as lc:
-        gal_z    = lc["z"][:]
-        snap_arr = lc["snap"][:]
-        gal_idx  = lc["galaxy_index"][:]
+    with open_hdf5(lc_path) as lc:
+        gal_z    = read_column(lc, "z")
+        snap_arr = read_column(lc, "snap")
+        gal_idx  = read_column(lc, "galaxy_index")
 
     # Apply galaxy mask if provided
     if galaxy_mask is not None:
@@ -156,73 +264,288 @@ def lightcone_radio_background(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0,
                            f"lightcone length ({len(gal_z)})")
     else:
         galaxy_mask = np.ones(len(gal_z), dtype=bool)
+    acc = accumulator if accumulator is not None else SpectrumAccumulator()
+    acc.check_lightcone(len(gal_z))
 
     # Observed frequency grid: 10 MHz  →  100 GHz  (radio regime)
     nu_obs_hz = np.logspace(np.log10(1e7), np.log10(1e11), n_points)  # Hz
     omega_sr  = area_deg2 * (np.pi / 180.0) ** 2
 
-    total_flux_sf  = np.zeros_like(nu_obs_hz)   # erg/s/cm²/Hz
-    total_flux_agn = np.zeros_like(nu_obs_hz)
-    cache = {}
+    acc.start(("sf", "agn", "total"), n_points)
+    checkpoints = open_checkpoints(checkpoint, "radio", cfg,
+                                   {"n_points": n_points},
+                                   gal_z, gal_idx, acc)
 
-    unique_snaps = np.unique(snap_arr)
     print(f"Processing {galaxy_mask.sum()} galaxies across "
-          f"{len(unique_snaps)} snapshots (radio) …")
+          f"{len(np.unique(snap_arr))} snapshots (radio) …")
 
-    for snap in unique_snaps:
-        snap  = int(snap)
-        smask = (snap_arr == snap) & galaxy_mask
+    process_shells("radio", cfg, acc, radio_shell, radio_columns, snap_arr,
+                   gal_z, gal_idx, galaxy_mask, args=(nu_obs_hz,),
+                   checkpoints=checkpoints, n_workers=n_workers,
+                   prefetch=prefetch, prefetch_mb=prefetch_mb, comm=comm)
 
-        if snap not in cache:
-            hdf5 = cfg.hdf5_path(snap)
-            if not hdf5.exists():
-                print(f"  WARN: missing {hdf5}, skipping snap {snap}")
-                continue
-            with h5py.File(hdf5, "r") as f:
-                if "galaxy_data/sfr" not in f:
-                    print(f"  WARN: SFR missing in snap {snap}, skipping")
-                    continue
-                sfr   = f["galaxy_data/sfr"][:]
-                bhmdot = (f["galaxy_data/bhmdot"][:]
-                          if "galaxy_data/bhmdot" in f
-                          else np.zeros_like(sfr))
-            cache[snap] = (sfr, bhmdot)
+    # Convert summed flux to surface brightness
+    acc.set_scale(1.0 / omega_sr)
+    intensity_sf  = acc.total("sf")
+    intensity_agn = acc.total("agn")
+    intensity     = intensity_sf + intensity_agn
+    print("Done.")
+    return nu_obs_hz, intensity, intensity_sf, intensity_agn
 
-        sfr, bhmdot = cache[snap]
 
-        for gi, gz in zip(gal_idx[smask], gal_z[smask]):
-            gi = int(gi)
-            if gi >= len(sfr):
-                continue
+# ══════════════════════════════════════════════════════════════════
+# Parameter sweeps
+# ══════════════════════════════════════════════════════════════════
 
-            sfr_gal   = sfr[gi]
-            bhmdot_gal = bhmdot[gi]
+# Radio model parameters a sweep may vary (see ``physics.radio``);
+# f_imf = None looks the fraction up for ``imf`` and ``m_low``.
+RADIO_PARAMS = {
+    "a_nt": CONDON_A_NT, "alpha_nt": CONDON_ALPHA_NT,
+    "a_th": CONDON_A_TH, "alpha_th": CONDON_ALPHA_TH,
+    "f_imf": None, "imf": "chabrier", "m_low": 5.0,
+    "agn_exponent": AGN_EXPONENT, "alpha_agn": AGN_ALPHA,
+}
 
-            # Rest-frame frequencies for observed grid
-            nu_rest_ghz = nu_obs_hz * (1.0 + gz) / 1e9
+_TABLE_COLUMNS = ("sfr", "bhmdot", "z", "d_L", "lc_row")
 
-            # Luminosity distance  (cm)
-            d_L = cfg.cosmology.luminosity_distance(gz).to(u.cm).value
-            prefactor = (1.0 + gz) / (4.0 * np.pi * d_L ** 2)
 
-            # ── SF contribution ──────────────────────────────
-            if np.isfinite(sfr_gal) and sfr_gal > 0:
-                P_nu_sf = radio_luminosity_sf(sfr_gal, nu_rest_ghz)  # W/Hz
-                P_nu_sf_cgs = P_nu_sf * 1e7                          # erg/s/Hz
-                flux_sf = prefactor * P_nu_sf_cgs
-                if np.all(np.isfinite(flux_sf)):
-                    total_flux_sf += flux_sf
+def radio_param_grid(**values):
+    """
+    Every combination of the given parameter values, the others at their
+    defaults, e.g.  ``radio_param_grid(alpha_nt=[-0.9, -0.8, -0.7],
+    agn_exponent=[1.3, 17 / 12])``  gives six parameter sets.
+    """
+    unknown = set(values) - set(RADIO_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown radio parameters {sorted(unknown)}; "
+                         f"choose from {sorted(RADIO_PARAMS)}")
+    names = list(values)
+    return [dict(RADIO_PARAMS, **dict(zip(names, combo)))
+            for combo in itertools.product(*(np.atleast_1d(values[n]).tolist()
+                                             for n in names))]
 
-            # ── AGN contribution ─────────────────────────────
-            if np.isfinite(bhmdot_gal) and bhmdot_gal > 0:
-                P_agn = agn_radio_luminosity(bhmdot_gal, nu_rest_ghz)  # erg/s/Hz
-                flux_agn = prefactor * P_agn
-                if np.all(np.isfinite(flux_agn)):
-                    total_flux_agn += flux_agn
 
-    # Convert summed flux to surface brightness
-    intensity_sf  = total_flux_sf  / omega_sr
-    intensity_agn = total_flux_agn / omega_sr
-    intensity     = intensity_sf + intensity_agn
-    print("Done.")
-    return nu_obs_hz, intensity, intensity_sf, intensity_agn
\ No newline at end of file
+def _table_shell(cfg, snap, gal_z, gal_idx, shell, columns):
+    """Collect (sfr, bhmdot, z, d_L, lightcone row) of a shell's galaxies in ``extras``."""
+    sfr, bhmdot = columns["sfr"], columns["bhmdot"]
+    gal_idx = np.asarray(gal_idx, dtype=int)
+    gal_z = np.asarray(gal_z, dtype=float)
+
+    li = np.flatnonzero(gal_idx < len(sfr))
+    gi = gal_idx[li]
+    gz = gal_z[li]
+    d_L = (cfg.cosmology.luminosity_distance(gz).to(u.cm).value
+           if len(gz) else np.zeros(0))
+    ok = np.isfinite(d_L) & (d_L > 0)
+    for name, arr in zip(_TABLE_COLUMNS, (sfr[gi], bhmdot[gi], gz, d_L, shell.rows[li])):
+        shell.extras[name] = arr[ok]
+    return shell
+
+
+@instrument.timed("radio_table")
+def radio_galaxy_table(cfg, area_deg2=0.5, z_min=0.0, z_max=7.0,
+                       galaxy_mask=None, checkpoint=None, n_workers=1,
+                       comm=None, prefetch=DEFAULT_DEPTH, prefetch_mb=None):
+    """
+    Per-galaxy radio inputs of the lightcone, read once: SFR [M_sun/yr],
+    black-hole accretion rate [M_sun/yr], redshift and luminosity
+    distance [cm], with each galaxy's lightcone row.  Arguments as for
+    ``lightcone_radio_background``.
+
+    Returns
+    -------
+    dict with "sfr", "bhmdot", "z", "d_L", "lc_row" (arrays) and "omega_sr"
+    """
+    lc_path = build_lightcone(cfg, area_deg2, z_min, z_max)
+    with open_hdf5(lc_path) as lc:
+        gal_z = read_column(lc, "z")
+        snap_arr = read_column(lc, "snap")
+        gal_idx = read_column(lc, "galaxy_index")
+
+    if galaxy_mask is None:
+        galaxy_mask = np.ones(len(gal_z), dtype=bool)
+    galaxy_mask = np.asarray(galaxy_mask)
+    if len(galaxy_mask) != len(gal_z):
+        raise ValueError(f"galaxy_mask length ({len(galaxy_mask)}) != "
+                         f"lightcone length ({len(gal_z)})")
+
+    acc = SpectrumAccumulator()
+    acc.start(("total",), 0)
+    checkpoints = open_checkpoints(checkpoint, "radio_table", cfg,
+                                   {"columns": list(_TABLE_COLUMNS)},
+                                   gal_z, gal_idx, acc)
+    process_shells("radio_table", cfg, acc, _table_shell, radio_columns,
+                   snap_arr, gal_z, gal_idx, galaxy_mask,
+                   checkpoints=checkpoints, n_workers=n_workers,
+                   prefetch=prefetch, prefetch_mb=prefetch_mb, comm=comm)
+
+    table = {name: acc.extras(name) for name in _TABLE_COLUMNS}
+    table["omega_sr"] = area_deg2 * (np.pi / 180.0) ** 2
+    return table
+
+
+def radio_sweep(table, param_sets, nu_obs_hz=None):
+    """
+    Radio background spectra for many model parameter sets from one
+    galaxy table.
+
+    Every term of the model is a power law in rest-frame frequency, so
+    with  x = ln(1 + z)  the summed observed flux of a term A nu^alpha is
+
+        A nu_obs^alpha  sum_i c_i exp(alpha x_i)
+
+    with per-galaxy weights c_i fixed by the table (and, for the AGN,
+    exp(exponent * ln Mdot_i) inside the sum).  These galaxy sums are
+    computed once per distinct spectral index / exponent and reused by
+    every parameter set and frequency.
+
+    Parameters
+    ----------
+    table      : dict from :func:`radio_galaxy_table`
+    param_sets : list of dict – e.g. from :func:`radio_param_grid`;
+                 missing keys take the ``RADIO_PARAMS`` defaults
+    nu_obs_hz  : array, optional – defaults to the grid of
+                 ``lightcone_radio_background``
+
+    Returns
+    -------
+    nu_obs_hz : array (n_nu,)
+    spectra   : dict "total", "sf", "agn" -> array (n_sets, n_nu)
+                [erg s^-1 cm^-2 Hz^-1 sr^-1]
+    """
+    if nu_obs_hz is None:
+        nu_obs_hz = np.logspace(np.log10(1e7), np.log10(1e11), 500)
+    nu_ghz = np.asarray(nu_obs_hz, dtype=float) / 1e9
+
+    sfr, bhmdot, z, d_L = (table[k] for k in ("sfr", "bhmdot", "z", "d_L"))
+    with np.errstate(invalid="ignore"):
+        sf = np.isfinite(sfr) & (sfr > 0)
+        agn = np.isfinite(bhmdot) & (bhmdot > 0)
+    prefactor = (1.0 + z) / (4.0 * np.pi * d_L ** 2)
+    x = np.log1p(z)
+
+    c_sf, x_sf = prefactor[sf] * sfr[sf] * 1e7, x[sf]                # erg/s/Hz per W/Hz
+    c_agn, x_agn = prefactor[agn], x[agn]
+    y_agn = np.log(bhmdot[agn] * MSUN_PER_YR_TO_G_PER_S / 4e17)
+
+    sf_sums, agn_sums = {}, {}
+
+    def sf_sum(alpha):
+        if alpha not in sf_sums:
+            sf_sums[alpha] = float(c_sf @ np.exp(alpha * x_sf))
+        return sf_sums[alpha]
+
+    def agn_sum(exponent, alpha):
+        if (exponent, alpha) not in agn_sums:
+            agn_sums[exponent, alpha] = float(
+                c_agn @ np.exp(exponent * y_agn + alpha * x_agn))
+        return agn_sums[exponent, alpha]
+
+    spectra = {c: np.zeros((len(param_sets), len(nu_ghz)))
+               for c in ("total", "sf", "agn")}
+    for j, params in enumerate(param_sets):
+        p = dict(RADIO_PARAMS, **params)
+        f_imf = imf_fraction(p["f_imf"], p["imf"], p["m_low"])
+        spectra["sf"][j] = f_imf * (
+            p["a_nt"] * nu_ghz ** p["alpha_nt"] * sf_sum(p["alpha_nt"])
+            + p["a_th"] * nu_ghz ** p["alpha_th"] * sf_sum(p["alpha_th"]))
+        spectra["agn"][j] = (1e30 / 1.4e9 * (nu_ghz / 1.4) ** p["alpha_agn"]
+                             * agn_sum(p["agn_exponent"], p["alpha_agn"]))
+    spectra["total"] = spectra["sf"] + spectra["agn"]
+    for c in spectra:
+        spectra[c] /= table["omega_sr"]
+    return nu_obs_hz, spectra
+
+
+def radio_galaxy_fluxes(table, nu_obs_hz, component="total", rows=slice(None)):
+    """
+    Observed radio flux density [erg s^-1 cm^-2 Hz^-1] of the galaxies
+    ``rows`` of a :func:`radio_galaxy_table` at frequencies ``nu_obs_hz``,
+    shape (n_rows, n_nu), for component "sf", "agn" or "total" as in
+    ``radio_shell`` (galaxies without a valid SFR / accretion rate give
+    zero).
+    """
+    sfr, bhmdot, z, d_L = (np.asarray(table[k])[rows]
+                           for k in ("sfr", "bhmdot", "z", "d_L"))
+    nu_rest_ghz = np.asarray(nu_obs_hz, dtype=float) * (1.0 + z[:, None]) / 1e9
+    prefactor = ((1.0 + z) / (4.0 * np.pi * d_L ** 2))[:, None]
+
+    flux = np.zeros(nu_rest_ghz.shape)
+    with np.errstate(invalid="ignore"):
+        if component in ("sf", "total"):
+            sf = np.isfinite(sfr) & (sfr > 0)
+            flux[sf] += 1e7 * radio_luminosity_sf(sfr[sf, None], nu_rest_ghz[sf])
+        if component in ("agn", "total"):
+            agn = np.isfinite(bhmdot) & (bhmdot > 0)
+            flux[agn] += agn_radio_luminosity(bhmdot[agn, None], nu_rest_ghz[agn])
+    flux *= prefactor
+    flux[~np.isfinite(flux)] = 0.0
+    return flux
+
+
+def radio_adaptive(table, params=None, rtol=1e-3, n_start=17, max_points=500):
+    """
+    Radio background of one parameter set on an adaptively refined
+    frequency grid (``adaptive.refine_grid``) over the range of
+    ``lightcone_radio_background``, refined until both the SF and the
+    AGN spectrum interpolate to ``rtol``.  Each refinement pass costs a
+    few galaxy sums (:func:`radio_sweep`), whatever its number of
+    frequencies.
+
+    Returns
+    -------
+    nu_obs  : array (n,) [Hz] – non-uniform grid
+    spectra : dict "total", "sf", "agn" -> array (n,)
+    """
+    from src.backgrounds.adaptive import refine_grid
+
+    param_sets = [params or {}]
+
+    def components(nu):
+        _, spectra = radio_sweep(table, param_sets, nu)
+        return np.stack([spectra["sf"][0], spectra["agn"][0]])
+
+    nu_obs_hz, (sf, agn) = refine_grid(components, 1e7, 1e11, n_start=n_start,
+                                       rtol=rtol, max_points=max_points)
+    return nu_obs_hz, {"total": sf + agn, "sf": sf, "agn": agn}
+
+
+def lightcone_radio_adaptive(cfg, params=None, area_deg2=0.5, z_min=0.0,
+                             z_max=7.0, rtol=1e-3, n_start=17, max_points=500,
+                             galaxy_mask=None, **kwargs):
+    """
+    Adaptive-grid mode of ``lightcone_radio_background``: read the
+    lightcone galaxies once (:func:`radio_galaxy_table`, further keyword
+    arguments passed on) and refine the frequency grid where the
+    spectra need it (:func:`radio_adaptive`).
+
+    Returns
+    -------
+    nu_obs  : array (Hz) – non-uniform grid
+    spectra : dict "total", "sf", "agn" -> array
+    """
+    table = radio_galaxy_table(cfg, area_deg2, z_min, z_max,
+                               galaxy_mask=galaxy_mask, **kwargs)
+    with instrument.stage("radio_adaptive"):
+        return radio_adaptive(table, params, rtol=rtol, n_start=n_start,
+                              max_points=max_points)
+
+
+def lightcone_radio_sweep(cfg, param_sets, area_deg2=0.5, z_min=0.0, z_max=7.0,
+                          n_points=500, galaxy_mask=None, **kwargs):
+    """
+    Sweep mode of ``lightcone_radio_background``: read the lightcone
+    galaxies once (:func:`radio_galaxy_table`, further keyword arguments
+    passed on) and evaluate the background for every parameter set
+    (:func:`radio_sweep`).
+
+    Returns
+    -------
+    nu_obs  : array (Hz)
+    spectra : dict "total", "sf", "agn" -> array (n_sets, n_points)
+    """
+    table = radio_galaxy_table(cfg, area_deg2, z_min, z_max,
+                               galaxy_mask=galaxy_mask, **kwargs)
+    nu_obs_hz = np.logspace(np.log10(1e7), np.log10(1e11), n_points)
+    with instrument.stage("radio_sweep"):
+        return radio_sweep(table, param_sets, nu_obs_hz)
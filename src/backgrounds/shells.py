@@ -0,0 +1,369 @@
+"""
+Snapshot-shell driver shared by the background pipelines, with
+optional on-disk checkpoints of every shell's partial sums.
+
+A checkpoint is one ``.npz`` per (band, simulation, snapshot) holding the
+shell's :class:`ShellPartial`.  Its file name carries two hashes:
+
+* a *slot* hash of the physics / grid parameters and of the lightcone
+  rows that fall in the shell (redshifts, catalogue indices, region
+  labels), and
+* a *source* hash of the fingerprint (name, size, mtime) of the
+  snapshot's catalogue file.
+
+A rerun of the same configuration therefore loads every shell finished
+before an interruption and computes only the rest.  When one catalogue
+is reprocessed only its source hash changes, so only that shell is
+recomputed (its stale checkpoint is replaced) and the totals are
+re-summed from the shells.
+
+Shells can also be computed in parallel in a local process pool
+(``n_workers``), with no services beyond the standard library, and/or
+split across MPI ranks (``comm``, see ``backgrounds.mpi``).  Serial runs
+read the next snapshots' catalogues in a background thread while the
+current shell is computed.
+"""
+
+import hashlib
+import json
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+
+from src import instrument
+from src.backgrounds.accumulate import ShellPartial
+from src.prefetch import DEFAULT_DEPTH, SnapshotPrefetcher, nbytes
+from src.shared import SharedArrays, attach
+
+CHECKPOINT_DIR = Path(__file__).resolve().parent.parent.parent / "data" / "checkpoints"
+
+# Bump when a shell function changes what it accumulates.
+CHECKPOINT_VERSION = 1
+
+# Largest number of galaxies handed to one worker task.
+CHUNK_SIZE = 20000
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            h.update(str(part.dtype).encode())
+            h.update(np.ascontiguousarray(part).tobytes())
+        else:
+            h.update(json.dumps(part, sort_keys=True, default=str).encode())
+    return h.hexdigest()[:16]
+
+
+def file_fingerprint(path):
+    """(name, size, mtime_ns) of a file, or None if it does not exist."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    st = path.stat()
+    return [path.name, st.st_size, st.st_mtime_ns]
+
+
+class ShellCheckpoints:
+    """
+    Load / save per-snapshot checkpoints for one pipeline run.
+
+    Parameters
+    ----------
+    band    : str – "optical", "farIR", "radio"
+    cfg     : SimConfig
+    params  : dict – every parameter the shell sums depend on
+    gal_z, gal_idx : arrays – full lightcone columns
+    regions : int array or None – accumulator region labels
+    root    : Path
+    """
+
+    def __init__(self, band, cfg, params, gal_z, gal_idx, regions=None,
+                 root=CHECKPOINT_DIR, groups=None):
+        self.band = band
+        self.cfg = cfg
+        self.params = dict(params, version=CHECKPOINT_VERSION)
+        self.gal_z = gal_z
+        self.gal_idx = gal_idx
+        self.regions = regions
+        self.groups = groups
+        self.root = Path(root)
+        self._params_digest = _digest(self.params)
+
+    def _sources(self, snap):
+        paths = {self.cfg.hdf5_path(snap), self.cfg.caesar_path(snap)}
+        return sorted(filter(None, (file_fingerprint(p) for p in paths)))
+
+    def _prefix(self, snap, rows):
+        row_parts = [self.gal_z[rows], self.gal_idx[rows]]
+        if self.regions is not None:
+            row_parts.append(self.regions[rows])
+        if self.groups is not None:
+            row_parts.append(self.groups[rows])
+        slot = _digest(self._params_digest, *row_parts)
+        return f"{self.band}_{self.cfg.name}_s{snap:03d}_{slot}"
+
+    def path(self, snap, rows):
+        return (self.root /
+                f"{self._prefix(snap, rows)}_{_digest(self._sources(snap))}.npz")
+
+    def load(self, snap, rows):
+        """The checkpointed partial for this shell, or None."""
+        path = self.path(snap, rows)
+        if not path.exists():
+            return None
+        instrument.record_open(path)
+        with np.load(path) as arrays:
+            return ShellPartial.from_arrays(arrays)
+
+    def save(self, partial, rows):
+        """Write a shell's partial, replacing checkpoints of older sources."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.path(partial.snap, rows)
+        for stale in self.root.glob(f"{self._prefix(partial.snap, rows)}_*.npz"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez(tmp, **partial.to_arrays())
+        tmp.replace(path)
+
+
+def open_checkpoints(checkpoint, band, cfg, params, gal_z, gal_idx, accumulator):
+    """
+    Resolve a pipeline's ``checkpoint`` argument: False/None → None,
+    True → the default directory, a path → that directory.
+    """
+    if not checkpoint:
+        return None
+    root = CHECKPOINT_DIR if checkpoint is True else Path(checkpoint)
+    params = dict(params, sim=cfg.name,
+                  cosmology=getattr(cfg.cosmology, "name", str(cfg.cosmology)),
+                  z_edges=(None if accumulator.z_edges is None
+                           else accumulator.z_edges.tolist()),
+                  n_regions=accumulator.n_regions)
+    if accumulator.groups is not None:
+        params["n_groups"] = accumulator.n_groups
+    return ShellCheckpoints(band, cfg, params, gal_z, gal_idx,
+                            accumulator.regions, root, accumulator.groups)
+
+
+def _attached_columns(cfg, snap, handles):
+    """Worker-side ``load_fn`` for columns published by the parent."""
+    return attach(handles)
+
+
+def _run_chunk(shell_fn, load_fn, cfg, snap, cone, chunk, shell, args, load_args,
+               profile=False):
+    """
+    Worker entry point: read and fill one shell chunk, the lightcone
+    rows ``chunk`` of the shared columns ``cone``, and time it.  With
+    ``profile`` the chunk's instrumentation is returned for the parent's
+    report (None otherwise).
+    """
+    if not profile:
+        return _fill_chunk(shell_fn, load_fn, cfg, snap, cone, chunk, shell,
+                           args, load_args) + (None,)
+    with instrument.capture() as report:
+        partial, seconds = _fill_chunk(shell_fn, load_fn, cfg, snap, cone, chunk,
+                                       shell, args, load_args)
+        return partial, seconds, report.to_worker_record()
+
+
+def _fill_chunk(shell_fn, load_fn, cfg, snap, cone, chunk, shell, args, load_args):
+    t0 = time.perf_counter()
+    cone = attach(cone)
+    z, idx = cone["z"][chunk], cone["galaxy_index"][chunk]
+    columns = load_fn(cfg, snap, *load_args)
+    partial = None if columns is None else shell_fn(cfg, snap, z, idx, shell,
+                                                    columns, *args)
+    return partial, time.perf_counter() - t0
+
+
+def process_shells(band, cfg, accumulator, shell_fn, load_fn, snap_arr, gal_z,
+                   gal_idx, galaxy_mask, args=(), load_args=(),
+                   checkpoints=None, skip_snaps=(), n_workers=1,
+                   chunk_size=CHUNK_SIZE, prefetch=DEFAULT_DEPTH,
+                   prefetch_mb=None, comm=None):
+    """
+    Fill ``accumulator`` one snapshot shell at a time.
+
+    ``load_fn(cfg, snap, *load_args)`` reads the catalogue columns a
+    shell needs, or returns None to skip the snapshot.
+    ``shell_fn(cfg, snap, z, idx, shell, columns, *args)`` receives the
+    redshifts and catalogue indices of the shell's (masked) lightcone
+    galaxies, a fresh :class:`ShellPartial` and the loaded columns, and
+    returns the filled partial or None to skip the snapshot.  Galaxy
+    positions passed to ``shell.add`` are indices into ``z`` / ``idx``.
+
+    Serially, the next ``prefetch`` snapshots still to be computed are
+    read in a background thread while the current one is processed,
+    holding at most ``prefetch_mb`` MB of read-ahead columns (see
+    :class:`src.prefetch.SnapshotPrefetcher`); ``prefetch=0`` reads
+    inline.
+
+    With ``n_workers > 1`` shells are computed in a process pool that
+    attaches the lightcone redshifts and catalogue indices, shared once
+    through RAM-backed memory maps (see ``src.shared``).  Shells
+    larger than ``chunk_size`` galaxies are split into chunks; their
+    columns are read once (in a background thread, ``prefetch`` ahead)
+    and shared with the chunks' workers the same way, holding at most
+    about ``prefetch_mb`` MB of
+    shared columns at a time.  Single-chunk shells are read by their
+    own worker.  Chunks are merged in (snapshot, chunk) order, so the
+    result does not depend on the number of workers or on completion
+    order.
+    ``shell_fn``, ``load_fn`` and their arguments must be picklable.
+
+    With an MPI communicator ``comm`` every rank computes its share of
+    the shells (as above, so ``n_workers`` applies per rank) and the
+    shells are then all-gathered, leaving the same accumulator on every
+    rank.
+    """
+    if comm is not None:
+        from src.backgrounds import mpi
+        mine = mpi.owned_snaps(comm, snap_arr, galaxy_mask, skip_snaps)
+        others = {int(s) for s in np.unique(snap_arr)} - mine
+        process_shells(band, cfg, accumulator, shell_fn, load_fn, snap_arr,
+                       gal_z, gal_idx, galaxy_mask, args=args,
+                       load_args=load_args, checkpoints=checkpoints,
+                       skip_snaps=set(skip_snaps) | others,
+                       n_workers=n_workers, chunk_size=chunk_size,
+                       prefetch=prefetch, prefetch_mb=prefetch_mb)
+        mpi.allgather_shells(comm, accumulator, mine)
+        return
+
+    if n_workers is None or n_workers <= 1:
+        shells = []                             # (snap, rows, checkpointed)
+        for snap in np.unique(snap_arr):
+            snap = int(snap)
+            if snap in skip_snaps:
+                continue
+            rows = np.flatnonzero((snap_arr == snap) & galaxy_mask)
+            partial = None if checkpoints is None else checkpoints.load(snap, rows)
+            shells.append((snap, rows, partial))
+
+        reader = SnapshotPrefetcher(
+            lambda snap: load_fn(cfg, snap, *load_args),
+            [snap for snap, _, partial in shells if partial is None],
+            depth=prefetch, max_mb=prefetch_mb)
+        loaded = iter(reader)
+        try:
+            for snap, rows, partial in instrument.timed_snapshots(
+                    band, shells, snap_of=lambda t: t[0]):
+                instrument.count_galaxies(band, len(rows))
+                if partial is None:
+                    _, columns = next(loaded)
+                    if columns is None:
+                        continue
+                    partial = shell_fn(cfg, snap, gal_z[rows], gal_idx[rows],
+                                       accumulator.new_shell(snap, rows),
+                                       columns, *args)
+                    del columns
+                    if partial is None:
+                        continue
+                    partial.record_redshifts(gal_z[rows])
+                    if checkpoints is not None:
+                        checkpoints.save(partial, rows)
+                accumulator.add_shell(partial)
+        finally:
+            reader.close()
+        instrument.record_stage(f"{band}.read", reader.load_seconds)
+        instrument.record_stage(f"{band}.read_wait", reader.wait_seconds)
+        return
+
+    # ── parallel: resume from checkpoints, then farm out the rest ──
+    pending = {}                                # snap -> (rows, n_chunks)
+    tasks = []                                  # (size, snap, chunk, rows)
+    for snap in np.unique(snap_arr):
+        snap = int(snap)
+        if snap in skip_snaps:
+            continue
+        rows = np.flatnonzero((snap_arr == snap) & galaxy_mask)
+        partial = None if checkpoints is None else checkpoints.load(snap, rows)
+        if partial is not None:
+            instrument.count_galaxies(band, len(rows))
+            accumulator.add_shell(partial)
+            continue
+        starts = range(0, max(len(rows), 1), chunk_size)
+        pending[snap] = (rows, len(starts))
+        for k, start in enumerate(starts):
+            chunk = rows[start:start + chunk_size]
+            tasks.append((len(chunk), snap, k, chunk))
+    tasks.sort(key=lambda t: (-t[0], t[1], t[2]))
+
+    # Shells split into several chunks are read once here and their
+    # columns shared with the chunks' workers; the others are read by
+    # their own worker
+    split = [snap for snap in sorted(pending, key=lambda s: -len(pending[s][0]))
+             if pending[snap][1] > 1]
+    chunks_of = {snap: [t for t in tasks if t[1] == snap] for snap in split}
+
+    results = {}
+    remaining = {snap: n_chunks for snap, (_, n_chunks) in pending.items()}
+    futures = {}
+
+    def collect(return_when):
+        done, _ = wait(futures, return_when=return_when)
+        for fut in done:
+            snap, k, n = futures.pop(fut)
+            partial, seconds, record = fut.result()
+            results[snap, k] = partial
+            instrument.record_snapshot(band, snap, seconds, n)
+            instrument.merge(record)
+            remaining[snap] -= 1
+            if remaining[snap] == 0:
+                shared.release(snap)
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool, \
+            SharedArrays() as lightcone, \
+            SharedArrays(max_mb=prefetch_mb) as shared:
+        # Outside the catalogue budget: every task needs these until the end
+        cone = lightcone.publish("lightcone", {
+            "z": np.asarray(gal_z, dtype=float),
+            "galaxy_index": np.asarray(gal_idx, dtype=int)})
+
+        def submit(snap, k, chunk, load, load_args):
+            fut = pool.submit(_run_chunk, shell_fn, load, cfg, snap, cone, chunk,
+                              accumulator.new_shell(snap, chunk), args, load_args,
+                              instrument.enabled())
+            futures[fut] = (snap, k, len(chunk))
+
+        for _, snap, k, chunk in tasks:
+            if snap not in chunks_of:
+                submit(snap, k, chunk, load_fn, load_args)
+
+        reader = SnapshotPrefetcher(lambda snap: load_fn(cfg, snap, *load_args),
+                                    split, depth=prefetch, max_mb=prefetch_mb)
+        try:
+            for snap, columns in reader:
+                if columns is None:
+                    for _, _, k, _ in chunks_of[snap]:
+                        results[snap, k] = None
+                    continue
+                # Stay within the budget: wait for shared shells to finish
+                while not shared.has_room(nbytes(columns)):
+                    collect(FIRST_COMPLETED)
+                handles = shared.publish(snap, columns)
+                del columns
+                for _, _, k, chunk in chunks_of[snap]:
+                    submit(snap, k, chunk, _attached_columns, (handles,))
+        finally:
+            reader.close()
+        instrument.record_stage(f"{band}.read", reader.load_seconds)
+        instrument.record_stage(f"{band}.read_wait", reader.wait_seconds)
+        collect(ALL_COMPLETED)
+
+    for snap in sorted(pending):
+        rows, n_chunks = pending[snap]
+        parts = [results[snap, k] for k in range(n_chunks)]
+        if any(p is None for p in parts):
+            continue
+        partial = parts[0]
+        for p in parts[1:]:
+            partial.merge(p)
+        partial.record_redshifts(gal_z[rows])
+        if checkpoints is not None:
+            checkpoints.save(partial, rows)
+        accumulator.add_shell(partial)
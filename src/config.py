@@ -1,13 +1,39 @@
 from pathlib import Path
 import yaml
 from dataclasses import dataclass
-from astropy.cosmology import Planck15
 
 CONFIG_DIR = Path(__file__).resolve().parent.parent / "config"
 
+
+class LazyCosmology:
+    """
+    An astropy built-in cosmology looked up by name on first use, so
+    that loading a config does not import ``astropy.cosmology`` (slow).
+    Attribute access is forwarded to the real cosmology object.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._cosmology = None
+
+    def resolve(self):
+        if self._cosmology is None:
+            import astropy.cosmology
+            self._cosmology = getattr(astropy.cosmology, self._name)
+        return self._cosmology
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self):
+        return f"LazyCosmology({self._name!r})"
+
+
 # Map string names to astropy cosmology objects
 _COSMOLOGIES = {
-    "Planck15": Planck15,
+    "Planck15": LazyCosmology("Planck15"),
 }
 
 
@@ -0,0 +1,322 @@
+"""
+Opt-in stage timing and I/O instrumentation.
+
+Disabled by default, in which case every hook is a no-op.  Call
+``enable()`` (the scripts do this for ``--profile``) or set
+``SIMBA_PROFILE=1`` to record, for the rest of the process:
+
+* wall time, call count, galaxies/s and peak traced memory per stage,
+* wall time and galaxy count per snapshot within each stage,
+  via ``timed_snapshots`` and ``count_galaxies``,
+* bytes and calls per HDF5 dataset read through ``src.utils.read_dataset``,
+* HDF5 file opens through ``src.utils.open_hdf5``,
+* time spent reading snapshots in the prefetch thread, and waiting
+  for it (``<stage>.read`` / ``<stage>.read_wait``),
+* process peak RSS,
+
+including what worker processes record: a worker task runs under
+``capture()`` and hands its record back to be ``merge``d (see
+``backgrounds.shells``), the workers' memory peaks reported separately.
+
+``write_report(path)`` dumps everything as JSON.
+"""
+
+import functools
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+_REPORT = None
+
+
+class RunReport:
+    """Mutable record of one instrumented run."""
+
+    def __init__(self, name="run", trace_memory=True):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.started = datetime.now().isoformat()
+        self._t0 = time.perf_counter()
+        self.stages = {}          # name -> totals
+        self.snapshots = []       # per-snapshot timings
+        self.reads = {}           # dataset key -> {"bytes", "calls"}
+        self.file_opens = {}      # path -> count
+        self._stack = []          # [stage name, child peak bytes]
+        self._current = {}        # stage -> its open snapshot record
+        self.worker_peaks = {"peak_traced_MB": 0.0, "max_rss_MB": 0.0}
+
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    # ── recording ─────────────────────────────────────────────────
+
+    def _stage_entry(self, name):
+        return self.stages.setdefault(name, {
+            "calls": 0, "seconds": 0.0, "galaxies": 0,
+            "peak_traced_MB": 0.0, "max_rss_MB": 0.0,
+        })
+
+    def add_stage(self, name, seconds, peak_bytes=None):
+        entry = self._stage_entry(name)
+        entry["calls"] += 1
+        entry["seconds"] += seconds
+        if peak_bytes is not None:
+            entry["peak_traced_MB"] = max(entry["peak_traced_MB"], peak_bytes / 1e6)
+        entry["max_rss_MB"] = max(entry["max_rss_MB"], max_rss_mb())
+
+    def add_snapshot(self, stage, snap, seconds):
+        record = {"stage": stage, "snap": int(snap), "seconds": seconds,
+                  "galaxies": 0}
+        self.snapshots.append(record)
+        self._current[stage] = record
+        return record
+
+    def add_galaxies(self, stage, n):
+        self._stage_entry(stage)["galaxies"] += int(n)
+        record = self._current.get(stage)
+        if record is not None:
+            record["galaxies"] += int(n)
+
+    def add_read(self, key, nbytes):
+        entry = self.reads.setdefault(key, {"bytes": 0, "calls": 0})
+        entry["bytes"] += int(nbytes)
+        entry["calls"] += 1
+
+    def add_open(self, path):
+        path = str(path)
+        self.file_opens[path] = self.file_opens.get(path, 0) + 1
+
+    def merge(self, record):
+        """Add a worker's ``to_worker_record`` to this report."""
+        for name, entry in record["stages"].items():
+            mine = self._stage_entry(name)
+            for key in ("calls", "seconds", "galaxies"):
+                mine[key] += entry[key]
+            for key in ("peak_traced_MB", "max_rss_MB"):
+                mine[key] = max(mine[key], entry[key])
+        for key, entry in record["reads"].items():
+            mine = self.reads.setdefault(key, {"bytes": 0, "calls": 0})
+            mine["bytes"] += entry["bytes"]
+            mine["calls"] += entry["calls"]
+        for path, n in record["file_opens"].items():
+            self.file_opens[path] = self.file_opens.get(path, 0) + n
+        for key in self.worker_peaks:
+            if record[key] is not None:
+                self.worker_peaks[key] = max(self.worker_peaks[key], record[key])
+
+    # ── output ────────────────────────────────────────────────────
+
+    def to_worker_record(self):
+        """Stages, I/O and memory peaks, to be merged into the parent's report."""
+        peak_traced = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            peak_traced = tracemalloc.get_traced_memory()[1] / 1e6
+        return {"stages": self.stages, "reads": self.reads,
+                "file_opens": self.file_opens, "peak_traced_MB": peak_traced,
+                "max_rss_MB": max_rss_mb()}
+
+    def to_dict(self):
+        stages = {}
+        for name, entry in self.stages.items():
+            e = dict(entry)
+            e["galaxies_per_s"] = (e["galaxies"] / e["seconds"]
+                                   if e["galaxies"] and e["seconds"] > 0 else None)
+            stages[name] = e
+
+        peak_traced = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            peak_traced = tracemalloc.get_traced_memory()[1] / 1e6
+
+        return {
+            "name": self.name,
+            "started": self.started,
+            "wall_seconds": time.perf_counter() - self._t0,
+            "argv": sys.argv,
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "max_rss_MB": max_rss_mb(),
+            "peak_traced_MB": peak_traced,
+            "worker_max_rss_MB": self.worker_peaks["max_rss_MB"],
+            "worker_peak_traced_MB": self.worker_peaks["peak_traced_MB"],
+            "stages": stages,
+            "snapshots": self.snapshots,
+            "reads": self.reads,
+            "bytes_read": sum(e["bytes"] for e in self.reads.values()),
+            "file_opens": self.file_opens,
+            "n_file_opens": sum(self.file_opens.values()),
+        }
+
+    def write(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+
+def max_rss_mb():
+    """Process peak resident set size in MB (Linux reports KB, macOS bytes)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1e6 if sys.platform == "darwin" else rss / 1024.0
+
+
+# ── module-level switch ───────────────────────────────────────────
+
+def enable(name="run", trace_memory=True):
+    """Start recording; returns the active RunReport."""
+    global _REPORT
+    _REPORT = RunReport(name, trace_memory=trace_memory)
+    return _REPORT
+
+
+def disable():
+    """Stop recording; returns the finished RunReport (or None)."""
+    global _REPORT
+    report, _REPORT = _REPORT, None
+    if report is not None and report.trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return report
+
+
+def enabled():
+    return _REPORT is not None
+
+
+def report():
+    return _REPORT
+
+
+@contextmanager
+def capture(name="worker"):
+    """
+    Record into a fresh report for the duration of the block, e.g. one
+    task in a worker process (whose report, copied from the parent by
+    fork, would otherwise be discarded); yields it.  Memory is traced
+    only if it already is in this process.
+    """
+    global _REPORT
+    saved = _REPORT
+    tracing = tracemalloc.is_tracing()
+    _REPORT = RunReport(name, trace_memory=tracing)
+    if tracing:
+        tracemalloc.reset_peak()
+    try:
+        yield _REPORT
+    finally:
+        _REPORT = saved
+
+
+def merge(record):
+    """Merge a worker's record (``RunReport.to_worker_record``) into the active report."""
+    if _REPORT is not None and record is not None:
+        _REPORT.merge(record)
+
+
+def write_report(path):
+    """Write the active report as JSON; returns the path or None if disabled."""
+    if _REPORT is None:
+        return None
+    out = _REPORT.write(path)
+    print(f"Run report → {out}")
+    return out
+
+
+# ── hooks ─────────────────────────────────────────────────────────
+
+@contextmanager
+def stage(name):
+    """Time a block as pipeline stage ``name``."""
+    if _REPORT is None:
+        yield
+        return
+
+    tracing = _REPORT.trace_memory and tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    frame = [name, 0]
+    _REPORT._stack.append(frame)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        _REPORT._stack.pop()
+        peak = None
+        if tracing:
+            peak = max(tracemalloc.get_traced_memory()[1], frame[1])
+            if _REPORT._stack:
+                _REPORT._stack[-1][1] = max(_REPORT._stack[-1][1], peak)
+        _REPORT.add_stage(name, elapsed, peak)
+
+
+def timed(name):
+    """Decorator form of :func:`stage`."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def timed_snapshots(stage_name, items, snap_of=int):
+    """
+    Iterate over ``items``, recording the wall time of each loop
+    iteration (including iterations ended by ``continue``) against the
+    snapshot number ``snap_of(item)``.
+    """
+    if _REPORT is None:
+        yield from items
+        return
+
+    for item in items:
+        record = _REPORT.add_snapshot(stage_name, snap_of(item), 0.0)
+        t0 = time.perf_counter()
+        try:
+            yield item
+        finally:
+            record["seconds"] = time.perf_counter() - t0
+            _REPORT._current.pop(stage_name, None)
+
+
+def record_stage(name, seconds):
+    """Record time spent in a stage timed elsewhere, e.g. in a reader thread."""
+    if _REPORT is not None:
+        _REPORT.add_stage(name, seconds)
+
+
+def record_snapshot(stage_name, snap, seconds, n_galaxies):
+    """Record a snapshot (or chunk) timed elsewhere, e.g. in a worker process."""
+    if _REPORT is not None:
+        record = _REPORT.add_snapshot(stage_name, snap, seconds)
+        _REPORT._current.pop(stage_name, None)
+        record["galaxies"] = int(n_galaxies)
+        _REPORT._stage_entry(stage_name)["galaxies"] += int(n_galaxies)
+
+
+def count_galaxies(stage_name, n):
+    """Credit ``n`` processed galaxies to a stage and its current snapshot."""
+    if _REPORT is not None:
+        _REPORT.add_galaxies(stage_name, n)
+
+
+def record_read(key, nbytes):
+    if _REPORT is not None:
+        _REPORT.add_read(key, nbytes)
+
+
+def record_open(path):
+    if _REPORT is not None:
+        _REPORT.add_open(path)
+
+
+if os.environ.get("SIMBA_PROFILE", "") not in ("", "0"):
+    enable(name=Path(sys.argv[0]).stem if sys.argv and sys.argv[0] else "run")
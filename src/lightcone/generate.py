@@ -6,12 +6,13 @@ Generate a lightcone from Simba snapshots.
 import numpy as np
 import h5py
 from pathlib import Path
-from astropy.cosmology import z_at_value
 import astropy.units as u
-import caesar
 
 from src.config import SimConfig
-from src.utils import get_redshift
+from src import instrument
+from src.utils import get_redshift, load_caesar, open_hdf5, read_dataset
+from src.prefetch import DEFAULT_DEPTH, SnapshotPrefetcher
+from src.lightcone.layout import write_lightcone
 
 OUTPUT_DIR = Path(__file__).resolve().parent.parent.parent / "data" / "lightcones"
 
@@ -25,10 +26,56 @@ def list_snapshots(cfg):
     return sorted(snapshots, key=lambda x: x[0], reverse=True)
 
 
+def _unit(attrs, key):
+    """Read a unit string attribute (h5py may return bytes)."""
+    val = attrs.get(key)
+    if isinstance(val, bytes):
+        val = val.decode()
+    return val
+
+
+def _read_header(path):
+    """
+    Redshift and box size (comoving Mpc) read straight from the catalogue
+    HDF5, or None if the file does not carry them in kpccm.
+    """
+    try:
+        with open_hdf5(path) as f:
+            sim = f.get("simulation_attributes")
+            if sim is None or "redshift" not in sim.attrs or "boxsize" not in sim.attrs:
+                return None
+            if "units" not in sim or _unit(sim["units"].attrs, "boxsize") != "kpccm":
+                return None
+            return float(sim.attrs["redshift"]), float(sim.attrs["boxsize"]) / 1000.0
+    except OSError:
+        return None
+
+
+def _read_galaxies(path):
+    """
+    Comoving positions (Mpc) and stellar masses read straight from the
+    catalogue HDF5, or None if the datasets are missing or not in kpccm.
+    Avoids building a Caesar object per galaxy.
+    """
+    with open_hdf5(path) as f:
+        if "galaxy_data/pos" not in f or "galaxy_data/dicts/masses.stellar" not in f:
+            return None
+        if _unit(f["galaxy_data/pos"].attrs, "unit") != "kpccm":
+            return None
+        coods = read_dataset(f, "galaxy_data/pos") / 1000.0
+        stellar_mass = read_dataset(f, "galaxy_data/dicts/masses.stellar")
+    return coods, stellar_mass
+
+
 def get_snapshot_info(path):
     """Get redshift and box size (comoving Mpc) from a Caesar catalogue."""
+    header = _read_header(path)
+    if header is not None:
+        z, L = header
+        return z, L, None
+
     try:
-        obj = caesar.load(str(path))
+        obj = load_caesar(path)
     except Exception:
         return None, None, None
 
@@ -38,8 +85,10 @@ def get_snapshot_info(path):
     return z, L, obj
 
 
+@instrument.timed("lightcone")
 def generate_lightcone(cfg, area_deg2, z_min, z_max, output_file=None,
-                       snap_step=2, midsnap=False, verbose=True):
+                       snap_step=2, midsnap=False, seed=None, verbose=True,
+                       prefetch=DEFAULT_DEPTH, prefetch_mb=None):
     """
     Generate a lightcone catalogue for any simulation.
 
@@ -63,8 +112,17 @@ def generate_lightcone(cfg, area_deg2, z_min, z_max, output_file=None,
         the comoving offset on the intermediate (skipped) snapshot.
         If False (default), use odd-numbered snapshots (1, 3, 5, …)
         with the offset at each snapshot's own redshift.
+    seed       : int or None
+        Seed for the random axis choice and box offsets.  None uses the
+        global numpy random state.  Stored as a file attribute so the
+        results store can key runs on it.
     verbose    : bool
+    prefetch, prefetch_mb : int, float or None
+        Read the positions and masses of up to ``prefetch`` snapshots
+        (at most ``prefetch_mb`` MB) ahead in a background thread.
     """
+    from astropy.cosmology import z_at_value
+
     if output_file is None:
         OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
         output_file = OUTPUT_DIR / (
@@ -72,6 +130,7 @@ def generate_lightcone(cfg, area_deg2, z_min, z_max, output_file=None,
         )
 
     snaps = list_snapshots(cfg)
+    rng = np.random if seed is None else np.random.RandomState(seed)
 
     # ------------------------------------------------------------------
     # Load info for ALL snapshots first so that the midsnap z_offset
@@ -79,14 +138,15 @@ def generate_lightcone(cfg, area_deg2, z_min, z_max, output_file=None,
     # ------------------------------------------------------------------
     all_snap_info = {}          # snap_num -> (z, L)
     snap_data = []
-    for snap_num, path in snaps:
-        z, L, _ = get_snapshot_info(path)
-        if z is None:
-            if verbose:
-                print(f"Skipping snap {snap_num} (no halo data)")
-            continue
-        all_snap_info[snap_num] = (z, L)
-        snap_data.append((snap_num, path, z, L))
+    with instrument.stage("lightcone.headers"):
+        for snap_num, path in snaps:
+            z, L, _ = get_snapshot_info(path)
+            if z is None:
+                if verbose:
+                    print(f"Skipping snap {snap_num} (no halo data)")
+                continue
+            all_snap_info[snap_num] = (z, L)
+            snap_data.append((snap_num, path, z, L))
 
     # ------------------------------------------------------------------
     # Select every snap_step'th snapshot to avoid double-counting.
@@ -150,119 +210,142 @@ def generate_lightcone(cfg, area_deg2, z_min, z_max, output_file=None,
 
     A_A = 0.0  # previous snapshot's A for frustum continuity
 
-    for idx, (snap_num, path, z_snap, L) in enumerate(snap_data):
-        if verbose:
-            print(f"\nProcessing snap {snap_num}, z={z_snap:.3f}")
-
-        obj = caesar.load(str(path))
-
-        # Comoving coordinates
-        coods = np.array([g.pos.to('kpccm').value / 1000.0 for g in obj.galaxies])
-        stellar_mass = np.array(
-            [g.masses['stellar'].value for g in obj.galaxies]
-        )
+    reader = SnapshotPrefetcher(_read_galaxies, [s[1] for s in snap_data],
+                                depth=prefetch, max_mb=prefetch_mb)
+    loaded = iter(reader)
+    try:
+        for idx, (snap_num, path, z_snap, L) in instrument.timed_snapshots(
+                "lightcone", enumerate(snap_data), snap_of=lambda t: t[1][0]):
+            if verbose:
+                print(f"\nProcessing snap {snap_num}, z={z_snap:.3f}")
+
+            _, galaxies = next(loaded)
+            if galaxies is not None:
+                coods, stellar_mass = galaxies
+            else:
+                obj = load_caesar(path)
+
+                # Comoving coordinates
+                coods = np.array([g.pos.to('kpccm').value / 1000.0
+                                  for g in obj.galaxies])
+                stellar_mass = np.array(
+                    [g.masses['stellar'].value for g in obj.galaxies]
+                )
+            instrument.count_galaxies("lightcone", len(coods))
+
+            if len(coods) == 0:
+                continue
+
+            # Use next snapshot's redshift for the far edge of the shell
+            if idx + 1 < len(snap_data):
+                z_B = snap_data[idx + 1][2]
+            else:
+                z_B = z_snap
+
+            L_unit = cosmo.kpc_comoving_per_arcmin(z_B).to('Mpc / degree')
+            A = (L_unit * area_deg2 ** 0.5).value
+
+            # ---- comoving offset along the line of sight ----
+            z_offset = cosmo.comoving_distance(z_snap).value
+            if midsnap:
+                # Use the intermediate (skipped) snapshot's redshift as the
+                # shell offset — centres the snapshot in its redshift range,
+                # matching the original lightcone.py behaviour.
+                mid_snap_num = snap_num + 1
+                if mid_snap_num in all_snap_info:
+                    z_mid = all_snap_info[mid_snap_num][0]
+                    z_offset = cosmo.comoving_distance(z_mid).value
 
-        if len(coods) == 0:
-            continue
+            if verbose:
+                print(f"  z_offset: {z_offset:.2f}")
 
-        # Use next snapshot's redshift for the far edge of the shell
-        if idx + 1 < len(snap_data):
-            z_B = snap_data[idx + 1][2]
-        else:
-            z_B = z_snap
+            # Randomly choose axes — matches lightcone.py
+            i_ax = rng.randint(0, 3)
+            j_ax = i_ax
+            while j_ax == i_ax:
+                j_ax = rng.randint(0, 3)
+            k_ax = np.where(
+                (np.arange(0, 3) != i_ax) & (np.arange(0, 3) != j_ax)
+            )[0][0]
 
-        L_unit = cosmo.kpc_comoving_per_arcmin(z_B).to('Mpc / degree')
-        A = (L_unit * area_deg2 ** 0.5).value
+            xmin, ymin = rng.rand(2) * (L - A)
 
-        # ---- comoving offset along the line of sight ----
-        z_offset = cosmo.comoving_distance(z_snap).value
-        if midsnap:
-            # Use the intermediate (skipped) snapshot's redshift as the
-            # shell offset — centres the snapshot in its redshift range,
-            # matching the original lightcone.py behaviour.
-            mid_snap_num = snap_num + 1
-            if mid_snap_num in all_snap_info:
-                z_mid = all_snap_info[mid_snap_num][0]
-                z_offset = cosmo.comoving_distance(z_mid).value
-
-        if verbose:
-            print(f"  z_offset: {z_offset:.2f}")
-
-        # Randomly choose axes — matches lightcone.py
-        i_ax = np.random.randint(0, 3)
-        j_ax = i_ax
-        while j_ax == i_ax:
-            j_ax = np.random.randint(0, 3)
-        k_ax = np.where(
-            (np.arange(0, 3) != i_ax) & (np.arange(0, 3) != j_ax)
-        )[0][0]
-
-        xmin, ymin = np.random.rand(2) * (L - A)
-
-        if verbose:
-            print(f"  xmin: {xmin:.2f}, ymin: {ymin:.2f}, A: {A:.2f}, L: {L:.2f}")
-
-        # Frustum geometry — the key to box-size independence
-        theta = np.arctan((A - A_A) / (2 * L))
-        dx = np.abs(L - coods[:, k_ax]) * np.tan(theta)
-
-        # Frustum selection
-        mask = (
-            (coods[:, i_ax] > (xmin + dx)) &
-            (coods[:, i_ax] < ((xmin + A) - dx)) &
-            (coods[:, j_ax] > (ymin + dx)) &
-            (coods[:, j_ax] < ((ymin + A) - dx))
-        )
+            if verbose:
+                print(f"  xmin: {xmin:.2f}, ymin: {ymin:.2f}, A: {A:.2f}, L: {L:.2f}")
+
+            # Frustum geometry — the key to box-size independence
+            theta = np.arctan((A - A_A) / (2 * L))
+            dx = np.abs(L - coods[:, k_ax]) * np.tan(theta)
+
+            # Frustum selection
+            mask = (
+                (coods[:, i_ax] > (xmin + dx)) &
+                (coods[:, i_ax] < ((xmin + A) - dx)) &
+                (coods[:, j_ax] > (ymin + dx)) &
+                (coods[:, j_ax] < ((ymin + A) - dx))
+            )
 
-        if verbose:
-            print(f"  N(lightcone cut): {mask.sum()}")
-
-        lc_idx_arr = np.where(mask)[0]
-        selected_coods = coods[lc_idx_arr]
-        selected_mass = stellar_mass[lc_idx_arr]
-
-        # RA/DEC with frustum correction — matches lightcone.py exactly
-        _frac_ra = (np.abs(selected_coods[:, i_ax] - xmin - (A / 2))
-                    / ((A / 2) - dx[lc_idx_arr]))
-        ra = _frac_ra * ((A * u.Mpc) / L_unit).decompose().value
-
-        _frac_dec = (np.abs(selected_coods[:, j_ax] - ymin - (A / 2))
-                     / ((A / 2) - dx[lc_idx_arr]))
-        dec = _frac_dec * ((A * u.Mpc) / L_unit).decompose().value
-
-        # Redshift from depth axis — no L/2 centring, matches lightcone.py
-        galaxy_z = np.array([
-            float(z_at_value(cosmo.comoving_distance, c * u.Mpc))
-            for c in (selected_coods[:, k_ax] + z_offset)
-        ])
-
-        # Strict inequality — matches lightcone.py
-        z_mask = (galaxy_z > z_min) & (galaxy_z < z_max)
-
-        all_ra.extend(ra[z_mask])
-        all_dec.extend(dec[z_mask])
-        all_z.extend(galaxy_z[z_mask])
-        all_snap.extend([snap_num] * z_mask.sum())
-        all_idx.extend(lc_idx_arr[z_mask])
-        all_stellar_mass.extend(selected_mass[z_mask])
-
-        # Update A_A for next iteration's frustum
-        A_A = A
-
-    with h5py.File(output_file, 'w') as f:
-        f.create_dataset('RA', data=np.array(all_ra))
-        f.create_dataset('DEC', data=np.array(all_dec))
-        f.create_dataset('z', data=np.array(all_z))
-        f.create_dataset('snap', data=np.array(all_snap))
-        f.create_dataset('galaxy_index', data=np.array(all_idx))
-        f.create_dataset('stellar_mass', data=np.array(all_stellar_mass))
-        f.attrs['area_deg2'] = area_deg2
-        f.attrs['z_min'] = z_min
-        f.attrs['z_max'] = z_max
-        f.attrs['n_galaxies'] = len(all_ra)
-        f.attrs['simulation'] = cfg.name
-        f.attrs['snap_step'] = snap_step
-        f.attrs['midsnap'] = midsnap
+            if verbose:
+                print(f"  N(lightcone cut): {mask.sum()}")
+
+            lc_idx_arr = np.where(mask)[0]
+            selected_coods = coods[lc_idx_arr]
+            selected_mass = stellar_mass[lc_idx_arr]
+
+            # RA/DEC with frustum correction — matches lightcone.py exactly
+            _frac_ra = (np.abs(selected_coods[:, i_ax] - xmin - (A / 2))
+                        / ((A / 2) - dx[lc_idx_arr]))
+            ra = _frac_ra * ((A * u.Mpc) / L_unit).decompose().value
+
+            _frac_dec = (np.abs(selected_coods[:, j_ax] - ymin - (A / 2))
+                         / ((A / 2) - dx[lc_idx_arr]))
+            dec = _frac_dec * ((A * u.Mpc) / L_unit).decompose().value
+
+            # Redshift from depth axis — no L/2 centring, matches lightcone.py
+            galaxy_z = np.array([
+                float(z_at_value(cosmo.comoving_distance, c * u.Mpc))
+                for c in (selected_coods[:, k_ax] + z_offset)
+            ])
+
+            # Strict inequality — matches lightcone.py
+            z_mask = (galaxy_z > z_min) & (galaxy_z < z_max)
+
+            all_ra.extend(ra[z_mask])
+            all_dec.extend(dec[z_mask])
+            all_z.extend(galaxy_z[z_mask])
+            all_snap.extend([snap_num] * z_mask.sum())
+            all_idx.extend(lc_idx_arr[z_mask])
+            all_stellar_mass.extend(selected_mass[z_mask])
+
+            # Update A_A for next iteration's frustum
+            A_A = A
+    finally:
+        reader.close()
+    instrument.record_stage("lightcone.read", reader.load_seconds)
+    instrument.record_stage("lightcone.read_wait", reader.wait_seconds)
+
+    columns = {
+        'RA': np.array(all_ra, dtype=float),
+        'DEC': np.array(all_dec, dtype=float),
+        'z': np.array(all_z, dtype=float),
+        'snap': np.array(all_snap, dtype=int),
+        'galaxy_index': np.array(all_idx, dtype=int),
+        'stellar_mass': np.array(all_stellar_mass, dtype=float),
+    }
+    attrs = {
+        'area_deg2': area_deg2,
+        'angle_unit': 'rad',
+        'z_min': z_min,
+        'z_max': z_max,
+        'n_galaxies': len(all_ra),
+        'simulation': cfg.name,
+        'snap_step': snap_step,
+        'midsnap': midsnap,
+    }
+    if seed is not None:
+        attrs['seed'] = seed
+    with instrument.stage("lightcone.write"):
+        write_lightcone(output_file, columns, attrs)
 
     if verbose:
         print(f"\n=== Lightcone saved to {output_file} ===")
@@ -0,0 +1,105 @@
+"""
+Join catalogue properties onto lightcone galaxies.
+
+Every lightcone row points at one galaxy (``galaxy_index``) of one
+snapshot catalogue (``snap``).  :func:`join_catalogue_columns` opens each
+snapshot's catalogue once, reads every requested column, gathers the
+lightcone's galaxies with one fancy index and scatters them into
+lightcone order, so joining several properties onto a cone of millions
+of galaxies costs one read per catalogue and column.  Catalogue reads
+run ahead in a background thread (see ``src.prefetch``).
+"""
+
+import numpy as np
+
+from src.utils import open_hdf5, read_dataset
+from src.prefetch import DEFAULT_DEPTH, SnapshotPrefetcher
+from src.lightcone.layout import read_lightcone
+
+# Catalogue groups searched, in order, for short column names such as
+# "L_FIR" or "appmag.v"
+CATALOGUE_GROUPS = ("galaxy_data", "galaxy_data/dicts")
+
+
+def resolve_column(f, name):
+    """Full dataset path of column ``name`` in an open catalogue, or None."""
+    if name in f and hasattr(f[name], "shape"):
+        return name
+    for group in CATALOGUE_GROUPS:
+        key = f"{group}/{name}"
+        if key in f:
+            return key
+    return None
+
+
+def _snapshot_rows(cfg, snap, gal_idx, columns):
+    """
+    Columns of one catalogue at catalogue indices ``gal_idx``:
+    {name: float array (NaN where the column or galaxy is missing)}.
+    """
+    out = {name: np.full(len(gal_idx), np.nan) for name in columns}
+    hdf5 = cfg.hdf5_path(snap)
+    if not hdf5.exists():
+        print(f"  WARN: missing {hdf5}, skipping snap {snap}")
+        return out
+    ok = (gal_idx >= 0)
+    with open_hdf5(hdf5) as f:
+        for name in columns:
+            key = resolve_column(f, name)
+            if key is None:
+                continue
+            values = read_dataset(f, key)
+            have = ok & (gal_idx < len(values))
+            out[name][have] = values[gal_idx[have]]
+    return out
+
+
+def join_catalogue_columns(cfg, snap_arr, gal_idx, columns,
+                           prefetch=DEFAULT_DEPTH):
+    """
+    Catalogue columns for every lightcone galaxy.
+
+    Parameters
+    ----------
+    cfg      : SimConfig
+    snap_arr, gal_idx : int arrays – the lightcone's "snap" and
+               "galaxy_index"
+    columns  : sequence of str – full dataset paths
+               ("galaxy_data/L_FIR") or names within ``CATALOGUE_GROUPS``
+               ("L_FIR", "appmag.v", "masses.stellar")
+    prefetch : int – catalogues read ahead in a background thread
+
+    Returns
+    -------
+    dict name -> float array of len(snap_arr), NaN where the catalogue,
+    column or galaxy is missing
+    """
+    snap_arr = np.asarray(snap_arr, dtype=int)
+    gal_idx = np.asarray(gal_idx, dtype=int)
+    columns = list(columns)
+    out = {name: np.full(len(snap_arr), np.nan) for name in columns}
+    if len(snap_arr) == 0:
+        return out
+
+    # Lightcone rows grouped by snapshot: one stable sort, then slices
+    order = np.argsort(snap_arr, kind="stable")
+    snaps, starts = np.unique(snap_arr[order], return_index=True)
+    bounds = dict(zip(snaps.tolist(), zip(starts, np.append(starts[1:], len(order)))))
+
+    def load(snap):
+        lo, hi = bounds[snap]
+        return _snapshot_rows(cfg, snap, gal_idx[order[lo:hi]], columns)
+
+    for snap, values in SnapshotPrefetcher(load, bounds, depth=prefetch):
+        lo, hi = bounds[snap]
+        rows = order[lo:hi]
+        for name in columns:
+            out[name][rows] = values[name]
+    return out
+
+
+def join_lightcone(cfg, lc_path, columns, prefetch=DEFAULT_DEPTH):
+    """:func:`join_catalogue_columns` for the galaxies of a lightcone file."""
+    lc = read_lightcone(lc_path, ("snap", "galaxy_index"))
+    return join_catalogue_columns(cfg, lc["snap"], lc["galaxy_index"], columns,
+                                  prefetch=prefetch)
@@ -0,0 +1,140 @@
+"""
+On-disk layout of lightcone files.
+
+Layout 1 (files without a ``layout_version`` attribute) stores every
+column as contiguous float64 / int64.  Layout 2 narrows the columns to
+the precision they carry (float32 angles and stellar masses, int16
+snapshot numbers, int32 catalogue indices; redshifts stay float64) and
+stores them in chunks of ``CHUNK_ROWS`` rows compressed with
+byte-shuffle + gzip level 1, which is fast to decode and readable by
+any HDF5 install.  A cone takes roughly a third of its layout-1 size
+on disk.
+
+Readers go through :func:`read_column` / :func:`read_lightcone`, which
+accept either layout and return the in-memory dtypes of layout 1, so
+code downstream of the file sees the same arrays whichever layout a
+cached cone was written with.
+
+RA and DEC are stored in the unit named by the ``angle_unit``
+attribute: radians, as ``generate_lightcone`` computes them (comoving
+size over distance), also for files written before the attribute.
+:func:`read_radec_deg` returns them in degrees, the unit of the sky
+maps and plots.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import h5py
+
+from src.utils import open_hdf5, read_dataset
+
+LAYOUT_VERSION = 2
+
+# Column -> on-disk dtype (layout 2)
+COLUMN_DTYPES = {
+    "RA": np.float32,
+    "DEC": np.float32,
+    "z": np.float64,
+    "snap": np.int16,
+    "galaxy_index": np.int32,
+    "stellar_mass": np.float32,
+}
+
+# Unit of the RA / DEC columns of files without an ``angle_unit`` attribute
+ANGLE_UNIT = "rad"
+
+# Rows per chunk: 1 MiB of float32, large enough for sequential scans to
+# stream at disk speed, small enough to decompress per read cheaply
+CHUNK_ROWS = 1 << 18
+COMPRESSION = {"compression": "gzip", "compression_opts": 1, "shuffle": True}
+
+
+def layout_version(f):
+    """Layout version of an open lightcone file."""
+    return int(f.attrs.get("layout_version", 1))
+
+
+def _memory_dtype(dtype):
+    """float64 / int64 for the column's kind, as layout 1 stored it."""
+    return np.int64 if np.issubdtype(dtype, np.integer) else np.float64
+
+
+def read_column(lc, name):
+    """Column ``name`` of an open lightcone file of either layout."""
+    data = read_dataset(lc, name)
+    return data.astype(_memory_dtype(data.dtype), copy=False)
+
+
+def read_lightcone(lc_path, columns=("z", "snap", "galaxy_index")):
+    """The given columns of a lightcone file, {name: array}."""
+    with open_hdf5(lc_path) as lc:
+        return {name: read_column(lc, name) for name in columns}
+
+
+def read_radec_deg(lc_path):
+    """RA and DEC [deg] of every galaxy of a lightcone file."""
+    with open_hdf5(lc_path) as lc:
+        unit = lc.attrs.get("angle_unit", ANGLE_UNIT)
+        ra, dec = read_column(lc, "RA"), read_column(lc, "DEC")
+    if isinstance(unit, bytes):
+        unit = unit.decode()
+    if unit == "rad":
+        return np.rad2deg(ra), np.rad2deg(dec)
+    if unit == "deg":
+        return ra, dec
+    raise ValueError(f"Unknown angle_unit {unit!r} in {lc_path}")
+
+
+def _narrow(name, values):
+    """``values`` in the layout-2 dtype of column ``name``, range-checked."""
+    values = np.asarray(values)
+    dtype = np.dtype(COLUMN_DTYPES.get(name, values.dtype))
+    if np.issubdtype(dtype, np.integer) and len(values):
+        info = np.iinfo(dtype)
+        if values.min() < info.min or values.max() > info.max:
+            raise ValueError(f"Lightcone column {name!r} does not fit in {dtype}")
+    return values.astype(dtype)
+
+
+def write_lightcone(path, columns, attrs):
+    """
+    Write a lightcone in the current layout.
+
+    Parameters
+    ----------
+    path    : Path
+    columns : dict name -> array (n_galaxies,)
+    attrs   : dict of file attributes (area_deg2, z_min, ...);
+              ``layout_version`` is added
+    """
+    path = Path(path)
+    tmp = path.with_suffix(".tmp.h5")
+    with h5py.File(tmp, "w") as f:
+        for name, values in columns.items():
+            values = _narrow(name, values)
+            if len(values):
+                f.create_dataset(name, data=values,
+                                 chunks=(min(CHUNK_ROWS, len(values)),),
+                                 **COMPRESSION)
+            else:
+                f.create_dataset(name, data=values)
+        for key, value in attrs.items():
+            f.attrs[key] = value
+        f.attrs["layout_version"] = LAYOUT_VERSION
+    tmp.replace(path)
+    return path
+
+
+def compact_lightcone(path):
+    """
+    Rewrite a lightcone file in the current layout in place (no-op if it
+    already is).  Returns True if the file was rewritten.
+    """
+    with open_hdf5(path) as lc:
+        if layout_version(lc) >= LAYOUT_VERSION:
+            return False
+        columns = {name: read_dataset(lc, name) for name in lc.keys()}
+        attrs = dict(lc.attrs)
+    write_lightcone(path, columns, attrs)
+    return True
@@ -0,0 +1,196 @@
+"""
+Synthetic CAESAR-like snapshot catalogues for exercising the pipelines
+without the Simba data.
+
+The files reproduce the parts of the CAESAR HDF5 layout the pipelines
+read: ``simulation_attributes`` (redshift, boxsize in kpccm), a top-level
+``redshift`` attribute, and ``galaxy_data`` with ``pos``, ``sfr``,
+``sfr_100``, ``bhmdot``, ``L_FIR`` and the ``dicts/`` masses,
+metallicities and apparent/absolute magnitudes.  Galaxy properties follow
+simple scaling relations (Schechter stellar mass function, star-forming
+main sequence, Kennicutt L_FIR) so that spectra have realistic shapes.
+"""
+
+import numpy as np
+import h5py
+from pathlib import Path
+from astropy.cosmology import Planck15, z_at_value
+import astropy.units as u
+
+from src.config import SimConfig
+
+# Filters written as appmag./absmag./appmag_nodust. dicts (FSPS names)
+# with approximate solar absolute magnitudes and relative attenuation.
+MOCK_FILTERS = {
+    "u":        (6.39, 1.55),
+    "b":        (5.44, 1.30),
+    "v":        (4.81, 1.00),
+    "sdss_r":   (4.65, 0.85),
+    "sdss_i":   (4.53, 0.65),
+    "2mass_j":  (3.67, 0.28),
+    "2mass_h":  (3.32, 0.18),
+    "2mass_ks": (3.27, 0.12),
+}
+
+
+def _sample_stellar_mass(rng, n, log_mstar=10.7, alpha=-1.3,
+                         log_mmin=8.0, log_mmax=12.5):
+    """Draw stellar masses (M_sun) from a truncated Schechter function."""
+    log_m = np.linspace(log_mmin, log_mmax, 2048)
+    x = 10 ** (log_m - log_mstar)
+    pdf = x ** (alpha + 1) * np.exp(-x)          # dn/dlogM
+    cdf = np.cumsum(pdf)
+    cdf = (cdf - cdf[0]) / (cdf[-1] - cdf[0])
+    return 10 ** np.interp(rng.random(n), cdf, log_m)
+
+
+def mock_galaxy_columns(n_gal, redshift, box_kpc, seed=None,
+                        cosmology=Planck15):
+    """
+    Generate the per-galaxy columns of one mock snapshot.
+
+    Returns
+    -------
+    dict : dataset path (relative to ``galaxy_data``) -> array
+    """
+    rng = np.random.default_rng(seed)
+    cols = {}
+
+    mstar = _sample_stellar_mass(rng, n_gal)
+    log_m = np.log10(mstar)
+
+    # Star-forming main sequence with a mass-dependent quenched fraction
+    log_sfr_ms = 0.8 * (log_m - 10.0) + 0.3 + 2.0 * np.log10(1.0 + redshift)
+    p_quenched = 1.0 / (1.0 + np.exp(-(log_m - 10.6) / 0.25))
+    quenched = rng.random(n_gal) < p_quenched
+    log_sfr = log_sfr_ms + rng.normal(0.0, 0.3, n_gal)
+    log_sfr[quenched] -= rng.normal(2.0, 0.5, quenched.sum())
+    sfr = 10 ** log_sfr
+    sfr[quenched & (rng.random(n_gal) < 0.3)] = 0.0
+
+    gas = mstar * 10 ** (-0.5 * (log_m - 10.0) + 0.3 * np.log10(1.0 + redshift)
+                         + rng.normal(0.0, 0.2, n_gal))
+    metallicity = 0.0134 * 10 ** (0.3 * (log_m - 10.0) - 0.2 * np.log10(1.0 + redshift)
+                                  + rng.normal(0.0, 0.1, n_gal))
+    dust = 0.4 * metallicity * gas * 10 ** rng.normal(0.0, 0.3, n_gal)
+    dust[rng.random(n_gal) < 0.05] = 0.0          # dust-free → invalid T_eqv
+
+    cols["pos"] = rng.random((n_gal, 3)) * box_kpc
+    cols["sfr"] = sfr
+    cols["sfr_100"] = sfr * 10 ** rng.normal(0.0, 0.1, n_gal)
+    cols["L_FIR"] = sfr / 1.7e-10 * 10 ** rng.normal(0.0, 0.2, n_gal)   # L_sun
+    bhmdot = 1e-3 * (mstar / 1e10) ** 1.2 * 10 ** rng.normal(0.0, 0.7, n_gal)
+    bhmdot[rng.random(n_gal) < 0.2] = 0.0
+    cols["bhmdot"] = bhmdot                                   # M_sun / yr
+
+    cols["dicts/masses.stellar"] = mstar
+    cols["dicts/masses.gas"] = gas
+    cols["dicts/masses.dust"] = dust
+    cols["dicts/metallicities.mass_weighted"] = metallicity
+
+    # Magnitudes: M/L ~ 1 (redder when quenched), crude K-correction
+    if redshift > 0:
+        d_L_pc = cosmology.luminosity_distance(redshift).to(u.pc).value
+        dist_mod = 5.0 * np.log10(d_L_pc / 10.0) - 2.5 * np.log10(1.0 + redshift)
+    else:
+        dist_mod = 5.0 * np.log10(1e6 / 10.0)      # place z=0 galaxies at 1 Mpc
+    a_v = np.where(quenched, 0.1, 0.3 + 0.5 * (log_m - 9.0).clip(0.0))
+    undetected = rng.random(n_gal) < 0.01
+    for filt, (m_sun, a_rel) in MOCK_FILTERS.items():
+        colour = np.where(quenched, 0.3, -0.2) * (a_rel - 1.0)
+        absmag_nd = m_sun - 2.5 * np.log10(mstar) + colour + rng.normal(0.0, 0.1, n_gal)
+        absmag = absmag_nd + a_v * a_rel
+        appmag = absmag + dist_mod
+        appmag[undetected] = np.nan
+        cols[f"dicts/absmag.{filt}"] = absmag
+        cols[f"dicts/absmag_nodust.{filt}"] = absmag_nd
+        cols[f"dicts/appmag.{filt}"] = appmag
+        cols[f"dicts/appmag_nodust.{filt}"] = absmag_nd + dist_mod
+
+    return cols
+
+
+def write_mock_snapshot(path, n_gal, redshift, box_kpc, seed=None,
+                        cosmology=Planck15):
+    """Write one CAESAR-like mock catalogue to ``path``."""
+    cols = mock_galaxy_columns(n_gal, redshift, box_kpc, seed, cosmology)
+    with h5py.File(path, "w") as f:
+        f.attrs["redshift"] = redshift
+        sim = f.create_group("simulation_attributes")
+        sim.attrs["redshift"] = redshift
+        sim.attrs["boxsize"] = box_kpc
+        sim.attrs["hubble_constant"] = cosmology.h
+        sim.create_group("units").attrs["boxsize"] = "kpccm"
+
+        gal = f.create_group("galaxy_data")
+        for key, data in cols.items():
+            gal.create_dataset(key, data=data)
+        gal["pos"].attrs["unit"] = "kpccm"
+        f.attrs["n_galaxies"] = n_gal
+    return Path(path)
+
+
+def mock_snapshot_redshifts(box_size_mpc_h, z_max, snap_step=2,
+                            cosmology=Planck15):
+    """
+    Redshifts for a mock run whose every ``snap_step``-th snapshot gives
+    back-to-back shells one box length deep, as for Simba m100n1024.
+
+    Returns
+    -------
+    array : redshift per snapshot, index = snapshot number (z decreasing)
+    """
+    L = box_size_mpc_h / cosmology.h                      # comoving Mpc
+    d_max = cosmology.comoving_distance(z_max).value + L
+    d = np.arange(0.0, d_max + L / snap_step, L / snap_step)
+    z = np.zeros(len(d))
+    for i, di in enumerate(d[1:], start=1):
+        z[i] = float(z_at_value(cosmology.comoving_distance, di * u.Mpc))
+    return z[::-1]
+
+
+def make_mock_simulation(out_dir, n_gal, box_size_mpc_h=100.0, z_max=3.0,
+                         snap_step=2, name=None, seed=0, cosmology=Planck15,
+                         overwrite=False, verbose=True):
+    """
+    Write a full set of mock snapshots and return a matching SimConfig.
+
+    Parameters
+    ----------
+    out_dir        : Path – catalogue directory (created)
+    n_gal          : int  – galaxies per snapshot (10³ … 10⁷)
+    box_size_mpc_h : float
+    z_max          : float – deepest redshift the lightcone will need
+    snap_step      : int
+    name           : str or None (default ``mock<n_gal>``); no underscores,
+                     since snapshot numbers are parsed after the first one
+    seed           : int – base seed; snapshot s uses seed + s
+    overwrite      : bool – rewrite files that already exist
+    """
+    name = name or f"mock{n_gal}"
+    if "_" in name:
+        raise ValueError(f"Mock simulation name must not contain '_': {name!r}")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    redshifts = mock_snapshot_redshifts(box_size_mpc_h, z_max, snap_step, cosmology)
+    box_kpc = box_size_mpc_h / cosmology.h * 1000.0
+
+    for snap, z in enumerate(redshifts):
+        path = out_dir / f"{name}_{snap:03d}.hdf5"
+        if path.exists() and not overwrite:
+            continue
+        write_mock_snapshot(path, n_gal, float(z), box_kpc,
+                            seed=seed + snap, cosmology=cosmology)
+        if verbose:
+            print(f"  wrote {path.name}  z={z:.3f}  N={n_gal}")
+
+    return SimConfig(
+        name=name,
+        box_size_mpc_h=box_size_mpc_h,
+        n_particles=0,
+        catalogue_dir=out_dir,
+        hdf5_dir=out_dir,
+        snapshot_prefix=name,
+        n_snapshots=len(redshifts),
+        cosmology=cosmology,
+    )
@@ -1,5 +1,45 @@
 import numpy as np
-import h5py
+
+from src.utils import open_hdf5, read_dataset
+
+# Liang+19 T_eqv relation:  log T = a + b log(δ_DZR / 0.4) + c log(1 + z) + log 25
+LIANG_B = -0.15
+LIANG_C = 0.36
+LOG10_25 = np.log10(25)
+
+
+def dust_temperature(delta_dzr, redshift, a=0.1256, out=None):
+    """
+    Liang+19 equivalent dust temperature from the dust-to-metal ratio.
+
+    Parameters
+    ----------
+    delta_dzr : array – dust-to-metal ratio M_dust / (Z M_gas)
+    redshift  : float or array – broadcasts against ``delta_dzr``
+    a         : float or array – leading normalisation parameter
+    out       : array, optional – buffer for the temperatures
+
+    Returns
+    -------
+    T_eqv : np.ndarray – temperature in K (NaN where invalid)
+    valid : np.ndarray – boolean mask, δ_DZR finite and positive
+    """
+    delta_dzr = np.asarray(delta_dzr, dtype=float)
+    valid = (delta_dzr > 0) & np.isfinite(delta_dzr)
+    if out is None:
+        out = np.empty(np.broadcast_shapes(delta_dzr.shape, np.shape(redshift),
+                                           np.shape(a)))
+
+    out.fill(np.nan)
+    np.divide(delta_dzr, 0.4, out=out, where=valid)
+    np.log10(out, out=out, where=valid)
+    out *= LIANG_B
+    np.add(a, out, out=out)
+    out += LIANG_C * np.log10(1 + np.asarray(redshift, dtype=float))
+    out += LOG10_25
+    np.power(10.0, out, out=out)
+    return out, valid
+
 
 def equivalent_dust_temperature(hdf5_path, redshift, a=0.1256): #a=0.1256 is best
     """
@@ -18,21 +58,10 @@ def equivalent_dust_temperature(hdf5_path, redshift, a=0.1256): #a=0.1256 is bes
     T_eqv : np.ndarray  – temperature in K (NaN where invalid)
     mask  : np.ndarray   – boolean mask of valid galaxies
     """
-    with h5py.File(hdf5_path, "r") as f:
-        dust_mass = f["galaxy_data/dicts/masses.dust"][:]
-        gas_mass = f["galaxy_data/dicts/masses.gas"][:]
-        metallicity = f["galaxy_data/dicts/metallicities.mass_weighted"][:]
+    with open_hdf5(hdf5_path) as f:
+        dust_mass = read_dataset(f, "galaxy_data/dicts/masses.dust")
+        gas_mass = read_dataset(f, "galaxy_data/dicts/masses.gas")
+        metallicity = read_dataset(f, "galaxy_data/dicts/metallicities.mass_weighted")
 
     delta_dzr = dust_mass / (metallicity * gas_mass)
-    mask = (delta_dzr > 0) & np.isfinite(delta_dzr)
-
-    T_eqv = np.full(len(dust_mass), np.nan)
-
-    b, c = -0.15, 0.36
-    log_T = (a + b * np.log10(delta_dzr[mask] / 0.4)
-             + c * np.log10(1 + redshift)
-             + np.log10(25))
-
-    T_eqv[mask] = 10**log_T
-
-    return T_eqv, mask
\ No newline at end of file
+    return dust_temperature(delta_dzr, redshift, a)
\ No newline at end of file
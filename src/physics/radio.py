@@ -1,41 +1,78 @@
+import functools
 import numpy as np
-from scipy import integrate
+
+from src.physics.imf import chabrier, mass_fraction
+
 
 def chabrier_imf(m):
-    """Chabrier (2003) system IMF  ξ(m) = dn/dm."""
-    if m < 1.0:
-        return (0.158 / m) * np.exp(
-            -(np.log10(m) - np.log10(0.079)) ** 2 / (2 * 0.69 ** 2)
-        )
-    # Power-law for m >= 1, normalised for continuity at m = 1
-    A = 0.158 * np.exp(
-        -(np.log10(1.0) - np.log10(0.079)) ** 2 / (2 * 0.69 ** 2)
-    )
-    return A * m ** (-2.3)
+    """Chabrier (2003) system IMF  ξ(m) = dn/dm (vectorised, see ``imf``)."""
+    return chabrier(m)
 
 
 def chabrier_mass_fraction(m_low=5.0, m_min=0.1, m_max=100.0):
     """
     Fraction of total SFR going into stars with M >= m_low
     for a Chabrier (2003) IMF integrated from m_min to m_max.
+    Interpolated from the cached table in ``imf``; limits may be arrays.
 
     Returns
     -------
-    f : float   (≈ 0.17 for m_low = 5 M_sun)
+    f : float or array   (≈ 0.29 for m_low = 5 M_sun)
     """
-    mass_weighted = lambda m: m * chabrier_imf(m)
-    total, _ = integrate.quad(mass_weighted, m_min, m_max)
-    above, _ = integrate.quad(mass_weighted, m_low, m_max)
-    return above / total
+    return mass_fraction(m_low, m_min, m_max, imf="chabrier")
+
+
+@functools.lru_cache(maxsize=None)
+def _chabrier_frac_m5():
+    return chabrier_mass_fraction(m_low=5.0)
+
+
+def __getattr__(name):
+    # CHABRIER_FRAC_M5 is looked up on first access rather than at
+    # import time.
+    if name == "CHABRIER_FRAC_M5":
+        return _chabrier_frac_m5()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+MSUN_PER_YR_TO_G_PER_S = 6.304e25
+
+# Condon (1992) non-thermal and thermal terms, W Hz^-1 per (M_sun / yr)
+# in stars above m_low, at nu in GHz:  A nu^alpha
+CONDON_A_NT, CONDON_ALPHA_NT = 5.3e21, -0.8
+CONDON_A_TH, CONDON_ALPHA_TH = 5.5e20, -0.1
 
+# AGN jet power  P_Rad / 1e30 erg s^-1 = (Mdot_BH / 4e17 g s^-1)^AGN_EXPONENT
+# and the spectral index of its power-law SED
+AGN_EXPONENT = 17.0 / 12.0
+AGN_ALPHA = -0.7
 
-# Pre-compute once at import time
-CHABRIER_FRAC_M5 = chabrier_mass_fraction(m_low=5.0)
+
+def _buffer(out, *args):
+    """``out``, or a new array of the broadcast shape of ``args``."""
+    if out is not None:
+        return out
+    return np.empty(np.broadcast_shapes(*(np.shape(a) for a in args)))
+
+
+def imf_fraction(f_imf=None, imf="chabrier", m_low=5.0):
+    """
+    ``f_imf`` if given, otherwise the mass fraction of ``imf`` in stars
+    above ``m_low`` (the cached Chabrier value for m_low = 5 M_sun).
+    """
+    if f_imf is not None:
+        return f_imf
+    if imf == "chabrier" and np.isscalar(m_low) and m_low == 5.0:
+        return _chabrier_frac_m5()
+    return mass_fraction(m_low, imf=imf)
 
 
 # ── Condon1992 radio luminosity ───────────────────────────────
 
-def radio_luminosity_sf(sfr_total, nu_ghz=1.4, f_imf=None):
+def radio_luminosity_sf(sfr_total, nu_ghz=1.4, f_imf=None, imf="chabrier",
+                        m_low=5.0, out=None, a_nt=CONDON_A_NT,
+                        alpha_nt=CONDON_ALPHA_NT, a_th=CONDON_A_TH,
+                        alpha_th=CONDON_ALPHA_TH):
     """
     Star-formation radio luminosity (Condon1992, eqs 10+11 from Thomas2021).
 
@@ -47,23 +84,32 @@ def radio_luminosity_sf(sfr_total, nu_ghz=1.4, f_imf=None):
         Frequency in GHz (default 1.4 GHz).
     f_imf : float or None
         Mass fraction of SFR in stars M >= 5 M_sun.
-        If None, uses the Chabrier (2003) value (≈ 0.17).
+        If None, looked up for ``imf`` and ``m_low``.
+    imf : str
+        "chabrier" (default), "salpeter" or "kroupa" (see ``imf``).
+    m_low : float or array
+        Lower mass limit of the supernova progenitors [M_sun].
+    out : array, optional
+        Buffer for the result; SFRs of shape (N_gal, 1) and frequencies
+        of shape (N_nu,) broadcast to (N_gal, N_nu).
+    a_nt, alpha_nt, a_th, alpha_th : float
+        Normalisations and spectral indices of the non-thermal and
+        thermal terms (default Condon 1992).
 
     Returns
     -------
     P_nu : float or array
         Radio luminosity in W Hz^-1.
     """
-    if f_imf is None:
-        f_imf = CHABRIER_FRAC_M5
-
-    sfr_m5 = np.asarray(sfr_total) * f_imf
+    f_imf = imf_fraction(f_imf, imf, m_low)
     nu = np.asarray(nu_ghz, dtype=float)
 
-    P_nonthermal = 5.3e21 * nu ** (-0.8) * sfr_m5     # W Hz^-1
-    P_thermal    = 5.5e20 * nu ** (-0.1) * sfr_m5      # W Hz^-1
+    # Non-thermal + thermal spectral shape, W Hz^-1 per (M_sun / yr)
+    shape = a_nt * nu ** alpha_nt + a_th * nu ** alpha_th
 
-    return P_nonthermal + P_thermal
+    P_nu = np.multiply(sfr_total, f_imf, out=_buffer(out, sfr_total, f_imf, shape))
+    P_nu *= shape
+    return P_nu if P_nu.ndim else P_nu[()]
 
 
 def radio_sed_sf(sfr_total, nu_ghz_array, f_imf=None):
@@ -84,7 +130,8 @@ def radio_sed_sf(sfr_total, nu_ghz_array, f_imf=None):
     return radio_luminosity_sf(sfr_total, nu_ghz_array, f_imf)
 
 
-def agn_radio_luminosity(mdot_bh, nu_ghz=1.4):
+def agn_radio_luminosity(mdot_bh, nu_ghz=1.4, out=None, exponent=AGN_EXPONENT,
+                         alpha=AGN_ALPHA):
     """
     AGN radio spectral luminosity from black hole accretion.
 
@@ -100,19 +147,26 @@ def agn_radio_luminosity(mdot_bh, nu_ghz=1.4):
         Black hole accretion rate  [M_sun / yr].
     nu_ghz : float or array
         Frequency in GHz (default 1.4 GHz).
+    out : array, optional
+        Buffer for the result; rates of shape (N_gal, 1) and frequencies
+        of shape (N_nu,) broadcast to (N_gal, N_nu).
+    exponent, alpha : float
+        Power of the accretion-rate relation (17/12) and spectral index
+        of the SED (-0.7).
 
     Returns
     -------
     P_nu : float or array
         Spectral luminosity in erg s^-1 Hz^-1.
     """
-    MSUN_PER_YR_TO_G_PER_S = 6.304e25
-    mdot_cgs = np.asarray(mdot_bh) * MSUN_PER_YR_TO_G_PER_S
     nu = np.asarray(nu_ghz, dtype=float)
-
     nu_ref_hz = 1.4e9                                          # 1.4 GHz in Hz
 
-    P_rad = (mdot_cgs / 4e17) ** (17.0 / 12.0) * 1e30         # erg s^-1 (bolometric)
-    P_nu_ref = P_rad / nu_ref_hz                               # erg s^-1 Hz^-1 at 1.4 GHz
-
-    return P_nu_ref * (nu / 1.4) ** (-0.7)                     # erg s^-1 Hz^-1
\ No newline at end of file
+    P = np.multiply(mdot_bh, MSUN_PER_YR_TO_G_PER_S,
+                    out=_buffer(out, mdot_bh, nu))             # g s^-1
+    P /= 4e17
+    P **= exponent
+    P *= 1e30                                                  # erg s^-1 (bolometric)
+    P /= nu_ref_hz                                             # erg s^-1 Hz^-1 at 1.4 GHz
+    P *= (nu / 1.4) ** alpha                                   # erg s^-1 Hz^-1
+    return P if P.ndim else P[()]
\ No newline at end of file
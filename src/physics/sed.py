@@ -1,31 +1,85 @@
 import numpy as np
-import astropy.units as u
-from astropy.constants import h, c, k_B
 
+# Physical constants (SI, CODATA 2018 exact values) as plain floats, so
+# the kernels below do no unit handling per call.
+H_PLANCK = 6.62607015e-34        # J s
+C_LIGHT = 299792458.0            # m / s
+K_BOLTZMANN = 1.380649e-23       # J / K
+AA_TO_M = 1e-10
 
-def mbb(wavelength_AA, temperature, beta=2.0, norm=1.0):
+_HC = H_PLANCK * C_LIGHT
+_2HC2 = 2 * H_PLANCK * C_LIGHT ** 2
+
+
+def mbb(wavelength_AA, temperature, beta=2.0, norm=1.0, out=None):
     """
     Modified blackbody SED per unit wavelength.
 
+    All inputs broadcast, e.g. wavelengths of shape (N_λ,) or
+    (N_gal, N_λ) with temperatures, betas and norms of shape (N_gal, 1)
+    give an (N_gal, N_λ) array.
+
     Parameters
     ----------
     wavelength_AA : array - wavelength in Angstrom
-    temperature   : float - dust temperature in K
-    beta          : float - emissivity index
-    norm          : float - multiplicative normalisation
+    temperature   : float or array - dust temperature in K
+    beta          : float or array - emissivity index
+    norm          : float or array - multiplicative normalisation
+    out           : array, optional - buffer of the broadcast shape
     """
-    lam_m = (wavelength_AA * u.AA).to(u.m).value
+    lam_m = np.asarray(wavelength_AA, dtype=float) * AA_TO_M
     lam_m = np.where(lam_m <= 0, 1e-10, lam_m)
     temperature = np.where(temperature <= 0, 1e-10, temperature)
 
-    x = h.value * c.value / (lam_m * k_B.value * temperature)
-    x = np.clip(x, 0, 700)
+    shape = np.broadcast_shapes(lam_m.shape, temperature.shape,
+                                np.shape(beta), np.shape(norm))
+    if out is None:
+        out = np.empty(shape)
+
+    # x = h c / (λ k T), clipped; out holds x then B_λ
+    np.multiply(lam_m, K_BOLTZMANN, out=out)
+    np.multiply(out, temperature, out=out)
+    np.divide(_HC, out, out=out)
+    np.clip(out, 0, 700, out=out)
+    np.expm1(out, out=out)
+    np.divide(_2HC2 / lam_m ** 5, out, out=out)
 
-    B_lam = (2 * h.value * c.value ** 2) / (lam_m ** 5) / np.expm1(x)
-    
     emissivity = (100e-6 / lam_m) ** beta
+    np.multiply(norm * emissivity, out, out=out)
+    return out if out.ndim else out[()]
 
-    return norm * emissivity * B_lam
+
+def normalised_mbb_batch(wavelength_AA, L_FIR, temperature, beta=2.0, out=None):
+    """
+    MBB SEDs normalised so that each integral over the last (wavelength)
+    axis equals L_FIR.
+
+    Parameters
+    ----------
+    wavelength_AA : array (N_λ,) or (N_gal, N_λ)
+    L_FIR, temperature : arrays (N_gal,)
+    beta : float or array (N_gal,)
+    out  : array (N_gal, N_λ), optional
+
+    Returns
+    -------
+    sed   : array (N_gal, N_λ) – zero for invalid galaxies
+    valid : bool array (N_gal,) – SED finite and normalisable
+    """
+    col = lambda v: np.asarray(v, dtype=float)[..., None]
+    raw = mbb(wavelength_AA, col(temperature), col(beta) if np.ndim(beta) else beta,
+              norm=1.0, out=out)
+
+    dlam = np.gradient(np.asarray(wavelength_AA, dtype=float), axis=-1)
+    integral = np.sum(raw * dlam, axis=-1)
+    valid = (np.all(np.isfinite(raw), axis=-1) & np.isfinite(integral)
+             & (integral > 0))
+
+    scale = np.zeros(integral.shape)
+    np.divide(L_FIR, integral, out=scale, where=valid)
+    raw[~valid] = 0.0
+    np.multiply(raw, scale[..., None], out=raw)
+    return raw, valid
 
 
 def normalised_mbb(wavelength_AA, L_FIR, temperature, beta=2.0):
@@ -33,13 +87,6 @@ def normalised_mbb(wavelength_AA, L_FIR, temperature, beta=2.0):
     MBB normalised so its integral equals L_FIR.
     Returns None if normalisation fails.
     """
-    raw = mbb(wavelength_AA, temperature, beta, norm=1.0)
-    if not np.all(np.isfinite(raw)):
-        return None
-
-    dlam = np.gradient(wavelength_AA)
-    integral = np.sum(raw * dlam)
-    if integral <= 0 or not np.isfinite(integral):
-        return None
-
-    return raw * (L_FIR / integral)
\ No newline at end of file
+    sed, valid = normalised_mbb_batch(wavelength_AA, np.atleast_1d(L_FIR),
+                                      np.atleast_1d(temperature), beta)
+    return sed[0] if valid[0] else None
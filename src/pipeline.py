@@ -0,0 +1,342 @@
+"""
+Make-style task graph for production campaigns.
+
+A :class:`Task` is one script invocation with declared inputs (files
+and directories it reads), outputs (files, or the newest results-store
+run of a kind, :class:`StoreOutput`) and upstream tasks.  A task is
+skipped when its *stamp* — a hash of its command line, of the contents
+of its inputs and of its upstream tasks' outputs — matches the one
+recorded after its last successful run and its outputs still hash to
+what that run produced.  A rebuilt task whose outputs come out
+byte-identical (for store runs: the same data and parameters, whatever
+their creation time) therefore does not invalidate what depends on it.
+
+File contents are hashed once per (size, mtime) and the digests kept in
+``STATE_DIR/hashes.json``, so unchanged multi-GB catalogues are not
+re-read on every invocation.
+
+:meth:`Pipeline.run` starts every task whose upstream tasks have
+finished as a subprocess, as long as the cores declared by the running
+tasks stay within the budget (a task asking for more than the budget
+runs alone).  Each task's output goes to ``STATE_DIR/logs/<task>.log``.
+"""
+
+import fnmatch
+import hashlib
+import json
+import queue
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+STATE_DIR = ROOT / "data" / "pipeline"
+
+HASH_BLOCK = 1 << 24
+
+
+def _digest(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _slug(name):
+    return "".join(c if c.isalnum() or c in "._-" else "_" for c in name)
+
+
+class ContentHashes:
+    """
+    sha256 of file contents, memoised on (size, mtime_ns).
+
+    Parameters
+    ----------
+    path : Path – JSON file the digests persist in
+    """
+
+    def __init__(self, path=STATE_DIR / "hashes.json"):
+        self.path = Path(path)
+        self._memo = json.loads(self.path.read_text()) if self.path.exists() else {}
+        self._lock = threading.Lock()
+
+    def _memoised(self, path, prefix, compute):
+        path = Path(path).resolve()
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        key = prefix + str(path)
+        stamp = [st.st_size, st.st_mtime_ns]
+        with self._lock:
+            memo = self._memo.get(key)
+        if memo is not None and memo[:2] == stamp:
+            return memo[2]
+        digest = compute(path)
+        with self._lock:
+            self._memo[key] = stamp + [digest]
+        return digest
+
+    def file(self, path):
+        """Content hash of a file, or None if it does not exist."""
+        def compute(path):
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(HASH_BLOCK), b""):
+                    h.update(block)
+            return h.hexdigest()
+        return self._memoised(path, "", compute)
+
+    def run(self, path):
+        """
+        Hash of a results-store run's data and parameters (not its
+        creation time), or None if the file does not exist.
+        """
+        from src.store import content_digest
+        return self._memoised(path, "run:", content_digest)
+
+    def tree(self, path):
+        """{relative path: hash} of a file, or of every file under a directory."""
+        path = Path(path)
+        if path.is_dir():
+            return {str(p.relative_to(path)): self.file(p)
+                    for p in sorted(path.rglob("*"))
+                    if p.is_file() and "__pycache__" not in p.parts}
+        return {path.name: self.file(path)}
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self._memo))
+        tmp.replace(self.path)
+
+
+class StoreOutput:
+    """
+    Task output held in the results store: the newest run of ``kind``
+    matching ``params``.
+    """
+
+    def __init__(self, kind, **params):
+        self.kind = kind
+        self.params = params
+
+    def resolve(self):
+        """Path of the matching run's file, or None."""
+        from src.store import ResultsStore
+        run = ResultsStore().latest(self.kind, **self.params)
+        return None if run is None else run.path
+
+    def __str__(self):
+        query = ", ".join(f"{k}={v}" for k, v in sorted(self.params.items()))
+        return f"store:{self.kind}({query})"
+
+
+class Task:
+    """
+    One step of a pipeline.
+
+    Parameters
+    ----------
+    name    : str – unique task name
+    argv    : list of str – command, run from the repository root
+    inputs  : paths (files or directories) the task reads
+    outputs : Paths and/or StoreOutputs the task writes
+    deps    : upstream Tasks
+    cores   : int – cores the task occupies while running
+    """
+
+    def __init__(self, name, argv, inputs=(), outputs=(), deps=(), cores=1):
+        self.name = name
+        self.argv = [str(a) for a in argv]
+        self.inputs = [Path(p) for p in inputs]
+        self.outputs = [o if isinstance(o, StoreOutput) else Path(o) for o in outputs]
+        self.deps = list(deps)
+        self.cores = max(int(cores), 1)
+
+    def __repr__(self):
+        return f"<Task {self.name}>"
+
+
+def _resolve(output):
+    return output.resolve() if isinstance(output, StoreOutput) else output
+
+
+class Pipeline:
+    """
+    Run a set of tasks, skipping those that are up to date.
+
+    Parameters
+    ----------
+    tasks     : list of Task (upstream tasks need not be listed)
+    state_dir : Path – task records, content-hash memo and logs
+    """
+
+    def __init__(self, tasks, state_dir=STATE_DIR):
+        self.state_dir = Path(state_dir)
+        self.hashes = ContentHashes(self.state_dir / "hashes.json")
+        self.tasks = {}                 # name -> Task, upstream first
+        visiting = set()
+
+        def add(task, path):
+            other = self.tasks.get(task.name)
+            if other is task:
+                return
+            if other is not None:
+                raise ValueError(f"Two tasks named {task.name!r}")
+            if task.name in visiting:
+                raise ValueError("Cycle in task graph: " + " -> ".join(path + [task.name]))
+            visiting.add(task.name)
+            for dep in task.deps:
+                add(dep, path + [task.name])
+            visiting.discard(task.name)
+            self.tasks[task.name] = task
+
+        for task in tasks:
+            add(task, [])
+        self.order = list(self.tasks.values())
+
+    # ── records ────────────────────────────────────────────────────
+
+    def _record_path(self, task):
+        return self.state_dir / "tasks" / f"{_slug(task.name)}.json"
+
+    def _record(self, task):
+        path = self._record_path(task)
+        return json.loads(path.read_text()) if path.exists() else None
+
+    def _output_hashes(self, task):
+        """{output: content hash or None} of a task's current outputs."""
+        out = {}
+        for output in task.outputs:
+            path = _resolve(output)
+            if path is None:
+                out[str(output)] = None
+            elif isinstance(output, StoreOutput):
+                out[str(output)] = self.hashes.run(path)
+            else:
+                out[str(output)] = self.hashes.file(path)
+        return out
+
+    def stamp(self, task, dep_outputs):
+        """Hash of everything a task's result depends on."""
+        return _digest({
+            "argv": task.argv,
+            "inputs": {str(p): self.hashes.tree(p) for p in task.inputs},
+            "deps": {d.name: dep_outputs[d.name] for d in task.deps},
+        })
+
+    def up_to_date(self, task, stamp):
+        """Whether the last run had this stamp and its outputs are unchanged."""
+        record = self._record(task)
+        if record is None or record["stamp"] != stamp:
+            return False
+        current = self._output_hashes(task)
+        return None not in current.values() and current == record["outputs"]
+
+    # ── execution ──────────────────────────────────────────────────
+
+    def _execute(self, task, done):
+        log = self.state_dir / "logs" / f"{_slug(task.name)}.log"
+        log.parent.mkdir(parents=True, exist_ok=True)
+        t0 = time.perf_counter()
+        with open(log, "w") as f:
+            f.write("$ " + " ".join(task.argv) + "\n")
+            f.flush()
+            code = subprocess.call(task.argv, cwd=ROOT, stdout=f,
+                                   stderr=subprocess.STDOUT)
+        done.put((task, code, time.perf_counter() - t0, log))
+
+    def run(self, max_cores=1, force=(), dry_run=False):
+        """
+        Bring every task up to date.
+
+        Parameters
+        ----------
+        max_cores : int – budget for the cores of concurrently running tasks
+        force     : task names or glob patterns to rerun regardless
+        dry_run   : only report what would run
+
+        Returns
+        -------
+        dict name -> "skipped", "ran", "failed", "blocked" or (dry run)
+        "stale"
+        """
+        def forced(task):
+            return any(fnmatch.fnmatchcase(task.name, p) for p in force)
+
+        status = {}
+        dep_outputs = {}                # name -> {output: hash}
+        waiting = list(self.order)
+        running = {}                    # name -> (task, stamp)
+        done = queue.Queue()
+        used = 0
+
+        def finish(task, code, seconds, log):
+            nonlocal used
+            _, stamp = running.pop(task.name)
+            used -= min(task.cores, max_cores)
+            outputs = self._output_hashes(task) if code == 0 else {}
+            missing = [name for name, h in outputs.items() if h is None]
+            if code != 0 or missing:
+                status[task.name] = "failed"
+                why = f"exit code {code}" if code else "missing " + ", ".join(missing)
+                print(f"[FAIL] {task.name} ({why}; log: {log})")
+                return
+            record_path = self._record_path(task)
+            record_path.parent.mkdir(parents=True, exist_ok=True)
+            record_path.write_text(json.dumps(
+                {"stamp": stamp, "outputs": outputs, "seconds": seconds}, indent=1))
+            dep_outputs[task.name] = outputs
+            status[task.name] = "ran"
+            print(f"[done] {task.name} ({seconds:.1f} s)")
+
+        try:
+            while waiting or running:
+                progressed = False
+                for task in list(waiting):
+                    dep_status = [status.get(d.name) for d in task.deps]
+                    if any(s in ("failed", "blocked") for s in dep_status):
+                        status[task.name] = "blocked"
+                        waiting.remove(task)
+                        print(f"[blocked] {task.name}")
+                        progressed = True
+                        continue
+                    if any(s is None for s in dep_status):
+                        continue
+                    if dry_run:
+                        stale = (forced(task) or "stale" in dep_status
+                                 or not self.up_to_date(task, self.stamp(task, dep_outputs)))
+                        status[task.name] = "stale" if stale else "skipped"
+                        dep_outputs[task.name] = self._output_hashes(task)
+                        print(f"[{'would run' if stale else 'up to date'}] {task.name}")
+                        waiting.remove(task)
+                        progressed = True
+                        continue
+                    stamp = self.stamp(task, dep_outputs)
+                    if not forced(task) and self.up_to_date(task, stamp):
+                        status[task.name] = "skipped"
+                        dep_outputs[task.name] = self._record(task)["outputs"]
+                        print(f"[skip] {task.name}")
+                        waiting.remove(task)
+                        progressed = True
+                        continue
+                    cores = min(task.cores, max_cores)
+                    if running and used + cores > max_cores:
+                        continue
+                    used += cores
+                    running[task.name] = (task, stamp)
+                    waiting.remove(task)
+                    print(f"[run] {task.name} ({cores} core{'s' if cores > 1 else ''})")
+                    threading.Thread(target=self._execute, args=(task, done),
+                                     daemon=True).start()
+                    progressed = True
+                if not progressed:
+                    # Nothing could start: wait for a running task to end
+                    finish(*done.get())
+                    while not done.empty():
+                        finish(*done.get())
+        finally:
+            while running:
+                finish(*done.get())
+            self.hashes.save()
+        return status
@@ -0,0 +1,149 @@
+"""
+Background-thread prefetching of per-snapshot catalogue columns.
+
+The pipelines walk the snapshots in order, reading each catalogue and
+then computing on it, so the CPU idles during reads and the disk idles
+during compute.  :class:`SnapshotPrefetcher` runs the reads in a
+background thread, up to ``depth`` snapshots ahead of the consumer and
+within an optional memory budget:
+
+    with SnapshotPrefetcher(load, snaps, depth=2, max_mb=2000) as pf:
+        for snap, columns in pf:
+            compute(snap, columns)
+
+Results are yielded in the order of ``keys``.  An exception raised by
+``load`` is re-raised in the consumer when its snapshot is reached.
+"""
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Default number of snapshots read ahead of the one being processed.
+DEFAULT_DEPTH = 2
+
+
+def nbytes(obj):
+    """Total size of the numpy arrays in a (nested) dict / list / tuple."""
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sum(nbytes(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(nbytes(v) for v in obj)
+    return 0
+
+
+class SnapshotPrefetcher:
+    """
+    Iterate over ``(key, load(key))`` with loads run ahead in a thread.
+
+    Parameters
+    ----------
+    load   : callable – ``load(key)`` returns the data for one snapshot
+    keys   : sequence – snapshot keys, in processing order
+    depth  : int – most loaded-but-unconsumed snapshots; 0 loads inline
+    max_mb : float or None – stop reading ahead while the unconsumed
+             snapshots hold more than this many MB of arrays.  The next
+             snapshot is always allowed, however large.
+
+    Attributes ``load_seconds`` (time spent in ``load``) and
+    ``wait_seconds`` (time the consumer was blocked) show how much I/O
+    was hidden behind compute.
+    """
+
+    def __init__(self, load, keys, depth=DEFAULT_DEPTH, max_mb=None):
+        self.load = load
+        self.keys = list(keys)
+        self.depth = max(int(depth), 0)
+        self.max_bytes = None if max_mb is None else max_mb * 1e6
+        self.load_seconds = 0.0
+        self.wait_seconds = 0.0
+
+        self._ready = deque()           # (key, data, error, nbytes)
+        self._held = 0                  # bytes in _ready
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+
+    # ── producer ──────────────────────────────────────────────────
+
+    def _has_room(self):
+        if len(self._ready) >= self.depth:
+            return False
+        return (self.max_bytes is None or not self._ready
+                or self._held < self.max_bytes)
+
+    def _work(self):
+        for key in self.keys:
+            with self._cond:
+                while not self._stop and not self._has_room():
+                    self._cond.wait()
+                if self._stop:
+                    return
+            data, error, size = self._load(key)
+            with self._cond:
+                self._ready.append((key, data, error, size))
+                self._held += size
+                self._cond.notify_all()
+            if error is not None:
+                return
+
+    def _load(self, key):
+        t0 = time.perf_counter()
+        try:
+            data = self.load(key)
+        except BaseException as e:
+            return None, e, 0
+        finally:
+            self.load_seconds += time.perf_counter() - t0
+        return data, None, nbytes(data)
+
+    # ── consumer ──────────────────────────────────────────────────
+
+    def __iter__(self):
+        if self.depth == 0:
+            for key in self.keys:
+                data, error, _ = self._load(key)
+                if error is not None:
+                    raise error
+                yield key, data
+            return
+
+        self._thread = threading.Thread(target=self._work, daemon=True,
+                                        name="snapshot-prefetch")
+        self._thread.start()
+        try:
+            for _ in self.keys:
+                t0 = time.perf_counter()
+                with self._cond:
+                    while not self._ready:
+                        self._cond.wait()
+                    key, data, error, size = self._ready.popleft()
+                    self._held -= size
+                    self._cond.notify_all()
+                self.wait_seconds += time.perf_counter() - t0
+                if error is not None:
+                    raise error
+                yield key, data
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop the reader thread and drop unconsumed snapshots."""
+        with self._cond:
+            self._stop = True
+            self._ready.clear()
+            self._held = 0
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,165 @@
+"""
+Arrays shared between worker processes without copies.
+
+Process pools pickle every argument into every task, so columns that
+many tasks need — a snapshot catalogue split across several chunks, or
+the lightcone columns the tasks select their galaxies from — are read
+and held once per task.  :class:`SharedArrays` publishes them once instead: each
+array is written to a ``.npy`` file in RAM-backed storage (``/dev/shm``
+where available) and replaced by a small picklable :class:`SharedArray`
+handle, and :func:`attach` in the worker maps the file back as a
+copy-on-write view, so every process reads the same physical pages:
+
+    with SharedArrays(max_mb=4000) as shared:
+        handles = shared.publish("lightcone", {"z": gal_z, "galaxy_index": gal_idx})
+        pool.submit(work, handles)          # work() calls attach(handles)
+
+Published data is released per key (:meth:`SharedArrays.release`) or
+all together when the publisher is closed, garbage-collected or the
+interpreter exits.  ``max_mb`` is a budget the caller checks with
+:meth:`SharedArrays.has_room` before publishing more.
+"""
+
+import os
+import shutil
+import tempfile
+import weakref
+from pathlib import Path
+
+import numpy as np
+
+# RAM-backed on Linux; elsewhere the system temporary directory
+SHARED_ROOT = Path("/dev/shm") if os.access("/dev/shm", os.W_OK) else None
+
+
+class SharedArray:
+    """Picklable handle to one published array."""
+
+    __slots__ = ("path", "shape", "dtype")
+
+    def __init__(self, path, shape, dtype):
+        self.path = str(path)
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+
+    def __getstate__(self):
+        return (self.path, self.shape, self.dtype.str)
+
+    def __setstate__(self, state):
+        self.path, self.shape, dtype = state
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def attach(self):
+        """Copy-on-write view of the array: writes stay private to the process."""
+        return np.load(self.path, mmap_mode="c")
+
+    def __repr__(self):
+        return f"SharedArray({self.path!r}, {self.shape}, {self.dtype})"
+
+
+def attach(obj):
+    """
+    Replace the :class:`SharedArray` handles in a (nested) dict / list /
+    tuple by views of their arrays; anything else is returned as is.
+    """
+    if isinstance(obj, SharedArray):
+        return obj.attach()
+    if isinstance(obj, dict):
+        return {k: attach(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(attach(v) for v in obj)
+    return obj
+
+
+class SharedArrays:
+    """
+    Publisher of arrays for zero-copy use in worker processes.
+
+    Parameters
+    ----------
+    max_mb : float or None – budget for the published arrays, see
+             :meth:`has_room`
+    root   : Path or None – directory to create the backing files in
+             (default ``SHARED_ROOT``)
+    """
+
+    def __init__(self, max_mb=None, root=SHARED_ROOT):
+        self.max_bytes = None if max_mb is None else max_mb * 1e6
+        self.dir = Path(tempfile.mkdtemp(prefix="simba_shared_", dir=root))
+        self._sizes = {}                # key -> bytes published
+        self._paths = {}                # key -> backing files
+        self._count = 0
+        # Remove the files however the publisher goes away
+        self._cleanup = weakref.finalize(self, shutil.rmtree, str(self.dir), True)
+
+    @property
+    def nbytes(self):
+        """Bytes currently published."""
+        return sum(self._sizes.values())
+
+    def has_room(self, n_bytes):
+        """
+        Whether ``n_bytes`` more fit in the budget.  With nothing
+        published there is always room, however large the request.
+        """
+        return (self.max_bytes is None or not self._sizes
+                or self.nbytes + n_bytes <= self.max_bytes)
+
+    def _share(self, key, arr):
+        # Empty and object arrays cannot be memory-mapped; they travel
+        # with the task as usual
+        if arr.size == 0 or arr.dtype.hasobject:
+            return arr
+        self._count += 1
+        path = self.dir / f"{self._count:06d}.npy"
+        np.save(path, arr, allow_pickle=False)
+        self._sizes[key] += arr.nbytes
+        self._paths[key].append(path)
+        return SharedArray(path, arr.shape, arr.dtype)
+
+    def _publish(self, key, obj):
+        if isinstance(obj, np.ndarray):
+            return self._share(key, obj)
+        if isinstance(obj, dict):
+            return {k: self._publish(key, v) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return type(obj)(self._publish(key, v) for v in obj)
+        return obj
+
+    def publish(self, key, obj):
+        """
+        Publish the arrays of a (nested) dict / list / tuple under
+        ``key``; returns the same structure with every array replaced by
+        a :class:`SharedArray` handle.
+        """
+        if key in self._sizes:
+            raise KeyError(f"{key!r} is already published")
+        self._sizes[key] = 0
+        self._paths[key] = []
+        return self._publish(key, obj)
+
+    def release(self, key):
+        """
+        Delete the arrays published under ``key``.  Views already
+        attached stay valid until the workers drop them.
+        """
+        for path in self._paths.pop(key, ()):
+            path.unlink(missing_ok=True)
+        self._sizes.pop(key, None)
+
+    def close(self):
+        """Delete every published array."""
+        self._sizes.clear()
+        self._paths.clear()
+        self._cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
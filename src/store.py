@@ -0,0 +1,350 @@
+"""
+Indexed store of pipeline results.
+
+Each run is one HDF5 file under ``data/results/store/runs`` named by a
+hash of its full parameter set (kind, simulation, area, redshift range,
+a_dust, beta, snap_step, seeds, …), written with chunked, gzip+shuffle
+compressed datasets.  A sqlite index (``index.sqlite``) records the
+parameters of every run, so runs can be queried without scanning the
+filesystem or opening the files:
+
+    store = ResultsStore()
+    for run in store.find("background", sim="m100n1024", z_max=7.0):
+        print(run.params, run.created)
+    run = store.latest("background", sim="m100n1024", area_deg2=0.5)
+    lam = run["optical/lam_AA"]          # read on access
+
+Datasets are only read when indexed, so a plot that needs one spectrum
+does not pull in every array of the run.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import h5py
+
+from src import instrument
+
+STORE_DIR = Path(__file__).resolve().parent.parent / "data" / "results" / "store"
+LIGHTCONE_DIR = Path(__file__).resolve().parent.parent / "data" / "lightcones"
+
+# Parameters promoted to indexed columns; everything else is queried
+# through the JSON parameter record.
+_COLUMNS = ("sim", "area_deg2", "z_min", "z_max")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    hash      TEXT PRIMARY KEY,
+    kind      TEXT NOT NULL,
+    sim       TEXT,
+    area_deg2 REAL,
+    z_min     REAL,
+    z_max     REAL,
+    params    TEXT NOT NULL,
+    path      TEXT NOT NULL,
+    created   TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_lookup ON runs (kind, sim, z_min, z_max);
+"""
+
+# Relative tolerance of numeric parameter matches in ``find``, so that
+# e.g. a redshift recomputed as 0.1 + 0.2 still finds a run at 0.3
+_RTOL = 1e-9
+
+
+def _plain(value):
+    """Convert numpy scalars/arrays and Paths to JSON-serialisable values."""
+    if isinstance(value, np.ndarray):
+        return [_plain(v) for v in value.tolist()]
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, Path):
+        return str(value)
+    return value
+
+
+def _same(a, b):
+    """Whether a stored parameter value matches a queried one (numbers to ``_RTOL``)."""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return a is b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return abs(a - b) <= _RTOL * max(abs(a), abs(b))
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(map(_same, a, b))
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_same(a[k], b[k]) for k in a)
+    return a == b
+
+
+def param_hash(kind, params):
+    """Stable short hash of a run kind and its parameter dict."""
+    record = json.dumps({"kind": kind, **{k: _plain(v) for k, v in params.items()}},
+                        sort_keys=True)
+    return hashlib.sha256(record.encode()).hexdigest()[:16]
+
+
+def lightcone_params(sim, area_deg2, z_min, z_max):
+    """
+    Generation parameters (snap_step, midsnap, seed) stored as attributes
+    on the cached lightcone a run was computed from; empty if absent.
+    """
+    path = LIGHTCONE_DIR / f"lc_{sim}_a{area_deg2}_z{z_min}-{z_max}.h5"
+    if not path.exists():
+        return {}
+    with h5py.File(path, "r") as f:
+        return {k: _plain(f.attrs[k]) for k in ("snap_step", "midsnap", "seed")
+                if k in f.attrs}
+
+
+def _write_tree(grp, data):
+    """Write a nested dict of arrays as groups and compressed datasets."""
+    for key, value in data.items():
+        if isinstance(value, dict):
+            _write_tree(grp.require_group(key), value)
+            continue
+        arr = np.asarray(value)
+        if arr.ndim == 0 or arr.size == 0:
+            grp.create_dataset(key, data=arr)
+        else:
+            grp.create_dataset(key, data=arr, chunks=True,
+                               compression="gzip", shuffle=True)
+
+
+def content_digest(path):
+    """
+    sha256 of a stored run's datasets and attributes, leaving out the
+    ``created`` timestamp, so that rewriting a run with the same
+    parameters and data does not change it.
+    """
+    h = hashlib.sha256()
+
+    def add_attrs(name, attrs):
+        for key in sorted(attrs):
+            if not (name == "/" and key == "created"):
+                h.update(json.dumps([name, key, _plain(attrs[key])],
+                                    default=str).encode())
+
+    with h5py.File(path, "r") as f:
+        add_attrs("/", f.attrs)
+        names = []
+        f.visit(names.append)
+        for name in sorted(names):
+            node = f[name]
+            add_attrs(name, node.attrs)
+            if isinstance(node, h5py.Dataset):
+                data = np.ascontiguousarray(node[()])
+                h.update(json.dumps([name, data.dtype.str, data.shape]).encode())
+                h.update(data.tobytes())
+    return h.hexdigest()
+
+
+class StoredGroup:
+    """
+    Lazy view of a group in a stored run.  Indexing returns a sub-group
+    view, reads a dataset, or (failing both) returns a group attribute.
+    """
+
+    def __init__(self, path, name="/"):
+        self.path = Path(path)
+        self.name = name
+
+    def _key(self, key):
+        return key if self.name == "/" else f"{self.name}/{key}"
+
+    def __getitem__(self, key):
+        full = self._key(key)
+        instrument.record_open(self.path)
+        with h5py.File(self.path, "r") as f:
+            grp = f[self.name]
+            if key in grp:
+                node = grp[key]
+                if isinstance(node, h5py.Group):
+                    return StoredGroup(self.path, node.name)
+                data = node[()]
+                instrument.record_read(node.name, np.asarray(data).nbytes)
+                return data
+            if key in grp.attrs:
+                return _plain(grp.attrs[key])
+        raise KeyError(f"{full!r} not in {self.path}")
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        with h5py.File(self.path, "r") as f:
+            grp = f[self.name]
+            return key in grp or key in grp.attrs
+
+    def keys(self):
+        with h5py.File(self.path, "r") as f:
+            return list(f[self.name].keys())
+
+    @property
+    def attrs(self):
+        with h5py.File(self.path, "r") as f:
+            return {k: _plain(v) for k, v in f[self.name].attrs.items()}
+
+    def __repr__(self):
+        return f"<StoredGroup {self.name} of {self.path.name}>"
+
+
+class StoredRun(StoredGroup):
+    """One indexed run: its parameters plus lazy access to its data."""
+
+    def __init__(self, path, hash, kind, params, created):
+        super().__init__(path)
+        self.hash = hash
+        self.kind = kind
+        self.params = params
+        self.created = created
+
+    def __repr__(self):
+        return f"<StoredRun {self.kind} {self.hash} {self.params}>"
+
+
+class ResultsStore:
+    """
+    Parameter-hash–keyed results store backed by a sqlite index.
+
+    Parameters
+    ----------
+    root : Path – store directory (created on first write)
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = Path(root)
+        self.index_path = self.root / "index.sqlite"
+
+    def _connect(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(self.index_path)
+        con.executescript(_SCHEMA)
+        return con
+
+    def _run(self, row):
+        hash, kind, params, path, created = row
+        return StoredRun(self.root / path, hash, kind, json.loads(params), created)
+
+    def put(self, kind, params, data, attrs=None):
+        """
+        Store one run, replacing any earlier run with identical parameters.
+
+        Parameters
+        ----------
+        kind   : str – e.g. "background", "farIR_sweep", "jackknife"
+        params : dict – every parameter that determines the result
+        data   : nested dict of arrays – groups and datasets to write
+        attrs  : dict group path -> {name: value}, optional
+
+        Returns
+        -------
+        StoredRun
+        """
+        params = {k: _plain(v) for k, v in params.items()}
+        h = param_hash(kind, params)
+        rel = Path("runs") / f"{kind}_{h}.h5"
+        path = self.root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        created = datetime.now().isoformat()
+
+        tmp = path.with_suffix(".h5.tmp")
+        with h5py.File(tmp, "w") as f:
+            f.attrs["kind"] = kind
+            f.attrs["hash"] = h
+            f.attrs["params"] = json.dumps(params, sort_keys=True)
+            f.attrs["created"] = created
+            _write_tree(f, data)
+            for grp_name, grp_attrs in (attrs or {}).items():
+                grp = f.require_group(grp_name)
+                for k, v in grp_attrs.items():
+                    grp.attrs[k] = v
+        os.replace(tmp, path)
+
+        with closing(self._connect()) as con, con:
+            con.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (h, kind, *(params.get(c) for c in _COLUMNS),
+                 json.dumps(params, sort_keys=True), str(rel), created))
+        return StoredRun(path, h, kind, params, created)
+
+    def find(self, kind=None, **params):
+        """
+        Runs matching ``kind`` and every given parameter, newest first.
+        Numbers match to a relative ``_RTOL``; lists, arrays and dicts
+        match element by element.  Runs whose files have since been
+        removed are skipped.
+        """
+        if not self.index_path.exists():
+            return []
+        where, values, nested = [], [], {}
+        if kind is not None:
+            where.append("kind = ?")
+            values.append(kind)
+        for key, value in params.items():
+            value = _plain(value)
+            if key in _COLUMNS:
+                expr = key
+            else:
+                expr = "json_extract(params, ?)"
+            if isinstance(value, (list, dict)):
+                # Compared in Python below
+                nested[key] = value
+                continue
+            if value is not None and not isinstance(value, (str, bool, int, float)):
+                raise TypeError(f"Cannot query parameter {key!r} by a "
+                                f"{type(value).__name__}")
+            if expr != key:
+                values.append(f"$.{key}")
+            if value is None:
+                where.append(f"{expr} IS NULL")
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                where.append(f"typeof({expr}) IN ('integer', 'real') "
+                             f"AND ABS({expr} - ?) <= ?")
+                if expr != key:
+                    values.append(f"$.{key}")
+                values += [value, _RTOL * abs(value)]
+            else:
+                where.append(f"{expr} = ?")
+                values.append(value)
+        sql = "SELECT hash, kind, params, path, created FROM runs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created DESC"
+        with closing(self._connect()) as con:
+            rows = con.execute(sql, values).fetchall()
+        runs = [self._run(r) for r in rows]
+        return [r for r in runs if r.path.exists()
+                and all(key in r.params and _same(r.params[key], value)
+                        for key, value in nested.items())]
+
+    def latest(self, kind, **params):
+        """Newest run matching the query, or None."""
+        runs = self.find(kind, **params)
+        return runs[0] if runs else None
+
+    def get(self, hash):
+        """Run with the given parameter hash."""
+        with closing(self._connect()) as con:
+            row = con.execute("SELECT hash, kind, params, path, created "
+                              "FROM runs WHERE hash = ?", (hash,)).fetchone()
+        if row is None:
+            raise KeyError(f"No run {hash!r} in {self.index_path}")
+        return self._run(row)
+
+    def remove(self, hash):
+        """Drop a run from the index and delete its file."""
+        run = self.get(hash)
+        with closing(self._connect()) as con, con:
+            con.execute("DELETE FROM runs WHERE hash = ?", (hash,))
+        run.path.unlink(missing_ok=True)
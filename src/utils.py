@@ -3,10 +3,39 @@ import numpy as np
 import h5py
 from pathlib import Path
 from datetime import datetime
-import caesar
+
+from src import instrument
+from src.store import ResultsStore, StoredGroup, lightcone_params
 
 RESULTS_DIR = Path(__file__).resolve().parent.parent / "data" / "results"
 
+
+def open_hdf5(path, mode="r"):
+    """h5py.File, counted by the instrumentation layer."""
+    instrument.record_open(path)
+    return h5py.File(path, mode)
+
+
+def read_dataset(f, key):
+    """Read ``f[key]`` in full, recording the bytes read per dataset path."""
+    dset = f[key]
+    data = dset[:]
+    instrument.record_read(dset.name, data.nbytes)
+    return data
+
+
+def load_caesar(path):
+    """
+    ``caesar.load`` a catalogue.  caesar (and yt behind it) is imported
+    here rather than at module level, since it takes seconds to import
+    and only the fallback paths for catalogues without HDF5 headers
+    need it.
+    """
+    import caesar
+    instrument.record_open(path)
+    return caesar.load(str(path))
+
+
 def get_redshift(obj):
     """Get redshift from a Caesar object."""
     for attr in ["redshift", "z"]:
@@ -35,6 +64,7 @@ def list_snapshots(cfg):
     snaps.sort(key=lambda t: t[0], reverse=True)
     return snaps
 
+@instrument.timed("save_results")
 def save_background_results(
     cfg, args,
     # Optical
@@ -48,9 +78,11 @@ def save_background_results(
     dust_temps=None, dust_redshifts=None,
     # Physics parameters
     a_dust=0.0807, beta=2.0,
+    params=None,
 ):
     """
-    Save all computed background spectra to HDF5 for later analysis.
+    Save all computed background spectra to the results store for later
+    analysis.
 
     Parameters
     ----------
@@ -68,59 +100,60 @@ def save_background_results(
         Per-galaxy dust temperatures and redshifts for diagnostics.
     a_dust, beta : float
         Dust model parameters.
-    
+    params : dict, optional
+        Any further parameters that distinguish this run.  The lightcone's
+        snap_step / midsnap / seed are added automatically.
+
     Returns
     -------
     Path : path to saved file
     """
-    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
-    
-    fname = f"bg_{cfg.name}_a{args.area}_z{args.z_min}-{args.z_max}.h5"
-    outpath = RESULTS_DIR / fname
-    
-    with h5py.File(outpath, "w") as f:
-        # ── Metadata ──
-        meta = f.create_group("metadata")
-        meta.attrs["sim"] = cfg.name
-        meta.attrs["area_deg2"] = args.area
-        meta.attrs["z_min"] = args.z_min
-        meta.attrs["z_max"] = args.z_max
-        meta.attrs["a_dust"] = a_dust
-        meta.attrs["beta"] = beta
-        meta.attrs["created"] = datetime.now().isoformat()
-        
-        # ── Optical / NIR ──
-        opt = f.create_group("optical")
-        opt.create_dataset("lam_AA", data=lam_opt)
-        opt.create_dataset("I_nu", data=I_nu_opt)
-        opt.create_dataset("nuInu_nW", data=nuInu_opt_nW)
-        opt.create_dataset("I_nu_nodust", data=I_nu_opt_nodust)
-        opt.create_dataset("nuInu_nodust_nW", data=nuInu_opt_nodust_nW)
-
-        # ── Far-IR ──
-        fir = f.create_group("farIR")
-        fir.create_dataset("lam_AA", data=lam_fir)           # Angstrom
-        fir.create_dataset("I_lam", data=I_lam_fir)          # erg/s/cm²/sr/AA
-        fir.create_dataset("nuInu_nW", data=nuInu_fir_nW)    # nW/m²/sr
-        
-        # ── Radio ──
-        rad = f.create_group("radio")
-        rad.create_dataset("nu_Hz", data=nu_radio)
-        rad.create_dataset("I_nu", data=I_nu_radio)
-        rad.create_dataset("lam_um", data=lam_radio_um)
-        rad.create_dataset("nuInu_nW", data=nuInu_radio_nW)
-        
-        # ── Dust diagnostics (for T vs z plots) ──
-        if dust_temps is not None and len(dust_temps) > 0:
-            diag = f.create_group("diagnostics")
-            diag.create_dataset("dust_temps", data=np.asarray(dust_temps))
-            diag.create_dataset("dust_redshifts", data=np.asarray(dust_redshifts))
-    
-    print(f"Results saved → {outpath}")
-    return outpath
+    run_params = {
+        "sim": cfg.name, "area_deg2": args.area,
+        "z_min": args.z_min, "z_max": args.z_max,
+        "a_dust": a_dust, "beta": beta,
+        **lightcone_params(cfg.name, args.area, args.z_min, args.z_max),
+        **(params or {}),
+    }
+
+    data = {
+        "optical": {
+            "lam_AA": lam_opt,
+            "I_nu": I_nu_opt,
+            "nuInu_nW": nuInu_opt_nW,
+            "I_nu_nodust": I_nu_opt_nodust,
+            "nuInu_nodust_nW": nuInu_opt_nodust_nW,
+        },
+        "farIR": {
+            "lam_AA": lam_fir,            # Angstrom
+            "I_lam": I_lam_fir,           # erg/s/cm²/sr/AA
+            "nuInu_nW": nuInu_fir_nW,     # nW/m²/sr
+        },
+        "radio": {
+            "nu_Hz": nu_radio,
+            "I_nu": I_nu_radio,
+            "lam_um": lam_radio_um,
+            "nuInu_nW": nuInu_radio_nW,
+        },
+    }
+    # ── Dust diagnostics (for T vs z plots) ──
+    if dust_temps is not None and len(dust_temps) > 0:
+        data["diagnostics"] = {
+            "dust_temps": np.asarray(dust_temps),
+            "dust_redshifts": np.asarray(dust_redshifts),
+        }
+
+    meta = {k: v for k, v in run_params.items() if v is not None}
+    meta["created"] = datetime.now().isoformat()
+    run = ResultsStore().put("background", run_params, data,
+                             attrs={"metadata": meta})
+
+    print(f"Results saved → {run.path}")
+    return run.path
 
 
-def load_background_results(cfg_name, area, z_min, z_max):
+@instrument.timed("load_results")
+def load_background_results(cfg_name, area, z_min, z_max, **params):
     """
     Load previously computed background spectra.
 
@@ -130,61 +163,80 @@ def load_background_results(cfg_name, area, z_min, z_max):
         Simulation name (e.g., "m25n256").
     area, z_min, z_max : float
         Lightcone parameters.
+    **params
+        Further parameters to match, e.g. ``a_dust=-0.017``.
 
     Returns
     -------
-    dict : nested dictionary with all saved data
+    StoredRun or dict : the newest matching run from the results store,
+        indexable like the nested dictionary below but reading each
+        dataset only on access; or, for a legacy
+        ``bg_{name}_a{area}_z{zmin}-{zmax}.h5`` cache file, a nested
+        dictionary with all saved data.
     """
+    run = ResultsStore().latest("background", sim=cfg_name, area_deg2=area,
+                                z_min=z_min, z_max=z_max, **params)
+    if run is not None:
+        print(f"Loaded results from {run.path}")
+        return run
+
     fname = f"bg_{cfg_name}_a{area}_z{z_min}-{z_max}.h5"
     path = RESULTS_DIR / fname
 
-    if not path.exists():
-        raise FileNotFoundError(f"No cached results at {path}")
+    if params or not path.exists():
+        raise FileNotFoundError(f"No stored results for {cfg_name} "
+                                f"(area={area}, z={z_min}-{z_max}, {params}) "
+                                f"and no cached file at {path}")
+
+    return _load_legacy_background(path)
 
+
+def _load_legacy_background(path):
+    """Eagerly read a pre-store ``bg_*.h5`` cache file."""
     data = {}
-    with h5py.File(path, "r") as f:
+    with open_hdf5(path) as f:
         # Metadata
         data["metadata"] = dict(f["metadata"].attrs)
 
         # Optical
         data["optical"] = {
-            "lam_AA": f["optical/lam_AA"][:],
-            "I_nu": f["optical/I_nu"][:],
-            "nuInu_nW": f["optical/nuInu_nW"][:],
-            "I_nu_nodust": f["optical/I_nu_nodust"][:],
-            "nuInu_nodust_nW": f["optical/nuInu_nodust_nW"][:],
+            "lam_AA": read_dataset(f, "optical/lam_AA"),
+            "I_nu": read_dataset(f, "optical/I_nu"),
+            "nuInu_nW": read_dataset(f, "optical/nuInu_nW"),
+            "I_nu_nodust": read_dataset(f, "optical/I_nu_nodust"),
+            "nuInu_nodust_nW": read_dataset(f, "optical/nuInu_nodust_nW"),
         }
 
         # Far-IR
         data["farIR"] = {
-            "lam_AA": f["farIR/lam_AA"][:],
-            "I_lam": f["farIR/I_lam"][:],
-            "nuInu_nW": f["farIR/nuInu_nW"][:]
+            "lam_AA": read_dataset(f, "farIR/lam_AA"),
+            "I_lam": read_dataset(f, "farIR/I_lam"),
+            "nuInu_nW": read_dataset(f, "farIR/nuInu_nW")
         }
 
         # Radio (handle old cache files that used "nuInu" instead of "nuInu_nW")
         radio_grp = f["radio"]
         if "nuInu_nW" in radio_grp:
-            radio_nuInu = radio_grp["nuInu_nW"][:]
+            radio_nuInu = read_dataset(radio_grp, "nuInu_nW")
         elif "nuInu" in radio_grp:
-            radio_nuInu = radio_grp["nuInu"][:] * 1e6   # erg/s/cm²/sr → nW/m²/sr
+            radio_nuInu = read_dataset(radio_grp, "nuInu") * 1e6   # erg/s/cm²/sr → nW/m²/sr
         else:
             # Recompute from raw I_nu if neither key exists
-            nu_hz = radio_grp["nu_Hz"][:]
-            I_nu  = radio_grp["I_nu"][:]
+            nu_hz = read_dataset(radio_grp, "nu_Hz")
+            I_nu  = read_dataset(radio_grp, "I_nu")
             radio_nuInu = nu_hz * I_nu * 1e6             # erg/s/cm²/sr → nW/m²/sr
         data["radio"] = {
-            "nu_Hz": radio_grp["nu_Hz"][:],
-            "I_nu": radio_grp["I_nu"][:],
-            "lam_um": radio_grp["lam_um"][:],
+            "nu_Hz": read_dataset(radio_grp, "nu_Hz"),
+            "I_nu": read_dataset(radio_grp, "I_nu"),
+            "lam_um": read_dataset(radio_grp, "lam_um"),
             "nuInu_nW": radio_nuInu
         }
 
         # Diagnostics if present
         if "diagnostics" in f:
             data["diagnostics"] = {
-                "dust_temps": f["diagnostics/dust_temps"][:],
-                "dust_redshifts": f["diagnostics/dust_redshifts"][:]
+                "dust_temps": read_dataset(f, "diagnostics/dust_temps"),
+                "dust_redshifts": read_dataset(f, "diagnostics/dust_redshifts")
             }
 
     print(f"Loaded results from {path}")
@@ -192,13 +244,15 @@ def load_background_results(cfg_name, area, z_min, z_max):
 
 
 def list_cached_results():
-    """List all cached background result files."""
-    if not RESULTS_DIR.exists():
-        return []
-    return sorted(RESULTS_DIR.glob("bg_*.h5"))
+    """List all cached background result files (store runs and legacy files)."""
+    runs = [run.path for run in ResultsStore().find("background")]
+    legacy = sorted(RESULTS_DIR.glob("bg_*.h5")) if RESULTS_DIR.exists() else []
+    return runs + legacy
 
 
-def save_farIR_parameter_sweep(cfg_name, z_min, z_max, a_values, results_dict):
+@instrument.timed("save_results")
+def save_farIR_parameter_sweep(cfg_name, z_min, z_max, a_values, results_dict,
+                               area=None, params=None):
     """
     Save far-IR results for multiple a_dust values (for parameter optimization).
     
@@ -212,43 +266,62 @@ def save_farIR_parameter_sweep(cfg_name, z_min, z_max, a_values, results_dict):
         List of a_dust values tested.
     results_dict : dict
         {a_dust: (lam_fir, nuInu_fir_nW), ...}
+    area : float, optional
+        Lightcone area (deg²); also pulls in the lightcone's parameters.
+    params : dict, optional
+        Further parameters that distinguish this sweep (e.g. beta).
     
     Returns
     -------
     Path : path to saved file
     """
-    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
-    fname = f"farIR_sweep_{cfg_name}_z{z_min}-{z_max}.h5"
-    outpath = RESULTS_DIR / fname
-    
-    with h5py.File(outpath, "w") as f:
-        f.attrs["a_values"] = np.array(a_values)
-        f.attrs["sim"] = cfg_name
-        f.attrs["z_min"] = z_min
-        f.attrs["z_max"] = z_max
-        f.attrs["created"] = datetime.now().isoformat()
-        
-        for a in a_values:
-            grp = f.create_group(f"a_{a:.4f}".replace("-", "m").replace(".", "p"))
-            lam, nuInu = results_dict[a]
-            grp.create_dataset("lam_AA", data=lam)
-            grp.create_dataset("nuInu_nW", data=nuInu)
-            grp.attrs["a_dust"] = a
-    
-    print(f"Parameter sweep saved → {outpath}")
-    return outpath
+    run_params = {"sim": cfg_name, "area_deg2": area,
+                  "z_min": z_min, "z_max": z_max,
+                  "a_values": np.asarray(a_values, dtype=float)}
+    if area is not None:
+        run_params.update(lightcone_params(cfg_name, area, z_min, z_max))
+    run_params.update(params or {})
 
+    data, attrs = {}, {"/": {
+        "a_values": np.array(a_values),
+        "sim": cfg_name,
+        "z_min": z_min,
+        "z_max": z_max,
+        "created": datetime.now().isoformat(),
+    }}
+    for a in a_values:
+        key = f"a_{a:.4f}".replace("-", "m").replace(".", "p")
+        lam, nuInu = results_dict[a]
+        data[key] = {"lam_AA": lam, "nuInu_nW": nuInu}
+        attrs[key] = {"a_dust": a}
+
+    run = ResultsStore().put("farIR_sweep", run_params, data, attrs=attrs)
+
+    print(f"Parameter sweep saved → {run.path}")
+    return run.path
+
+
+@instrument.timed("load_results")
+def load_farIR_parameter_sweep(cfg_name, z_min, z_max, **params):
+    """
+    Load a far-IR parameter sweep.
+
+    The newest matching sweep in the results store is used, falling back
+    to a legacy ``farIR_sweep_{name}_z{zmin}-{zmax}.h5`` file.  Spectra
+    are read on access.
+    """
+    run = ResultsStore().latest("farIR_sweep", sim=cfg_name,
+                                z_min=z_min, z_max=z_max, **params)
+    if run is not None:
+        path = run.path
+    else:
+        fname = f"farIR_sweep_{cfg_name}_z{z_min}-{z_max}.h5"
+        path = RESULTS_DIR / fname
+        if params or not path.exists():
+            raise FileNotFoundError(f"No sweep file at {path}")
 
-def load_farIR_parameter_sweep(cfg_name, z_min, z_max):
-    """Load a far-IR parameter sweep."""
-    fname = f"farIR_sweep_{cfg_name}_z{z_min}-{z_max}.h5"
-    path = RESULTS_DIR / fname
-    
-    if not path.exists():
-        raise FileNotFoundError(f"No sweep file at {path}")
-    
     data = {"a_values": [], "spectra": {}}
-    with h5py.File(path, "r") as f:
+    with open_hdf5(path) as f:
         data["a_values"] = f.attrs["a_values"][:]
         data["z_min"] = f.attrs["z_min"]
         data["z_max"] = f.attrs["z_max"]
@@ -256,10 +329,7 @@ def load_farIR_parameter_sweep(cfg_name, z_min, z_max):
         for key in f.keys():
             if key.startswith("a_"):
                 a = f[key].attrs["a_dust"]
-                data["spectra"][a] = {
-                    "lam_AA": f[key]["lam_AA"][:],
-                    "nuInu_nW": f[key]["nuInu_nW"][:]
-                }
+                data["spectra"][a] = StoredGroup(path, f[key].name)
     
     print(f"Loaded sweep from {path}")
-    return data
\ No newline at end of file
+    return data